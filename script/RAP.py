@@ -5,14 +5,18 @@ import sys, os, pprint, traceback, shutil
 print(sys.version)
 
 # import custom modules
-from modules import common_functions, csv2sqlite, determine_project_id, analysis, log, shp2sqlite, to_csv, to_browsers
+from modules import common_functions, csv2sqlite, determine_project_id, analysis, log, shp2sqlite, to_csv, to_browsers, to_parquet, warehouse, species, sweep, rollup, to_excel, to_pdf, qa, checkpoint, unpivot
 
 
-def RAP(configfilepath, initial_msg, custom_datapath = None, ignore_testdata = True):
+def RAP(configfilepath, initial_msg, custom_datapath = None, ignore_testdata = True, from_stage = None, only_stage = None):
 	"""configfile carries most of the static variables. configfile is typically located in the same folder as this script: SEM.cfg
 	initial_msg is used when another program such as TDT is run before this script run. The message will be carried on to the log file.
 	custom_datapath is used when TDT did is run right before this tool. custom_datapath will replace config's CSV.folderpath variable.
 	For example, if TDT downloads new set of data at C:\raw_data\RAP_project_2020-07-13_4\data folder, this should be entered as the custom_datapath
+	custom_datapath can also be the zip file TDT downloaded (eg. C:\raw_data\RAP_project_2020-07-13_4.zip). It doesn't need to be extracted.
+	from_stage and only_stage resume a previous run in the same output folder (see modules/checkpoint.py for the stage names).
+	from_stage runs that stage and all the stages after it ('resume' for the stage after the last completed one). only_stage runs that stage only.
+	the output folder is deleted only when neither is given.
 	"""
 	timenow = common_functions.datetime_readable() #eg. Apr 21, 2020. 02:09 PM
 
@@ -22,7 +26,7 @@ def RAP(configfilepath, initial_msg, custom_datapath = None, ignore_testdata = T
 
 	# if custom datapath is available, use that instead of the path given in the cfg file.
 	if custom_datapath != None:
-		if os.path.isdir(custom_datapath):
+		if os.path.isdir(custom_datapath) or common_functions.is_zip_input(custom_datapath):
 			cfg_dict['INPUT']['inputdatafolderpath'] = custom_datapath
 
 	# start logging
@@ -46,77 +50,175 @@ def RAP(configfilepath, initial_msg, custom_datapath = None, ignore_testdata = T
 
 
 		## grabbing (and checking) spcies group from SpeciesGroup.csv
-		spc_to_check, spc_group_dict = common_functions.open_spc_group_csv(cfg_dict['SPC']['csv'])
-		logger.info("spc_to_check = %s"%spc_to_check)
-		logger.info("spc_group_dict = %s"%spc_group_dict)
+		spc_registry = species.Species_registry(cfg_dict['SPC']['csv'], [f.strip() for f in cfg_dict['SPC']['extra_csv'].split(',') if f.strip() != ''])
+		logger.info("spc_to_check = %s"%spc_registry.spc_to_check)
+		logger.info("spc_group_dict = %s"%spc_registry.spc_group_dict)
+		logger.info("species groupings = %s"%list(spc_registry.groupings.keys()))
 
 		# checking output path
 		output_folderpath = cfg_dict['OUTPUT']['outputfolderpath']
-		# if output path already exists, delete it completely
-		if os.path.exists(output_folderpath):
-			logger.debug("Deleting existing files in the output folder.")
-			shutil.rmtree(output_folderpath)
-		logger.debug("Creating output folder structure")
-		os.mkdir(output_folderpath)
-		# create rest of the output folder structure
 		db_output_path = os.path.join(output_folderpath, 'sqlite')
 		csv_output_path = os.path.join(output_folderpath, 'csv')
 		browser_output_path = os.path.join(output_folderpath, 'browser')
-		for path in [db_output_path, csv_output_path, browser_output_path]:
-			os.mkdir(path)
+		cp = checkpoint.Checkpoint(output_folderpath, logger)
+
+		if from_stage == None and only_stage == None:
+			# full run - if output path already exists, delete it completely
+			stages = checkpoint.STAGES
+			if os.path.exists(output_folderpath):
+				logger.debug("Deleting existing files in the output folder.")
+				shutil.rmtree(output_folderpath)
+			logger.debug("Creating output folder structure")
+			os.mkdir(output_folderpath)
+			# create rest of the output folder structure
+			for path in [db_output_path, csv_output_path, browser_output_path]:
+				os.mkdir(path)
+		else:
+			# resuming the previous run in the same output folder. the variables saved by the completed stages are picked up from the checkpoint.
+			if not cp.load():
+				return
+			stages = cp.stages_to_run(from_stage, only_stage)
+			if stages == None:
+				return
+			logger.info("Stages to run: %s"%stages)
+			cp.invalidate(stages)
+			saved = cp.variables
+			db_filepath = saved.get('db_filepath')
+			tablenames_n_rec_count = saved.get('tablenames_n_rec_count')
+			clearcut_tbl_name = saved.get('clearcut_tbl_name')
+			shelterwood_tbl_name = saved.get('shelterwood_tbl_name')
+			clus_summary_attr = saved.get('clus_summary_attr')
+			proj_summary_attr = saved.get('proj_summary_attr')
+			plotcount_cc_sh = saved.get('plotcount_cc_sh')
 
 
 		# csv2sqlite
 		# creating sqlite database from the csv files
-		c2s = csv2sqlite.Csv2sqlite(cfg_dict['INPUT']['inputdatafolderpath'],db_output_path,cfg_dict['SQLITE']['unique_id_fieldname'],logger, ignore_testdata)
-		db_filepath = c2s.db_fullpath_new
-		tablenames_n_rec_count = c2s.tablenames_n_rec_count
-		logger.debug("Checkpoint after csv2sqlite:\ndb_filepath = %s\ntablenames_n_rec_count = %s"%(db_filepath,tablenames_n_rec_count))
+		if 'csv2sqlite' in stages:
+			c2s = csv2sqlite.Csv2sqlite(cfg_dict['INPUT']['inputdatafolderpath'],db_output_path,cfg_dict['SQLITE']['unique_id_fieldname'],logger, ignore_testdata)
+			db_filepath = c2s.db_fullpath_new
+			tablenames_n_rec_count = c2s.tablenames_n_rec_count
+			logger.debug("Checkpoint after csv2sqlite:\ndb_filepath = %s\ntablenames_n_rec_count = %s"%(db_filepath,tablenames_n_rec_count))
+			cp.save('csv2sqlite', {'db_filepath': db_filepath, 'tablenames_n_rec_count': tablenames_n_rec_count})
 
 		### At this point, you should have an output sqlite file with tables created, and
 		### the tables should have all the info of the input csv files (i.e. Clearcut_Survey_v2021, Shelterwood_Survey_v2021)
 
 
+		# unpivot
+		# the wide survey tables in long format: plot_obs (one record per plot) and tree_tally (one record per species entry of each plot)
+		if 'unpivot' in stages:
+			up = unpivot.Unpivot(cfg_dict, db_filepath, tablenames_n_rec_count, spc_registry, logger)
+			up.run_all()
+			cp.save('unpivot', {})
+
+
 
 		# shp2sqlite
 		# creating sqlite table from the shp file (project boundaries and info)
-		s2s = shp2sqlite.Shp2sqlite(cfg_dict, db_filepath, tablenames_n_rec_count, logger)
-		s2s.run_all()
-		tablenames_n_rec_count = s2s.tablenames_n_rec_count
-		# logger.debug('******** %s'%tablenames_n_rec_count)
+		if 'shp2sqlite' in stages:
+			s2s = shp2sqlite.Shp2sqlite(cfg_dict, db_filepath, tablenames_n_rec_count, logger)
+			s2s.run_all()
+			tablenames_n_rec_count = s2s.tablenames_n_rec_count
+			# logger.debug('******** %s'%tablenames_n_rec_count)
+			cp.save('shp2sqlite', {'tablenames_n_rec_count': tablenames_n_rec_count})
 
 		### At this point, you should have sqlite table named projects_shp with all the fields and values copied over from the input shpfile.
 
 
 
 		# determine_project_id
-		dp = determine_project_id.Determine_project_id(cfg_dict, db_filepath, tablenames_n_rec_count, logger)
-		dp.run_all()
-		# return some variables that may be used later on in the script
-		tablenames_n_rec_count, uniq_id_to_proj_id, clearcut_tbl_name, shelterwood_tbl_name, dp_summary_dict = dp.return_updated_variables()
+		if 'determine_project_id' in stages:
+			dp = determine_project_id.Determine_project_id(cfg_dict, db_filepath, tablenames_n_rec_count, logger)
+			dp.run_all()
+			# return some variables that may be used later on in the script
+			tablenames_n_rec_count, uniq_id_to_proj_id, clearcut_tbl_name, shelterwood_tbl_name, dp_summary_dict = dp.return_updated_variables()
+			cp.save('determine_project_id', {'tablenames_n_rec_count': tablenames_n_rec_count, 'clearcut_tbl_name': clearcut_tbl_name, 'shelterwood_tbl_name': shelterwood_tbl_name})
 
 		### At this point, you have clearcut_survey, shelterwood_survey, and projects_shp tables in the sqlite database
 		### ...and have the geo_proj_id and fin_proj_id correctly filled out
 
 
+		# qa
+		# data quality rules on the survey data. every issue found goes to the qa_issues table
+		if 'qa' in stages:
+			qa_check = qa.QA(cfg_dict, db_filepath, clearcut_tbl_name, shelterwood_tbl_name, spc_registry, logger)
+			qa_check.run_all()
+			cp.save('qa', {})
+
+
 
 		# analysis
 		# Species comp and Site Occupancy analysis begins here:
-		ana = analysis.Run_analysis(cfg_dict, db_filepath, clearcut_tbl_name, shelterwood_tbl_name, spc_to_check, spc_group_dict, logger)
-		ana.run_all()
-		# we will need the attribute names of cluster summary and proj summary tables:
-		clus_summary_attr = ana.clus_summary_attr # eg. {'c_clus_uid': 'cluster_uid', 'c_clus_num': 'cluster_number', 'c_proj_id': 'proj_id',...}
-		proj_summary_attr = ana.proj_summary_attr
-		plotcount_cc_sh = ana.plotcount_cc_sh
+		if 'analysis' in stages:
+			ana = analysis.Run_analysis(cfg_dict, db_filepath, clearcut_tbl_name, shelterwood_tbl_name, spc_registry, logger)
+			ana.run_all()
+			# we will need the attribute names of cluster summary and proj summary tables:
+			clus_summary_attr = ana.clus_summary_attr # eg. {'c_clus_uid': 'cluster_uid', 'c_clus_num': 'cluster_number', 'c_proj_id': 'proj_id',...}
+			proj_summary_attr = ana.proj_summary_attr
+			plotcount_cc_sh = ana.plotcount_cc_sh
+			cp.save('analysis', {'clus_summary_attr': clus_summary_attr, 'proj_summary_attr': proj_summary_attr, 'plotcount_cc_sh': plotcount_cc_sh})
+
+
+		# rollup
+		# District and FMU summaries of the projects
+		if 'rollup' in stages:
+			ru = rollup.Rollup(cfg_dict, db_filepath, logger)
+			ru.run_all()
+			cp.save('rollup', {})
 
 
 		# to_csv
-		tocsv = to_csv.To_csv(cfg_dict, db_filepath, clus_summary_attr, proj_summary_attr, plotcount_cc_sh, logger)
-		tocsv.run_all()
+		if 'to_csv' in stages:
+			tocsv = to_csv.To_csv(cfg_dict, db_filepath, clus_summary_attr, proj_summary_attr, plotcount_cc_sh, logger)
+			tocsv.run_all()
+			cp.save('to_csv', {})
+
+		# to_parquet
+		# typed, compressed columnar copies of the plot, cluster and project summary tables
+		if 'to_parquet' in stages:
+			if cfg_dict['PARQUET']['export'].upper() == 'TRUE':
+				topq = to_parquet.To_parquet(cfg_dict, db_filepath, clus_summary_attr, proj_summary_attr, plotcount_cc_sh, logger)
+				topq.run_all()
+			cp.save('to_parquet', {})
+
+		# to_excel
+		# one regeneration assessment workbook per project
+		if 'to_excel' in stages:
+			if cfg_dict['EXCEL']['export'].upper() == 'TRUE':
+				toxl = to_excel.To_excel(cfg_dict, db_filepath, logger)
+				toxl.run_all()
+			cp.save('to_excel', {})
+
+		# sweep
+		# compare the project effective density and site occupancy under different [CALC] settings
+		if 'sweep' in stages:
+			if cfg_dict['SWEEP']['sweep'].upper() == 'TRUE':
+				sw = sweep.Sweep(cfg_dict, db_filepath, logger)
+				sw.run_all()
+			cp.save('sweep', {})
+
+		# warehouse
+		# upsert this run's summaries into the multi-season warehouse database
+		if 'warehouse' in stages:
+			if cfg_dict['WAREHOUSE']['warehouse_db'].strip() != '':
+				wh = warehouse.Warehouse(cfg_dict, db_filepath, logger)
+				wh.run_all()
+			cp.save('warehouse', {})
+
+		# to_pdf
+		# one printable assessment report per project (linked from the project's page by to_browsers)
+		if 'to_pdf' in stages:
+			if cfg_dict['PDF']['proj_reports'].upper() == 'TRUE':
+				topdf = to_pdf.To_pdf(cfg_dict, db_filepath, logger)
+				topdf.run_all()
+			cp.save('to_pdf', {})
 
 		# to_browsers
-		to_b = to_browsers.To_browsers(cfg_dict, db_filepath, logger)
-		to_b.run_all()
+		if 'to_browsers' in stages:
+			to_b = to_browsers.To_browsers(cfg_dict, db_filepath, logger)
+			to_b.run_all()
+			cp.save('to_browsers', {})
 
 
 	except:
@@ -136,6 +238,13 @@ def RAP(configfilepath, initial_msg, custom_datapath = None, ignore_testdata = T
 
 
 if __name__ == '__main__':
+	import argparse
+	parser = argparse.ArgumentParser(description='Run the RAP analysis. All the stages are run unless --from-stage or --only-stage is given.')
+	stage_option = parser.add_mutually_exclusive_group()
+	stage_option.add_argument('--from-stage', choices=checkpoint.STAGES + ['resume'], help='resume the previous run from this stage (resume = the stage after the last completed one)')
+	stage_option.add_argument('--only-stage', choices=checkpoint.STAGES, help='run only this stage of the previous run. eg. to_browsers')
+	args = parser.parse_args()
+
 	configfile = 'RAP.cfg'
 	initial_msg = "Stand-alone RAP.py run - TDT tool did not run!"
-	RAP(configfile, initial_msg)
\ No newline at end of file
+	RAP(configfile, initial_msg, from_stage = args.from_stage, only_stage = args.only_stage)
\ No newline at end of file
@@ -0,0 +1,239 @@
+# Per-stage benchmark of the RAP program.
+# Each stage of RAP.py (csv2sqlite, shp2sqlite, determine_project_id, qa, each method of analysis, rollup, to_csv, to_parquet, to_excel, to_pdf and to_browsers)
+# is timed separately on a fixed synthetic dataset (see modules/synthetic_data.py).
+# wall time, peak memory (python allocations traced by tracemalloc) and rows/second are written to a json file.
+# if a baseline json exists, every stage is compared against it and this script exits with 1
+# when a stage is slower (or uses more memory) than the baseline by more than the regression threshold.
+#
+# usage:
+#	python RAP_benchmark.py                          # run and compare against the baseline
+#	python RAP_benchmark.py --save-baseline          # run and save the results as the new baseline
+#	python RAP_benchmark.py --clusters 100000 --threshold 10
+# the default values come from the [BENCHMARK] section of RAP.cfg
+
+import sys, os, json, time, tracemalloc, shutil, argparse, platform
+
+# import custom modules
+from modules import common_functions, csv2sqlite, analysis, log, to_csv, to_parquet, to_browsers, synthetic_data, species, rollup, to_excel, to_pdf, qa, unpivot
+
+
+
+class Benchmark:
+	def __init__(self, cfg_dict, benchmark_folder, num_of_clusters, seed, logger):
+		self.cfg_dict = cfg_dict
+		self.logger = logger
+		self.benchmark_folder = benchmark_folder
+		self.num_of_clusters = num_of_clusters
+		self.seed = seed
+		self.input_folder = os.path.join(benchmark_folder, 'input_%s_clusters_seed%s'%(num_of_clusters, seed)) # the same synthetic data is reused for the same size and seed
+		self.output_folder = os.path.join(benchmark_folder, 'output')
+
+		# RAP.cfg points to the real data and the sharepoint sync folder. Everything is redirected to the benchmark folder here.
+		self.cfg_dict['INPUT']['inputdatafolderpath'] = os.path.join(self.input_folder, 'data')
+		self.cfg_dict['SHP']['project_shpfile'] = os.path.join(self.input_folder, 'shp', 'projects.shp')
+		self.cfg_dict['OUTPUT']['outputfolderpath'] = self.output_folder
+		self.cfg_dict['OUTPUT']['output_photopath'] = os.path.join(self.output_folder, 'photos')
+		self.cfg_dict['OUTPUT']['publish_folder'] = ''
+		self.cfg_dict['WAREHOUSE']['warehouse_db'] = ''
+		self.cfg_dict['EXCEL']['excel_folder'] = ''
+		self.cfg_dict['PDF']['proj_report_folder'] = ''
+
+		self.results = {} # eg. {'csv2sqlite': {'seconds': 1.2, 'peak_mb': 35.1, 'rows': 5000, 'rows_per_sec': 4166.7}, ...}
+		self.db_filepath = None
+		self.tablenames_n_rec_count = None
+		self.num_of_projs = 0
+
+
+	def create_input(self):
+		"""writes the synthetic dataset unless it's already there"""
+		if os.path.isdir(self.input_folder):
+			self.logger.info("Using the existing synthetic data in %s"%self.input_folder)
+		else:
+			syn = synthetic_data.Synthetic_data(self.input_folder, self.num_of_clusters, self.logger, seed = self.seed)
+			syn.run_all()
+		self.num_of_projs = len(json.load(open(os.path.join(self.input_folder, 'shp', 'projects.geojson')))['features'])
+
+		# fresh output folder every run (same as RAP.py)
+		if os.path.exists(self.output_folder):
+			shutil.rmtree(self.output_folder)
+		for folder in [self.output_folder] + [os.path.join(self.output_folder, sub) for sub in ['sqlite', 'csv', 'browser', 'photos']]:
+			os.mkdir(folder)
+
+
+	def measure(self, stage, func, rows):
+		"""runs func, and records wall time, peak memory and rows per second of this stage. returns what func returns"""
+		print("Running %s..."%stage)
+		tracemalloc.start()
+		start = time.perf_counter()
+		returned = func()
+		seconds = time.perf_counter() - start
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+
+		self.results[stage] = {'seconds': round(seconds, 4), 'peak_mb': round(peak/1024/1024, 2), 'rows': rows,
+								'rows_per_sec': round(rows/seconds, 1) if seconds > 0 else None}
+		self.logger.info("BENCHMARK %s: %s"%(stage, self.results[stage]))
+		return returned
+
+
+	def run_stages(self):
+		cfg_dict = self.cfg_dict
+		spc_registry = species.Species_registry(cfg_dict['SPC']['csv'], [f.strip() for f in cfg_dict['SPC']['extra_csv'].split(',') if f.strip() != ''])
+
+		# csv2sqlite (all the work is done when the class is initiated)
+		c2s = self.measure('csv2sqlite', lambda: csv2sqlite.Csv2sqlite(cfg_dict['INPUT']['inputdatafolderpath'], os.path.join(self.output_folder, 'sqlite'),
+							cfg_dict['SQLITE']['unique_id_fieldname'], self.logger, True), self.num_of_clusters)
+		self.db_filepath = c2s.db_fullpath_new
+		self.tablenames_n_rec_count = c2s.tablenames_n_rec_count
+		num_of_clusters = sum([v[1] for v in self.tablenames_n_rec_count.values()]) # excluding test data
+
+		up = unpivot.Unpivot(cfg_dict, self.db_filepath, self.tablenames_n_rec_count, spc_registry, self.logger)
+		self.measure('unpivot', up.run_all, num_of_clusters)
+
+		# shp2sqlite and determine_project_id need gdal (ogr)
+		try:
+			from modules import shp2sqlite, determine_project_id
+		except ImportError:
+			print("!!!! gdal/ogr is not installed. shp2sqlite and determine_project_id will not be benchmarked.")
+			self.logger.info("!!!! gdal/ogr is not installed. shp2sqlite and determine_project_id will not be benchmarked.")
+			self.load_projects_without_ogr()
+		else:
+			s2s = shp2sqlite.Shp2sqlite(cfg_dict, self.db_filepath, self.tablenames_n_rec_count, self.logger)
+			self.measure('shp2sqlite', s2s.run_all, self.num_of_projs)
+			dp = determine_project_id.Determine_project_id(cfg_dict, self.db_filepath, s2s.tablenames_n_rec_count, self.logger)
+			self.measure('determine_project_id', dp.run_all, num_of_clusters)
+
+		qa_check = qa.QA(cfg_dict, self.db_filepath, 'Clearcut_Survey_v2021', 'Shelterwood_Survey_v2021', spc_registry, self.logger)
+		self.measure('qa', qa_check.run_all, num_of_clusters)
+
+		# analysis - each method is a stage (see Run_analysis.methods)
+		ana = analysis.Run_analysis(cfg_dict, self.db_filepath, 'Clearcut_Survey_v2021', 'Shelterwood_Survey_v2021', spc_registry, self.logger)
+		for method in ana.methods():
+			self.measure('analysis.' + method, getattr(ana, method), num_of_clusters)
+
+		ru = rollup.Rollup(cfg_dict, self.db_filepath, self.logger)
+		self.measure('rollup', ru.run_all, self.num_of_projs)
+
+		# to_csv, to_parquet, to_excel, to_pdf and to_browsers
+		tocsv = to_csv.To_csv(cfg_dict, self.db_filepath, ana.clus_summary_attr, ana.proj_summary_attr, ana.plotcount_cc_sh, self.logger)
+		self.measure('to_csv', tocsv.run_all, num_of_clusters)
+		if cfg_dict['PARQUET']['export'].upper() == 'TRUE':
+			topq = to_parquet.To_parquet(cfg_dict, self.db_filepath, ana.clus_summary_attr, ana.proj_summary_attr, ana.plotcount_cc_sh, self.logger)
+			self.measure('to_parquet', topq.run_all, num_of_clusters)
+		if cfg_dict['EXCEL']['export'].upper() == 'TRUE':
+			toxl = to_excel.To_excel(cfg_dict, self.db_filepath, self.logger)
+			self.measure('to_excel', toxl.run_all, num_of_clusters)
+		if cfg_dict['PDF']['proj_reports'].upper() == 'TRUE':
+			topdf = to_pdf.To_pdf(cfg_dict, self.db_filepath, self.logger)
+			self.measure('to_pdf', topdf.run_all, num_of_clusters)
+		to_b = to_browsers.To_browsers(cfg_dict, self.db_filepath, self.logger)
+		self.measure('to_browsers', to_b.run_all, num_of_clusters)
+
+
+	def load_projects_without_ogr(self):
+		"""without ogr, the project attributes are loaded from the GeoJSON and fin_proj_id is set to ProjectID02.
+		(the synthetic clusters are always inside the project they were generated for, so determine_project_id would give the same answer)
+		"""
+		features = json.load(open(os.path.join(self.input_folder, 'shp', 'projects.geojson')))['features']
+		projects = [{k.upper(): v for k,v in feature['properties'].items()} for feature in features]
+		common_functions.dict_lst_to_sqlite(projects, self.db_filepath, self.cfg_dict['SHP']['shp2sqlite_tablename'], self.logger)
+
+		import sqlite3
+		con = sqlite3.connect(self.db_filepath)
+		for tablename in ['Clearcut_Survey_v2021', 'Shelterwood_Survey_v2021']:
+			for f in [self.cfg_dict['SQLITE']['geo_check_fieldname'], self.cfg_dict['SQLITE']['fin_proj_id']]:
+				con.execute("ALTER TABLE %s ADD %s CHAR"%(tablename, f))
+				con.execute("UPDATE %s SET %s = ProjectID02"%(tablename, f))
+		con.commit()
+		con.close()
+
+
+	def environment(self):
+		return {'python': sys.version.split()[0], 'platform': platform.platform(), 'clusters': self.num_of_clusters, 'seed': self.seed,
+				'time': common_functions.datetime_readable()}
+
+##############    End of class "Benchmark"   ######################
+
+
+
+def compare(results, baseline, threshold, min_seconds):
+	"""compares the results against the baseline.
+	returns a list of regressions eg. ['analysis.summarize_clusters: seconds 2.31 vs baseline 1.52 (+52.0%)']
+	stages that took less than min_seconds in the baseline are not checked for time (too noisy).
+	"""
+	regressions = []
+	for stage, base in baseline['stages'].items():
+		if stage not in results:
+			continue
+		for measure in ['seconds', 'peak_mb']:
+			if measure == 'seconds' and base['seconds'] < min_seconds:
+				continue
+			if base[measure] in [0, None]:
+				continue
+			change = (results[stage][measure] - base[measure]) * 100.0 / base[measure]
+			if change > threshold:
+				regressions.append("%s: %s %s vs baseline %s (+%.1f%%)"%(stage, measure, results[stage][measure], base[measure], change))
+	return regressions
+
+
+def print_table(results, baseline):
+	print("\n%-38s %10s %10s %12s %12s"%('stage', 'seconds', 'peak_mb', 'rows/sec', 'vs baseline'))
+	for stage, r in results.items():
+		versus = ''
+		if baseline != None and stage in baseline['stages'] and baseline['stages'][stage]['seconds'] > 0:
+			versus = '%+.1f%%'%((r['seconds'] - baseline['stages'][stage]['seconds']) * 100.0 / baseline['stages'][stage]['seconds'])
+		print("%-38s %10s %10s %12s %12s"%(stage, r['seconds'], r['peak_mb'], r['rows_per_sec'], versus))
+
+
+
+
+if __name__ == '__main__':
+	cfg_dict = common_functions.cfg_to_dict('RAP.cfg')
+
+	parser = argparse.ArgumentParser(description='Per-stage benchmark of RAP on synthetic data.')
+	parser.add_argument('--folder', default=cfg_dict['BENCHMARK']['benchmark_folder'], help='where the synthetic data, outputs and results are stored')
+	parser.add_argument('--clusters', type=int, default=int(cfg_dict['BENCHMARK']['num_of_clusters']), help='number of synthetic clusters')
+	parser.add_argument('--seed', type=int, default=int(cfg_dict['BENCHMARK']['seed']))
+	parser.add_argument('--threshold', type=float, default=float(cfg_dict['BENCHMARK']['regression_threshold']), help='allowed slowdown in percent')
+	parser.add_argument('--min-seconds', type=float, default=float(cfg_dict['BENCHMARK']['min_seconds']), help='stages faster than this are not checked for time')
+	parser.add_argument('--baseline', default=None, help='baseline json. default: <folder>/baseline_<clusters>.json')
+	parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline')
+	args = parser.parse_args()
+
+	if not os.path.isdir(args.folder):
+		os.makedirs(args.folder)
+	baseline_file = args.baseline if args.baseline != None else os.path.join(args.folder, 'baseline_%s.json'%args.clusters)
+	logger = log.logger(os.path.join(args.folder, 'log_benchmark.txt'), debug = False)
+	logger.info('\n\n############## ## #  Launching RAP benchmark  # ## ##################')
+
+	bm = Benchmark(cfg_dict, args.folder, args.clusters, args.seed, logger)
+	bm.create_input()
+	bm.run_stages()
+	output = {'environment': bm.environment(), 'stages': bm.results}
+
+	# write the results
+	result_file = os.path.join(args.folder, 'benchmark_%s.json'%common_functions.datetime_stamp())
+	with open(result_file, 'w') as f:
+		json.dump(output, f, indent=2)
+	print("\nResults written to %s"%result_file)
+
+	baseline = json.load(open(baseline_file)) if os.path.exists(baseline_file) else None
+	print_table(bm.results, baseline)
+
+	if args.save_baseline:
+		with open(baseline_file, 'w') as f:
+			json.dump(output, f, indent=2)
+		print("\nBaseline saved: %s"%baseline_file)
+
+	elif baseline != None:
+		regressions = compare(bm.results, baseline, args.threshold, args.min_seconds)
+		if len(regressions) > 0:
+			print("\n!!!! %s regression(s) beyond %s%%:"%(len(regressions), args.threshold))
+			for r in regressions:
+				print(r)
+				logger.info("!!!! REGRESSION: %s"%r)
+			sys.exit(1)
+		print("\nNo regression beyond %s%%."%args.threshold)
+
+	else:
+		print("\nNo baseline found at %s. Run with --save-baseline to create one."%baseline_file)
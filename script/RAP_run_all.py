@@ -14,7 +14,7 @@ if tdt_msg == -1:
 	initial_msg = "TDT failed to download projects from Terraflex inSphere server"
 
 else:
-	custom_datapath = os.path.join(tdt_msg[:-4],'data') # eg. C:\DanielK_Work\OfficeWork\Temp\raw_data\RAP_project_2020-07-13_4\data
+	custom_datapath = tdt_msg # eg. C:\DanielK_Work\OfficeWork\Temp\raw_data\RAP_project_2020-07-13_4.zip - the csv files and photos are read straight from the zip
 	initial_msg = "TDT download successful!\nDownload path: %s"%custom_datapath
 
 
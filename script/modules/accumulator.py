@@ -0,0 +1,267 @@
+# running statistics (n, mean, m2) of each project and each metric.
+# summarize_projects in analysis.py re-calculates the mean, stdv and ci of every project from the full list of clusters.
+# with these accumulators, a newly surveyed cluster updates the statistics of its project without going through the other clusters,
+# and the accumulators of separate batches of clusters (eg. two field crews' exports) can be merged into the same result.
+# the stats agree with Project_Summary up to floating point rounding - the running mean can differ from sum/n in the last bits,
+# so a mean that is exactly halfway (eg. 0.84375) may be rounded to 0.8437 here and 0.8438 in Project_Summary.
+# metrics:
+#	'effective_density' and 'site_occupancy' - all clusters of the project
+#	'occupied' - 1 for each occupied cluster. its n is the number of occupied clusters (the n for the species composition)
+#	'spc:BF', 'spc:SW',... - species percent of the occupied clusters (0 if the species is not found in the cluster)
+#	'spc_grp:SpeciesGroup:SX',... - species group percent of the occupied clusters for each species grouping
+# the values each cluster added are kept too (self.clusters), one record per project and cluster number, so that
+#	a cluster that's seen again with the same values is skipped,
+#	a re-surveyed (or edited) cluster replaces its old values instead of being counted twice, and
+#	a cluster that's no longer in the survey data is taken back out.
+# when [WAREHOUSE] warehouse_db is given, analysis.py keeps the accumulators and the clusters of each season there between runs (see load, update and save),
+# so each run only adds the clusters that are new or changed since the last run.
+# see welford_add, welford_remove, welford_merge and welford_stats in mymath.py
+
+import sqlite3
+
+# importing custom modules
+if __name__ == '__main__':
+	import mymath
+else:
+	from modules import mymath
+
+
+
+class Proj_accumulator:
+	def __init__(self, clus_summary_attr, logger):
+		self.clus_summary_attr = clus_summary_attr # dictionary of variable: attribute names. they were defined in analysis.py's define_attr_names() method.
+		self.logger = logger
+		self.acc = {} # {(proj_id, metric): (n, mean, m2)} eg. {('P-1', 'effective_density'): (5, 3125.0, 2734375.0), ('P-1', 'spc:BF'): (4, 12.5, 468.75),...}
+		self.proj_metrics = {} # metrics of each project in self.acc eg. {'P-1': {'effective_density', 'site_occupancy', 'occupied', 'spc:BF',...}}
+		self.num_found = {} # number of clusters with each species (group) metric. eg. {('P-1', 'spc:BF'): 3,...}. a metric is dropped when this gets to 0
+		self.num_updated = 0 # number of clusters added or replaced by update
+		self.clusters = {} # values each cluster added. eg. {('P-1', '109'): ['398', 2500.0, 0.75, {'spc:BF': 50.0, 'spc:SB': 50.0, 'spc_grp:SpeciesGroup:SX': 50.0,...}],...}
+
+
+	def set_acc(self, proj_id, metric, acc):
+		"""every accumulator is set through here, so that self.proj_metrics stays up to date"""
+		self.acc[(proj_id, metric)] = acc
+		self.proj_metrics.setdefault(proj_id, set()).add(metric)
+
+
+	def add(self, proj_id, metric, x):
+		self.set_acc(proj_id, metric, mymath.welford_add(self.acc.get((proj_id, metric), (0, 0.0, 0.0)), x))
+
+
+	def cluster_values(self, cluster):
+		"""
+		the values a cluster record (a dictionary of clus_summary_dict_lst in analysis.py) adds to the accumulators.
+		returns [cluster_uid, effective_density, site_occupancy, spc_percents] eg. ['398', 2500.0, 0.75, {'spc:BF': 50.0, 'spc_grp:SpeciesGroup:BF': 50.0,...}]
+		spc_percents is empty for an unoccupied cluster.
+		"""
+		attr = self.clus_summary_attr
+		spc_percents = {}
+		if cluster[attr['c_site_occ']] > 0:
+			spc_percents = {'spc:' + spc: perc for spc, perc in cluster[attr['c_spc_comp_perc']].items()}
+			for grouping, grp_comp_perc in cluster[attr['c_spc_comp_perc_by_grouping']].items():
+				spc_percents.update({'spc_grp:%s:%s'%(grouping, grp): perc for grp, perc in grp_comp_perc.items()})
+		return [str(cluster[attr['c_clus_uid']]), cluster[attr['c_eff_dens']], cluster[attr['c_site_occ']], spc_percents]
+
+
+	def add_cluster(self, cluster):
+		"""
+		updates the accumulators of the cluster's project with one cluster record (a dictionary of clus_summary_dict_lst in analysis.py).
+		if the project already has a cluster with the same cluster number, its values are replaced (taken out before the new ones are added).
+		"""
+		attr = self.clus_summary_attr
+		key = (cluster[attr['c_proj_id']], cluster[attr['c_clus_num']])
+		if key in self.clusters:
+			self.remove_cluster(key)
+		values = self.cluster_values(cluster)
+		self.add_values(key[0], values)
+		self.clusters[key] = values
+
+
+	def add_values(self, proj_id, values):
+		clus_uid, eff_dens, site_occ, spc_percents = values
+		self.add(proj_id, 'effective_density', eff_dens)
+		self.add(proj_id, 'site_occupancy', site_occ)
+		if site_occ > 0:
+			# the species percent of all the previously added occupied clusters. a species seen for the first time had 0% in all of them.
+			num_occupied = self.acc.get((proj_id, 'occupied'), (0, 0.0, 0.0))[0]
+			self.add(proj_id, 'occupied', 1)
+			# metrics of this project that this cluster doesn't have get a 0
+			for metric in self.proj_metrics[proj_id]:
+				if metric.startswith('spc') and metric not in spc_percents:
+					self.add(proj_id, metric, 0)
+			for metric, perc in spc_percents.items():
+				if (proj_id, metric) not in self.acc:
+					self.set_acc(proj_id, metric, (num_occupied, 0.0, 0.0)) # num_occupied zeros
+				self.add(proj_id, metric, perc)
+				self.num_found[(proj_id, metric)] = self.num_found.get((proj_id, metric), 0) + 1
+
+
+	def remove_cluster(self, key):
+		"""takes the values of a cluster that was added before out of its project's accumulators. key = (proj_id, cluster_number)"""
+		proj_id = key[0]
+		clus_uid, eff_dens, site_occ, spc_percents = self.clusters.pop(key)
+		self.set_acc(proj_id, 'effective_density', mymath.welford_remove(self.acc[(proj_id, 'effective_density')], eff_dens))
+		self.set_acc(proj_id, 'site_occupancy', mymath.welford_remove(self.acc[(proj_id, 'site_occupancy')], site_occ))
+		if site_occ > 0:
+			# the cluster added a value (its percent or 0) to every species metric of the project
+			for metric in self.proj_metrics[proj_id]:
+				if metric.startswith('spc') or metric == 'occupied':
+					x = 1 if metric == 'occupied' else spc_percents.get(metric, 0)
+					self.set_acc(proj_id, metric, mymath.welford_remove(self.acc[(proj_id, metric)], x))
+			# a species no other cluster of the project has is no longer in the project (as in Project_Summary's species_found)
+			for metric in spc_percents.keys():
+				self.num_found[(proj_id, metric)] -= 1
+				if self.num_found[(proj_id, metric)] == 0:
+					del self.num_found[(proj_id, metric)]
+					del self.acc[(proj_id, metric)]
+					self.proj_metrics[proj_id].remove(metric)
+
+
+	def latest_clusters(self, clus_summary_dict_lst):
+		"""the last cluster record of each project and cluster number (as in summarize_projects, only the last one counts). eg. {('P-1', '109'): {cluster record},...}"""
+		attr = self.clus_summary_attr
+		clusters = {}
+		for cluster in clus_summary_dict_lst:
+			clusters[(cluster[attr['c_proj_id']], cluster[attr['c_clus_num']])] = cluster
+		return clusters
+
+
+	def update(self, clus_summary_dict_lst):
+		"""
+		brings the accumulators loaded from a previous run (or new, empty ones) up to date with the clusters of this run (all of them, or one project's at a time).
+		only the clusters that are new, or whose values have changed since they were added, go through add_cluster.
+		returns the (proj_id, cluster_number) of the clusters given, so that remove_missing can take out the ones that are gone.
+		"""
+		seen = self.latest_clusters(clus_summary_dict_lst)
+		for key, cluster in seen.items():
+			if self.clusters.get(key) != self.cluster_values(cluster):
+				self.add_cluster(cluster)
+				self.num_updated += 1
+		return set(seen.keys())
+
+
+	def remove_missing(self, seen):
+		"""takes out the clusters that are not in seen (a set of (proj_id, cluster_number) from update). returns the number of clusters removed"""
+		missing = [key for key in self.clusters.keys() if key not in seen]
+		for key in missing:
+			self.remove_cluster(key)
+		return len(missing)
+
+
+	def merge(self, other):
+		"""
+		merges the accumulators of another Proj_accumulator (a separate batch of clusters) into this one.
+		a cluster that's in both batches counts once, with the other batch's values.
+		"""
+		for key in [key for key in other.clusters.keys() if key in self.clusters]:
+			self.remove_cluster(key)
+		for proj_id, other_metrics in other.proj_metrics.items():
+			num_occupied = self.acc.get((proj_id, 'occupied'), (0, 0.0, 0.0))[0]
+			other_num_occupied = other.acc.get((proj_id, 'occupied'), (0, 0.0, 0.0))[0]
+			metrics = self.proj_metrics.get(proj_id, set()) | other_metrics
+			for metric in metrics:
+				# a species found only in one of the batches had 0% in the occupied clusters of the other batch
+				zeros = num_occupied if metric.startswith('spc') else 0
+				other_zeros = other_num_occupied if metric.startswith('spc') else 0
+				self.set_acc(proj_id, metric, mymath.welford_merge(self.acc.get((proj_id, metric), (zeros, 0.0, 0.0)),
+					other.acc.get((proj_id, metric), (other_zeros, 0.0, 0.0))))
+		for key, num in other.num_found.items():
+			self.num_found[key] = self.num_found.get(key, 0) + num
+		self.clusters.update(other.clusters)
+
+
+	def stats(self, proj_id, metric, confidence=0.95):
+		"""same output as mymath.mean_std_ci (up to floating point rounding). eg. {'mean': 1979.1667, 'stdv': 1271.9428, 'ci': 1334.8221, ..., 'n': 6, 'confidence': 0.95}"""
+		return mymath.welford_stats(self.acc.get((proj_id, metric), (0, 0.0, 0.0)), confidence)
+
+
+	def save(self, db_filepath, tablename, season = None):
+		"""
+		writes (replaces) the accumulators to the table.
+		with a season (the warehouse), the table has a season column and only the records of that season are replaced.
+		"""
+		season_col = '' if season == None else 'season TEXT, '
+		con = sqlite3.connect(db_filepath)
+		cur = con.cursor()
+		cur.execute("CREATE TABLE IF NOT EXISTS %s (%sproj_id TEXT, metric TEXT, n INTEGER, mean REAL, m2 REAL, PRIMARY KEY (%sproj_id, metric))"%(tablename,
+					season_col, season_col.replace(' TEXT', '')))
+		if season == None:
+			cur.execute("DELETE FROM %s"%tablename)
+			cur.executemany("INSERT INTO %s VALUES (?,?,?,?,?)"%tablename, [[proj_id, metric, n, mean, m2] for (proj_id, metric), (n, mean, m2) in self.acc.items()])
+		else:
+			cur.execute("DELETE FROM %s WHERE season = ?"%tablename, (season,))
+			cur.executemany("INSERT INTO %s VALUES (?,?,?,?,?,?)"%tablename, [[season, proj_id, metric, n, mean, m2] for (proj_id, metric), (n, mean, m2) in self.acc.items()])
+		con.commit()
+		con.close()
+		self.logger.info("%s accumulators have been written to %s"%(len(self.acc), tablename))
+
+
+	def save_clusters(self, db_filepath, tablename, season):
+		"""writes (replaces) the values each cluster added (self.clusters) of the season to the table"""
+		con = sqlite3.connect(db_filepath)
+		cur = con.cursor()
+		cur.execute("""CREATE TABLE IF NOT EXISTS %s (season TEXT, proj_id TEXT, cluster_number TEXT, cluster_uid TEXT, effective_density REAL,
+					site_occupancy REAL, spc_percents TEXT, PRIMARY KEY (season, proj_id, cluster_number))"""%tablename)
+		cur.execute("DELETE FROM %s WHERE season = ?"%tablename, (season,))
+		cur.executemany("INSERT INTO %s VALUES (?,?,?,?,?,?,?)"%tablename, [[season, proj_id, clus_num, clus_uid, eff_dens, site_occ, str(spc_percents)]
+						for (proj_id, clus_num), (clus_uid, eff_dens, site_occ, spc_percents) in self.clusters.items()])
+		con.commit()
+		con.close()
+		self.logger.info("%s clusters have been written to %s"%(len(self.clusters), tablename))
+
+
+	def load(self, db_filepath, tablename, clus_tablename, season):
+		"""reads the accumulators and the clusters of the season saved by save and save_clusters. nothing is read if the tables don't exist yet"""
+		con = sqlite3.connect(db_filepath)
+		tables = [row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+		if tablename in tables and clus_tablename in tables:
+			for proj_id, metric, n, mean, m2 in con.execute("SELECT proj_id, metric, n, mean, m2 FROM %s WHERE season = ?"%tablename, (season,)):
+				self.set_acc(proj_id, metric, (n, mean, m2))
+			for proj_id, clus_num, clus_uid, eff_dens, site_occ, spc_percents in con.execute("""SELECT proj_id, cluster_number, cluster_uid, effective_density,
+						site_occupancy, spc_percents FROM %s WHERE season = ?"""%clus_tablename, (season,)):
+				self.clusters[(proj_id, clus_num)] = [clus_uid, eff_dens, site_occ, eval(spc_percents)]
+				for metric in self.clusters[(proj_id, clus_num)][3].keys():
+					self.num_found[(proj_id, metric)] = self.num_found.get((proj_id, metric), 0) + 1
+		con.close()
+		self.logger.info("%s accumulators and %s clusters of season %s have been read from %s"%(len(self.acc), len(self.clusters), season, db_filepath))
+
+
+
+
+
+# testing
+if __name__ == '__main__':
+	import os, log
+	logfile = os.path.basename(__file__) + '_deleteMeLater.txt'
+	logger = log.logger(logfile, debug = True)
+	attr = {'c_proj_id': 'proj_id', 'c_clus_num': 'cluster_number', 'c_clus_uid': 'cluster_uid', 'c_eff_dens': 'effective_density', 'c_site_occ': 'site_occ',
+		'c_spc_comp_perc': 'spc_comp_perc', 'c_spc_comp_perc_by_grouping': 'spc_comp_perc_by_grouping'}
+	clusters = [{'proj_id': 'P-1', 'cluster_number': '101', 'cluster_uid': 1, 'effective_density': 2500.0, 'site_occ': 0.75, 'spc_comp_perc': {'BF': 50.0, 'SB': 50.0}, 'spc_comp_perc_by_grouping': {'SpeciesGroup': {'BF': 50.0, 'SX': 50.0}}},
+		{'proj_id': 'P-1', 'cluster_number': '102', 'cluster_uid': 2, 'effective_density': 0.0, 'site_occ': 0.0, 'spc_comp_perc': {}, 'spc_comp_perc_by_grouping': {'SpeciesGroup': {}}},
+		{'proj_id': 'P-1', 'cluster_number': '103', 'cluster_uid': 3, 'effective_density': 1250.0, 'site_occ': 0.5, 'spc_comp_perc': {'PJ': 100.0}, 'spc_comp_perc_by_grouping': {'SpeciesGroup': {'PJ': 100.0}}}]
+	resurveyed = {'proj_id': 'P-1', 'cluster_number': '103', 'cluster_uid': 4, 'effective_density': 1875.0, 'site_occ': 0.625, 'spc_comp_perc': {'BF': 100.0}, 'spc_comp_perc_by_grouping': {'SpeciesGroup': {'BF': 100.0}}}
+	metrics = ['effective_density', 'site_occupancy', 'spc:BF', 'spc:PJ', 'spc_grp:SpeciesGroup:SX']
+
+	# all at once vs. merged batches
+	acc_all = Proj_accumulator(attr, logger)
+	acc_all.update(clusters)
+	acc_a = Proj_accumulator(attr, logger)
+	acc_a.update(clusters[:1])
+	acc_b = Proj_accumulator(attr, logger)
+	acc_b.update(clusters[1:])
+	acc_a.merge(acc_b)
+	for metric in metrics:
+		print(metric, acc_all.stats('P-1', metric), acc_a.stats('P-1', metric))
+
+	# the next run: cluster 103 re-surveyed and cluster 102 gone. same stats as building from those clusters from scratch
+	db_filepath = os.path.basename(__file__) + '_deleteMeLater.sqlite'
+	acc_all.save(db_filepath, 'acc', season = '2021')
+	acc_all.save_clusters(db_filepath, 'acc_clusters', season = '2021')
+	acc_next = Proj_accumulator(attr, logger)
+	acc_next.load(db_filepath, 'acc', 'acc_clusters', season = '2021')
+	acc_next.remove_missing(acc_next.update([clusters[0], resurveyed]))
+	acc_new = Proj_accumulator(attr, logger)
+	acc_new.update([clusters[0], resurveyed])
+	for metric in metrics:
+		print(metric, acc_next.stats('P-1', metric), acc_new.stats('P-1', metric))
+	os.remove(db_filepath)
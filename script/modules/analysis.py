@@ -1,18 +1,18 @@
 # this module gathers and analysis whatever data we have so far 
 # and outputs plot_summary, cluster_summary, and project_summary tables in the sqlite database.
 
-import os, csv, sqlite3, shutil
+import os, csv, sqlite3, shutil, zipfile, itertools, operator, concurrent.futures
 
 # importing custom modules
 if __name__ == '__main__':
-	import common_functions, mymath
+	import common_functions, mymath, accumulator, records, sql_metrics
 else:
-	from modules import common_functions, mymath
+	from modules import common_functions, mymath, accumulator, records, sql_metrics
 
 
 
 class Run_analysis:
-	def __init__(self, cfg_dict, db_filepath, clearcut_tbl_name, shelterwood_tbl_name, spc_to_check, spc_group_dict, logger):
+	def __init__(self, cfg_dict, db_filepath, clearcut_tbl_name, shelterwood_tbl_name, spc_registry, logger):
 		# input variables
 		self.cfg_dict = cfg_dict
 		self.fin_proj_id = cfg_dict['SQLITE']['fin_proj_id'] # this project id attribute now exists in Cluster_Survey table.
@@ -20,9 +20,29 @@ class Run_analysis:
 		self.clus_summary_tblname = cfg_dict['SQLITE']['clus_summary_tblname']
 		self.proj_summary_tblname = cfg_dict['SQLITE']['proj_summary_tblname']
 		self.plot_summary_tblname = cfg_dict['SQLITE']['plot_summary_tblname']		
+		self.plot_tally_tblname = cfg_dict['SQLITE']['plot_tally_tblname']
+		self.proj_clus_tblname = cfg_dict['SQLITE']['proj_clus_tblname']
+		self.proj_accum_tblname = cfg_dict['SQLITE']['proj_accum_tblname']
+		self.proj_accum_clus_tblname = cfg_dict['SQLITE']['proj_accum_clus_tblname']
+		self.warehouse_db = cfg_dict['WAREHOUSE']['warehouse_db'].strip() # the accumulators are kept here between runs (blank = no warehouse)
+		self.season = cfg_dict['WAREHOUSE']['season']
+		self.create_z_views = True if cfg_dict['SQLITE']['create_z_views'].upper() == 'TRUE' else False
+
+		# indexes to be created on each of the output tables. eg. ['proj_id', ('silvsys', 'cluster_uid')]
+		# (the attribute names of the summary tables are defined in define_attr_names method)
+		self.clus_summary_indexes = ['proj_id', 'cluster_number', ('silvsys', 'cluster_uid')]
+		self.proj_summary_indexes = ['proj_id']
+		self.plot_summary_indexes = ['proj_id', ('silvsys', 'cluster_uid', 'plot_num')]
+		self.plot_tally_indexes = ['proj_id', 'spc', ('silvsys', 'cluster_uid', 'plot_num')]
 		self.max_num_of_t_per_sqm = float(cfg_dict['CALC']['max_num_of_t_per_sqm']) # 0.5 
 		# self.calc_max = int(cfg_dict['CALC']['num_of_trees_4_spcomp'])
 		self.num_of_plots = int(cfg_dict['CALC']['num_of_plots'])
+		self.bootstrap_ci = True if cfg_dict['CALC']['bootstrap_ci'].upper() == 'TRUE' else False
+		self.bootstrap_replicates = int(cfg_dict['CALC']['bootstrap_replicates']) # eg. 2000
+		self.bootstrap_seed = int(cfg_dict['CALC']['bootstrap_seed'])
+		self.bootstrap_workers = int(cfg_dict['CALC']['bootstrap_workers']) # 0 = number of cpus
+		self.streaming = True if cfg_dict['CALC']['streaming'].upper() == 'TRUE' else False
+		self.sql_metrics = True if cfg_dict['CALC']['sql_metrics'].upper() == 'TRUE' else False
 		self.clearcut_plot_area = 8 # sq m
 		self.shelterwood_plot_area = 16 # sq m
 		self.db_filepath = db_filepath
@@ -35,20 +55,20 @@ class Run_analysis:
 		self.clearcut_tbl_name = clearcut_tbl_name
 		self.shelterwood_tbl_name = shelterwood_tbl_name
 		self.logger = logger
-		self.spc_to_check = spc_to_check # eg. ['BF', 'BW', 'CE', 'LA', 'PO', 'PT', 'SB', 'SW']
-		self.spc_group_dict = spc_group_dict # eg. {'BF': ['BF'], 'BW': ['BW'], 'CE': ['CE'], 'LA': ['LA'], 'PO': ['PO'], 'PT': ['PT'], 'SX': ['SB', 'SW']}
+		self.spc_registry = spc_registry # species.Species_registry instance built from SpeciesGroup.csv
+		self.spc_to_check = spc_registry.spc_to_check # eg. ['BF', 'BW', 'CE', 'LA', 'PO', 'PT', 'SB', 'SW']
+		self.spc_group_dict = spc_registry.spc_group_dict # eg. {'BF': ['BF'], 'BW': ['BW'], 'CE': ['CE'], 'LA': ['LA'], 'PO': ['PO'], 'PT': ['PT'], 'SX': ['SB', 'SW']}
 
 		# static variable
 		self.ecosite_choices = ['dry','fresh','moist','wet', 'not applicable']
 
 		# instance variables to be assigned as we go through each module.
-		self.cc_cluster_in_dict = [] # eg. [{'unique_id': 1, 'ClusterNumber': '1101', 'UnoccupiedPlot1': 'No', 'UnoccupiedreasonPlot1': '', 'Tree1SpeciesNamePlot1': 'BF (fir, balsam)', 'Tree1HeightPlot1': '1.8',...}]
-		self.sh_cluster_in_dict = [] # both cc_cluster_in_dict and sh_cluster_in_dict will be summarized into clus_summary_dict_lst
+		self.cc_cluster_rows = [] # records of the clearcut_survey table as plain tuples eg. [(1, '1101', 'No', '', 'BF (fir, balsam)', '1.8',...)]
+		self.sh_cluster_rows = [] # both cc_cluster_rows and sh_cluster_rows will be summarized into clus_summary_dict_lst
+		self.survey_cols = {} # column index plan of each survey table eg. {'CC': {'ClusterNumber': 3, ..., 'plots': [...]}, 'SH': {...}}. see column_plan method
 
 		self.clus_summary_dict_lst = [] # A list of dictionaries with each dictionary representing a cluster.
 		self.proj_summary_dict_lst = [] # A list of dictionaries with each dictionary representing a project.
-		self.plot_summary_dict_lst_cc = [] # A list of dictionaries with each dictionary representing a plot.
-		self.plot_summary_dict_lst_sh = [] # A list of dictionaries with each dictionary representing a plot.
 
 		self.logger.info("\n")
 		self.logger.info("--> Running analysis module")
@@ -58,18 +78,47 @@ class Run_analysis:
 	def sqlite_to_dict(self):
 		"""
 		turn the tables in the sqlite database into lists of dictionaries.
+		the survey tables have 200+ columns, so their records are kept as plain tuples and read through the column plan of the table (see column_plan)
 		"""
-		self.cc_cluster_in_dict = common_functions.sqlite_2_dict(self.db_filepath, self.clearcut_tbl_name) # clearcut_survey table in the sqlite to a list of dictionary
-		self.sh_cluster_in_dict = common_functions.sqlite_2_dict(self.db_filepath, self.shelterwood_tbl_name) # shelterwood_survey table in the sqlite to a list of dictionary
+		cc_columns, self.cc_cluster_rows = common_functions.sqlite_2_tuples(self.db_filepath, self.clearcut_tbl_name) # clearcut_survey table in the sqlite to a list of tuples
+		sh_columns, self.sh_cluster_rows = common_functions.sqlite_2_tuples(self.db_filepath, self.shelterwood_tbl_name) # shelterwood_survey table in the sqlite to a list of tuples
+		self.survey_cols = {'CC': self.column_plan(cc_columns, 'CC'), 'SH': self.column_plan(sh_columns, 'SH')}
 		self.prj_shp_in_dict = common_functions.sqlite_2_dict(self.db_filepath, self.prj_shp_tbl_name) # projects_shp table in the sqlite to a list of dictionary
 
-		if len(self.cc_cluster_in_dict) > 1:
-			self.logger.debug("Printing the first SURVEYED clearcut record (total %s records):\n%s\n"%(len(self.cc_cluster_in_dict),self.cc_cluster_in_dict[0]))
-		if len(self.sh_cluster_in_dict) > 1:
-			self.logger.debug("Printing the first SURVEYED shelterwood record (total %s records):\n%s\n"%(len(self.sh_cluster_in_dict),self.sh_cluster_in_dict[0]))
+		if len(self.cc_cluster_rows) > 1:
+			self.logger.debug("Printing the first SURVEYED clearcut record (total %s records):\n%s\n"%(len(self.cc_cluster_rows),dict(zip(cc_columns, self.cc_cluster_rows[0]))))
+		if len(self.sh_cluster_rows) > 1:
+			self.logger.debug("Printing the first SURVEYED shelterwood record (total %s records):\n%s\n"%(len(self.sh_cluster_rows),dict(zip(sh_columns, self.sh_cluster_rows[0]))))
 		self.logger.debug("Printing the first SHPFILE project record (total %s records):\n%s\n"%(len(self.prj_shp_in_dict),self.prj_shp_in_dict[0]))
 
 
+
+	def column_plan(self, columns, silvsys):
+		"""
+		resolves the index of every survey table column the analysis reads, once per table, so the records can be read as plain tuples
+		without building the column names (eg. 'Species'+str(spc_num)+'SpeciesNamePlot'+plotnum) again for each cluster.
+		columns is the list of column names of the clearcut_survey (silvsys = 'CC') or shelterwood_survey (silvsys = 'SH') table.
+		returns a dictionary of the column indexes eg. {'ClusterNumber': 3, 'latitude': 5, ..., 'plots': [plot1, plot2, ...]}
+		where each plot is eg. {'name': 'P1', 'comments': 40, 'photos': 41, 'unoccupied': 42, 'reason': 43, 'spc': [(44, 45), (46, 47), ...]}
+		and 'spc' is (name_idx, count_idx) of Species1 ~ Species4 for CC or Species1 ~ Species6 for SH (species 1~3: 8m2 plot.  species 4~6: 16m2 plot)
+		a column missing in the table raises KeyError here rather than halfway through the clusters.
+		"""
+		idx = {name: i for i, name in enumerate(columns)}
+		plan = {name: idx[name] for name in [self.unique_id, self.fin_proj_id, 'ClusterNumber', 'latitude', 'longitude', 'CreationDateTime', 
+				'GeneralComment', 'CommentsEcosite', 'ClusterPhoto', 'MoistureEcosite', 'NutrientEcosite01', 'Surveyors', 'ForestManagementUnit', 'DistrictName']}
+		num_of_spc = 4 if silvsys == 'CC' else 6
+		plan['plots'] = []
+		for i in range(self.num_of_plots):
+			plotnum = str(i+1)
+			plan['plots'].append({'name': 'P' + plotnum, 
+				'comments': idx['CommentsPlot'+plotnum], 
+				'photos': idx['PhotosPlot'+plotnum], 
+				'unoccupied': idx['UnoccupiedPlot'+plotnum], 
+				'reason': idx['UnoccupiedreasonPlot'+plotnum], 
+				'spc': [(idx['Species'+str(spc_num)+'SpeciesNamePlot'+plotnum], idx['Species'+str(spc_num)+'NumberofTreesPlot'+plotnum]) for spc_num in range(1, num_of_spc+1)]})
+		return plan
+
+
 	def define_attr_names(self):
 		"""
 		It's time to manipulate the raw data from the field.
@@ -105,6 +154,8 @@ class Run_analysis:
 		self.c_spc_comp_grp = 'spc_comp_grp' # number of trees for each species group {'BF': 1, 'LA': 1, 'SX': 8}
 		self.c_spc_comp_perc = 'spc_comp_perc' # same as c_spc_comp, but in percent. eg {'BF': 10.0, 'LA': 10.0, 'SW': 80.0}
 		self.c_spc_comp_grp_perc = 'spc_comp_grp_perc' # {'LA': 46.7, 'SX': 53.3}
+		self.c_spc_comp_by_grouping = 'spc_comp_by_grouping' # c_spc_comp_grp for each species grouping. eg. {'SpeciesGroup': {'LA': 7, 'SX': 8}, 'SpeciesGroup_short': {'LA': 7, 'SX': 8}}
+		self.c_spc_comp_perc_by_grouping = 'spc_comp_perc_by_grouping' # c_spc_comp_grp_perc for each species grouping. eg. {'SpeciesGroup': {'LA': 46.7, 'SX': 53.3}, 'SpeciesGroup_short': {...}}
 
 		self.c_ecosite = 'ecosite_moisture' # moisture and nutrient eg. 'wet'
 		self.c_eco_nutri = 'ecosite_nutrient' # eg. 'very rich'
@@ -164,6 +215,8 @@ class Run_analysis:
 		self.p_spc_grp_data = 'species_grp_data_percent' # eg. {'BF': {'189': 0, '183': 7.1, '184': 18.2, '190': 10.0}, 'SX': {'189': 70.0, '183': 85.7, '184': 72.7, '190': 80.0},...}
 		self.p_spc = 'spcomp' # 'mean', 'stdv',... for each species. eg. {'BW': {'mean': 7.42, 'stdv': 12.9916, 'ci': 16.1312, 'upper_ci': 23.5512, 'lower_ci': -8.7112, 'n': 5, 'confidence': 0.95}, 'BN': {'mean': 1.24,...
 		self.p_spc_grp = 'spcomp_grp' # 'mean', 'stdv', 'ci', 'upper_ci', 'lower_ci', 'n' for each species group
+		self.p_spc_grp_data_by_grouping = 'species_grp_data_by_grouping' # p_spc_grp_data for each species grouping. eg. {'SpeciesGroup': {'SX': {'189': 70.0, '183': 85.7}...}, 'SpeciesGroup_short': {...}}
+		self.p_spc_grp_by_grouping = 'spcomp_by_grouping' # p_spc_grp for each species grouping. eg. {'SpeciesGroup': {'SX': {'mean': 70.4, 'stdv': 16.1,...}...}, 'SpeciesGroup_short': {...}}
 
 		self.p_ecosite_data = 'ecosite_data' # {'109':['moist','rich in nutrient','some comment'], '103':['dry','',''],...}
 		self.p_eco_moisture = 'ecosite_moisture' # {'moist': 8, 'wet': 2}
@@ -178,11 +231,20 @@ class Run_analysis:
 		self.clus_summary_attr = {k:v for k,v in vars(self).items() if k[:2]=='c_'} # eg. {'c_clus_uid': 'cluster_uid', 'c_clus_num': 'cluster_number', 'c_proj_id': 'proj_id',...}
 		self.proj_summary_attr = {k:v for k,v in vars(self).items() if k[:2]=='p_'}	
 
+		# the cluster and project summaries are records of these types rather than dictionaries (see records.py).
+		# the values of each plot are in fixed slots too. eg. c_site_occ_raw is a Plot_values record {'P1': 1, 'P2': 0, ...}
+		plotnames = ['P' + str(i+1) for i in range(self.num_of_plots)] # eg. ['P1', 'P2', ..., 'P8']
+		self.Clus_summary = records.record_type('Clus_summary', self.clus_summary_dict.keys())
+		self.Proj_summary = records.record_type('Proj_summary', self.proj_summary_dict.keys())
+		self.Plot_values = records.record_type('Plot_values', plotnames) # c_spc_count, c_site_occ_raw, c_site_occ_reason
+		self.Clus_photos = records.record_type('Clus_photos', ['cluster'] + plotnames) # c_photos, c_local_sync_photopath, c_sharepoint_photopath
+		self.Clus_comments = records.record_type('Clus_comments', ['cluster', 'ecosite'] + plotnames) # c_comments
+
 
 
 	def summarize_clusters(self):
 		"""
-		this module will go through each dictionary in self.cluster_in_dict.
+		this module will go through each record in self.cc_cluster_rows and self.sh_cluster_rows.
 		Each dictionary will be summarized and reformated to clus_summary_dict to the format much easier for further analysis.
 		Dependancies - changes in the following attribute names in terraflex will break the code:
 		'ClusterNumber', 
@@ -191,258 +253,272 @@ class Run_analysis:
 		self.logger.info('Running Summarize_clusters method')
 
 		# loop through each cluster (i.e. each record in clearcut_survey and shelterwood_survey table)
-		for silvsys, cluster_in_dict in {'CC': self.cc_cluster_in_dict, 'SH': self.sh_cluster_in_dict}.items():
-			for cluster in cluster_in_dict:
-				# record dictionary will act as a template for this cluster and the values will be filled out as we go.
-				# for example, {'UnoccupiedPlot1': 'No', 'UnoccupiedreasonPlot1': '', 'Tree1SpeciesNamePlot1': 'Bf (fir, balsam)', 'Tree1HeightPlot1': '5', 'Tree2SpeciesNamePlot1': 'Sw (spruce, white)', 'Tree2HeightPlot1': '2', 'Tree3SpeciesNamePlot1': 'Sw (spruce, white)', 'Tree3HeightPlot1': '2'...}
-				self.logger.debug("\tWorking on Proj[%s] Clus[%s]..."%(cluster[self.fin_proj_id], cluster['ClusterNumber']))
-				record = self.clus_summary_dict.copy() # each record is one cluster in a dictionary form
-
-				record[self.c_clus_uid] = cluster[self.unique_id] # cluster unique id
-				record[self.c_clus_num] = cluster['ClusterNumber']
-				record[self.c_proj_id] = cluster[self.fin_proj_id] # fin_proj_id
-				record[self.c_lat] = cluster['latitude']
-				record[self.c_lon] = cluster['longitude']
-				record[self.c_creation_date] = cluster['CreationDateTime'][:10] # eg. '2021-09-09'
-				record[self.c_silvsys] = silvsys # 'CC' or 'SH'
-
-
-				c_site_occ_raw = {} # {'P1':1, 'P2':0, ...} 1 if occupied, 0 if unoccupied
-				site_occ = self.num_of_plots  # eg. 8.  Starts with total number of plots and as we find unoccup plots, deduct 1.
-				site_occ_reason = {}  # this will end up being a list of all unoccup reasons eg. {'P1':'', 'P2': 'Road', ...}
-
-				# c_all_spc_raw = {} # num of spc for both 8m2 and 16m2. eg. {'P1':{'BW':2, 'SW':1}, 'P2':{'MR':1} ...} 
-				# c_all_spc = {} # all VALID species collected and height (for effective density calc). eg. {'P1':[['BF', 5.0], ['SW', 2.0], ['SW', 2.0]], 'P2':[['SW', 1.5]], ...}
-				c_num_trees = 0 # total number of trees collected (for effective density calc) eg. 15.
-				c_eff_dens =0 # number of trees per hectare. (total number of trees in a cluster*10000/(8plots * 8m2))
-
-				# c_spc = [] # selected VALID tallestest trees for each plot will be appended to this list e.g. [[['Bf', 5.0], ['Sw', 2.0], ['Sw', 2.0]], [['La', 3.0]], [['Sw', 1.6], ['Sw', 1.9]],...]
-				c_spc_count = {} # eg. {'P1':[{'BW':2, 'SW':1}, {}], 'P2': None ...} 
-				invalid_spc_codes = [] 
-				comments_dict = {'cluster':cluster['GeneralComment'], 'ecosite':cluster['CommentsEcosite']} # eg. {'cluster': '7 staff', 'P1': 'all residual trees', ... }
-				photos_dict = {'cluster':cluster['ClusterPhoto']} # eg. {'cluster':'www.photos/03','P1':'www.photos/01|www.photos/02', 'P2':'',...}
-
-				# looping through each plot (1-8)
-				for i in range(self.num_of_plots):
-					plotnum = str(i+1)
-					plotname = 'P' + plotnum
-
-					# grab comments and photos
-					comments = cluster['CommentsPlot'+plotnum]
-					photos = cluster['PhotosPlot'+plotnum]
-					comments_dict[plotname] = comments.replace("'","") # having apostrophe causes trouble later
-					photos_dict[plotname] = photos
-					c_site_occ_raw[plotname] = 1
-					site_occ_reason[plotname] = ''
-					p_num_trees = 0 # total number of trees collected for each plot
-
-					# grab species
-					# if the plot is unoccupied, record it and move on.
-					if cluster['UnoccupiedPlot'+plotnum] == 'Yes':
-						site_occ -= 1
-						c_site_occ_raw[plotname] = 0
-						site_occ_reason[plotname] = (cluster['UnoccupiedreasonPlot'+plotnum])
-						c_spc_count[plotname] = None # eg. {'P2': None}
-
-					# if the plot is occupied then do the following:
-					# the goal is to populate c_spc_count # eg. {'P1':[{'BW':2, 'SW':1}, {}], 'P2': None ...} 
-					else:
-						if silvsys == 'CC':
-							# Species1SpeciesNamePlot1 ~ Species4SpeciesNamePlot8  # up to 4 species, 8 plots
-							# Species1NumberofTreesPlot1 ~ Species4NumberofTreesPlot8 # x number of trees per species
-							# loop through 1-4
-							spc_dict_8m2 = {} # eg. {'BW':2, 'SW':1}
-							spc_dict_16m2 = {} # only for sh
-							for spc_num in range(1,5):
-								spc_name = cluster['Species'+str(spc_num)+'SpeciesNamePlot'+plotnum] # eg. 'Bf (fir, balsam)' or ''
-								if len(spc_name) >= 2:
-									spc_name = spc_name + ' ' # some species codes are 3 letters, so this is necessary
-									spc_code = spc_name[:3].strip().upper()  # this turns 'Bf (fir, balsam)' into 'BF'
-									if spc_code not in self.spc_to_check:
-										self.logger.info("Invalid Species Name Found (and will not be counted): PrjID=%s, Clus=%s, SpeciesName=%s"%(cluster[self.fin_proj_id], cluster['ClusterNumber'],spc_name))
-										invalid_spc_codes.append(spc_name)
-										continue # move on to the next species without running any of the scripts below within this for loop
-								else:
-									spc_code = None
-									continue # move on to the next species
+		for silvsys, cluster_rows in {'CC': self.cc_cluster_rows, 'SH': self.sh_cluster_rows}.items():
+			for cluster in cluster_rows:
+				self.clus_summary_dict_lst.append(self.summarize_cluster(cluster, silvsys))
 
-								# below will run only if we have a species code such as "Bf"
-								spc_count_raw = cluster['Species'+str(spc_num)+'NumberofTreesPlot'+plotnum] # eg. '2' or ''
-								if spc_count_raw in ['0', '', None]:
-									continue # move on to the next species
-								else:
-									spc_count = int(spc_count_raw)
-									c_num_trees += spc_count
-									p_num_trees += spc_count
-									if spc_code in spc_dict_8m2.keys():
-										spc_dict_8m2[spc_code] += spc_count
-									else:
-										spc_dict_8m2[spc_code] = spc_count # eg. {'BW':2}
-							# sum up
-							c_spc_count[plotname] = [spc_dict_8m2, spc_dict_16m2] # eg. {'P1':[{'BW':2, 'SW':1}, {}] }
-
-						elif silvsys == 'SH':
-							# Species1SpeciesNamePlot1 ~ Species6SpeciesNamePlot8  # species 1~3: 8m2 plot.  species 4~6: 16m2 plot
-							# Species1NumberofTreesPlot1 ~ Species6NumberofTreesPlot8 # x number of trees per species
-							# loop through 1-6
-							spc_dict_8m2 = {} # eg. {'BW':2, 'SW':1}
-							spc_dict_16m2 = {} # only for sh
-							for spc_num in range(1,7):
-								spc_name = cluster['Species'+str(spc_num)+'SpeciesNamePlot'+plotnum] # eg. 'Bf (fir, balsam)' or ''
-								if len(spc_name) >= 2:
-									spc_name = spc_name + ' ' # some species codes are 3 letters, so this is necessary
-									spc_code = spc_name[:3].strip().upper()  # this turns 'Bf (fir, balsam)' into 'BF'
-									if spc_code not in self.spc_to_check:
-										self.logger.info("!!!! Invalid Species Name Found (and will not be counted): PrjID=%s, Clus=%s, SpeciesName=%s"%(cluster[self.proj_id], cluster['ClusterNumber'],spc_name))
-										invalid_spc_codes.append(spc_name)
-										continue # move on to the next species without running any of the scripts below within this for loop
-								else:
-									spc_code = None
-									continue # move on to the next species
 
-								# below will run only if we have a species code such as "Bf"
-								spc_count_raw = cluster['Species'+str(spc_num)+'NumberofTreesPlot'+plotnum] # eg. '2' or ''
-								if spc_count_raw in ['0', '', None]:
-									continue # move on to the next species
+
+	def summarize_cluster(self, cluster, silvsys):
+		"""
+		summarizes one cluster (a record of clearcut_survey or shelterwood_survey table as a tuple) and returns the cluster summary record.
+		silvsys is 'CC' or 'SH' - the table the cluster came from. the values of the cluster are read through the column plan of that table (self.survey_cols[silvsys])
+		"""
+		# record dictionary will act as a template for this cluster and the values will be filled out as we go.
+		# for example, {'UnoccupiedPlot1': 'No', 'UnoccupiedreasonPlot1': '', 'Tree1SpeciesNamePlot1': 'Bf (fir, balsam)', 'Tree1HeightPlot1': '5', 'Tree2SpeciesNamePlot1': 'Sw (spruce, white)', 'Tree2HeightPlot1': '2', 'Tree3SpeciesNamePlot1': 'Sw (spruce, white)', 'Tree3HeightPlot1': '2'...}
+		col = self.survey_cols[silvsys] # eg. col['ClusterNumber'] = 3 is the index of ClusterNumber in the cluster's tuple
+		proj_id = cluster[col[self.fin_proj_id]]
+		clus_num = cluster[col['ClusterNumber']]
+		self.logger.debug("\tWorking on Proj[%s] Clus[%s]..."%(proj_id, clus_num))
+		record = self.Clus_summary() # each record is one cluster (all values '' for now)
+
+		record[self.c_clus_uid] = cluster[col[self.unique_id]] # cluster unique id
+		record[self.c_clus_num] = clus_num
+		record[self.c_proj_id] = proj_id # fin_proj_id
+		record[self.c_lat] = cluster[col['latitude']]
+		record[self.c_lon] = cluster[col['longitude']]
+		record[self.c_creation_date] = cluster[col['CreationDateTime']][:10] # eg. '2021-09-09'
+		record[self.c_silvsys] = silvsys # 'CC' or 'SH'
+
+
+		c_site_occ_raw = self.Plot_values() # {'P1':1, 'P2':0, ...} 1 if occupied, 0 if unoccupied
+		site_occ = self.num_of_plots  # eg. 8.  Starts with total number of plots and as we find unoccup plots, deduct 1.
+		site_occ_reason = self.Plot_values()  # this will end up being a list of all unoccup reasons eg. {'P1':'', 'P2': 'Road', ...}
+
+		# c_all_spc_raw = {} # num of spc for both 8m2 and 16m2. eg. {'P1':{'BW':2, 'SW':1}, 'P2':{'MR':1} ...} 
+		# c_all_spc = {} # all VALID species collected and height (for effective density calc). eg. {'P1':[['BF', 5.0], ['SW', 2.0], ['SW', 2.0]], 'P2':[['SW', 1.5]], ...}
+		c_num_trees = 0 # total number of trees collected (for effective density calc) eg. 15.
+		c_eff_dens =0 # number of trees per hectare. (total number of trees in a cluster*10000/(8plots * 8m2))
+
+		# c_spc = [] # selected VALID tallestest trees for each plot will be appended to this list e.g. [[['Bf', 5.0], ['Sw', 2.0], ['Sw', 2.0]], [['La', 3.0]], [['Sw', 1.6], ['Sw', 1.9]],...]
+		c_spc_count = self.Plot_values() # eg. {'P1':[{'BW':2, 'SW':1}, {}], 'P2': None ...} 
+		invalid_spc_codes = [] 
+		comments_dict = self.Clus_comments() # eg. {'cluster': '7 staff', 'ecosite': '', 'P1': 'all residual trees', ... }
+		comments_dict['cluster'] = cluster[col['GeneralComment']]
+		comments_dict['ecosite'] = cluster[col['CommentsEcosite']]
+		photos_dict = self.Clus_photos() # eg. {'cluster':'www.photos/03','P1':'www.photos/01|www.photos/02', 'P2':'',...}
+		photos_dict['cluster'] = cluster[col['ClusterPhoto']]
+
+		# looping through each plot (1-8)
+		for plot in col['plots']:
+			plotname = plot['name'] # eg. 'P1'
+
+			# grab comments and photos
+			comments = cluster[plot['comments']]
+			photos = cluster[plot['photos']]
+			comments_dict[plotname] = comments.replace("'","") # having apostrophe causes trouble later
+			photos_dict[plotname] = photos
+			c_site_occ_raw[plotname] = 1
+			site_occ_reason[plotname] = ''
+			p_num_trees = 0 # total number of trees collected for each plot
+
+			# grab species
+			# if the plot is unoccupied, record it and move on.
+			if cluster[plot['unoccupied']] == 'Yes':
+				site_occ -= 1
+				c_site_occ_raw[plotname] = 0
+				site_occ_reason[plotname] = (cluster[plot['reason']])
+				c_spc_count[plotname] = None # eg. {'P2': None}
+
+			# if the plot is occupied then do the following:
+			# the goal is to populate c_spc_count # eg. {'P1':[{'BW':2, 'SW':1}, {}], 'P2': None ...} 
+			else:
+				if silvsys == 'CC':
+					# Species1SpeciesNamePlot1 ~ Species4SpeciesNamePlot8  # up to 4 species, 8 plots
+					# Species1NumberofTreesPlot1 ~ Species4NumberofTreesPlot8 # x number of trees per species
+					# loop through 1-4
+					spc_dict_8m2 = {} # eg. {'BW':2, 'SW':1}
+					spc_dict_16m2 = {} # only for sh
+					for name_idx, count_idx in plot['spc']:
+						spc_name = cluster[name_idx] # eg. 'Bf (fir, balsam)' or ''
+						spc_code = self.spc_registry.code(spc_name) # this turns 'Bf (fir, balsam)' into 'BF', and '' into None
+						if spc_code == None:
+							continue # move on to the next species
+						if not self.spc_registry.is_valid(spc_code):
+							self.logger.info("!!!! Invalid Species Name Found (and will not be counted): PrjID=%s, Clus=%s, SpeciesName=%s"%(proj_id, clus_num, spc_name))
+							invalid_spc_codes.append(spc_name)
+							continue # move on to the next species without running any of the scripts below within this for loop
+
+						# below will run only if we have a species code such as "Bf"
+						spc_count_raw = cluster[count_idx] # eg. '2' or ''
+						if spc_count_raw in ['0', '', None]:
+							continue # move on to the next species
+						else:
+							spc_count = int(spc_count_raw)
+							c_num_trees += spc_count
+							p_num_trees += spc_count
+							if spc_code in spc_dict_8m2.keys():
+								spc_dict_8m2[spc_code] += spc_count
+							else:
+								spc_dict_8m2[spc_code] = spc_count # eg. {'BW':2}
+					# sum up
+					c_spc_count[plotname] = [spc_dict_8m2, spc_dict_16m2] # eg. {'P1':[{'BW':2, 'SW':1}, {}] }
+
+				elif silvsys == 'SH':
+					# Species1SpeciesNamePlot1 ~ Species6SpeciesNamePlot8  # species 1~3: 8m2 plot.  species 4~6: 16m2 plot
+					# Species1NumberofTreesPlot1 ~ Species6NumberofTreesPlot8 # x number of trees per species
+					# loop through 1-6
+					spc_dict_8m2 = {} # eg. {'BW':2, 'SW':1}
+					spc_dict_16m2 = {} # only for sh
+					for spc_num, (name_idx, count_idx) in enumerate(plot['spc'], 1):
+						spc_name = cluster[name_idx] # eg. 'Bf (fir, balsam)' or ''
+						spc_code = self.spc_registry.code(spc_name) # this turns 'Bf (fir, balsam)' into 'BF', and '' into None
+						if spc_code == None:
+							continue # move on to the next species
+						if not self.spc_registry.is_valid(spc_code):
+							self.logger.info("!!!! Invalid Species Name Found (and will not be counted): PrjID=%s, Clus=%s, SpeciesName=%s"%(proj_id, clus_num, spc_name))
+							invalid_spc_codes.append(spc_name)
+							continue # move on to the next species without running any of the scripts below within this for loop
+
+						# below will run only if we have a species code such as "Bf"
+						spc_count_raw = cluster[count_idx] # eg. '2' or ''
+						if spc_count_raw in ['0', '', None]:
+							continue # move on to the next species
+						else:
+							spc_count = int(spc_count_raw)
+							c_num_trees += spc_count
+							p_num_trees += spc_count
+							# first 3 species are for 8m2
+							if spc_num in [1,2,3]:
+								if spc_code in spc_dict_8m2.keys():
+									spc_dict_8m2[spc_code] += spc_count
+								else:
+									spc_dict_8m2[spc_code] = spc_count # eg. {'BW':2}
+							# the next 3 species are for 16m2
+							elif spc_num in [4,5,6]:
+								if spc_code in spc_dict_16m2.keys():
+									spc_dict_16m2[spc_code] += spc_count
 								else:
-									spc_count = int(spc_count_raw)
-									c_num_trees += spc_count
-									p_num_trees += spc_count
-									# first 3 species are for 8m2
-									if spc_num in [1,2,3]:
-										if spc_code in spc_dict_8m2.keys():
-											spc_dict_8m2[spc_code] += spc_count
-										else:
-											spc_dict_8m2[spc_code] = spc_count # eg. {'BW':2}
-									# the next 3 species are for 16m2
-									elif spc_num in [4,5,6]:
-										if spc_code in spc_dict_16m2.keys():
-											spc_dict_16m2[spc_code] += spc_count
-										else:
-											spc_dict_16m2[spc_code] = spc_count # eg. {'BW':2}																
-							# sum up
-							c_spc_count[plotname] = [spc_dict_8m2, spc_dict_16m2] # eg. {'P1':[{'BW':2, 'SW':1}, {'BW':2}] }
-						
-						# if the total tree count of this plot is still zero, this site is unoccupied.
-						# this can happen if Unoccupied = No, but the number of total trees in the plot is zero.
-						if p_num_trees == 0: 
-							site_occ -= 1
-							c_site_occ_raw[plotname] = 0
-							site_occ_reason[plotname] = 'Unspecified'
-							c_spc_count[plotname] = None
-
-
-				self.logger.debug("c_spc_count = %s"%(c_spc_count))
-				# eg. TIM-Gil01 201 c_spc_count = {'P1': [{'BF': 1}, {'PJ': 2}], 'P2': None, 'P3': [{'PT': 2, 'LA': 1, 'CE': 2}, {'PJ': 2, 'PW': 1}],
-				# 	'P4': [{'PR': 2, 'SB': 1}, {'PJ': 2}], 'P5': None, 'P6': [{'PW': 2, 'PR': 1}, {}], 'P7': [{}, {}], 'P8': [{'BF': 2}, {'PJ': 3}]}
-				self.logger.debug("c_num_trees = %s"%(c_num_trees))
-
-
-
-				# Calculating effective density (ED)
-				# for clearcut sites, the survey area is 8m2
-				# for shelterwood sites, the survey area is both 8m2 and 16m2
-				# the ED is calculated for 8m2 and 16m2, then the numbers added together for final ED.
-				# for example, a cluster where 14 trees are found in 8m2, and 6 trees in 16m2,
-				# ED = '14trees'x 10000/('8m2'x'8plots') + '6trees'x 10000/('16m2'x'8plots') = 2187.5 + 468.75 = 2656.25
-				tree_count_8m2 = 0
-				tree_count_16m2 = 0
-				for plot_num, spc_info in c_spc_count.items():
-					if spc_info != None:
-						for spc8m2, count8m2 in spc_info[0].items():
-							tree_count_8m2 += count8m2
-						for spc16m2, count16m2 in spc_info[1].items():
-							tree_count_16m2 += count16m2
-				# number of trees for each cluster shouldn't exceed the limit
-				# if we consider upper limit of 0.5 tree per m2, 64x0.5= 32 max trees for CC, and 128x0.5=64 max trees for SH
-				tree_count_max_8m2 = 8*8*self.max_num_of_t_per_sqm
-				tree_count_max_16m2 = 16*8*self.max_num_of_t_per_sqm
-				if tree_count_8m2 > tree_count_max_8m2: tree_count_8m2 = tree_count_max_8m2
-				if tree_count_16m2 > tree_count_max_16m2: tree_count_16m2 = tree_count_max_16m2
-				# Calculate Effective Density
-				c_eff_dens = (tree_count_8m2*10000/(8*8)) + (tree_count_16m2*10000/(16*8))
-				self.logger.debug("c_eff_dens = %s"%(c_eff_dens))
-
-				# Site Occupancy
-				site_occ = float(site_occ)/self.num_of_plots # this will give you the site occupancy value between 0 and 1. eg. site_occ = 0.875, 
-
-				# assemble the collected information to the record dictionary.
-				record[self.c_comments] = comments_dict # eg. {'cluster': '7 staff', 'P1': 'all residual trees', ... }
-				record[self.c_photos] = photos_dict
-				record[self.c_site_occ_raw] = c_site_occ_raw
-				record[self.c_site_occ] = site_occ
-				record[self.c_site_occ_reason] = site_occ_reason # eg. {'P1':'', 'P2': 'Road', ...}
-				record[self.c_spc_count] = c_spc_count # eg. {'P1': [{'BF': 1}, {'PJ': 2}], 'P2': None, ...}
-				record[self.c_num_trees] = c_num_trees # eg. 15
-				record[self.c_eff_dens] = c_eff_dens
-				record[self.c_invalid_spc_code] = invalid_spc_codes # eg. [[],['XY'],[],[],...]
-
-				self.logger.debug("Site Occ = %s"%site_occ)
-				self.logger.debug("photos_dict = %s"%photos_dict)
-
-
-				# we've gathered all the information we need from the cluster_survey table, but we need to summarize them.
-				# summarizing c_spc_count into the following formats:
-				spc_comp = {spc:0 for spc in self.spc_to_check}  # {spcname:count} eg. {'PB': 0, 'PT': 0, 'PO': 0 ...}
-				spc_comp_grp = {spcgrp:0 for spcgrp in self.spc_group_dict.keys()} # {spcgrpname:count} eg. {'PO': 0,...}
-				spc_comp_tree_count = 0 
-
-				# loop through c_spc_count
-				for plot_name, spc_info in c_spc_count.items():
-					if spc_info != None:
-						# spc_info is a list with two dictionaries: eg. [{'PT': 2, 'LA': 1, 'CE': 2}, {'PJ': 2, 'PW': 1}]
-						for spc_count in spc_info:
-							for spc_name, count in spc_count.items(): # eg. spc_name = 'PT' and count = 2
-								spc_comp[spc_name] += count
-								spc_comp_tree_count += count
-								# populate the spc_comp_grp
-								for grp, spcs_lst in self.spc_group_dict.items():
-									if spc_name in spcs_lst:
-										spc_comp_grp[grp] += count
-										break # no need to loop through the rest of the spc_group_dict
-
-				# spc_comp_tree_count should match c_num_trees we derived above. double checking it here
-				if spc_comp_tree_count != c_num_trees:
-					self.logger.info("!!!! ProjID: %s clus %s. Total number of trees error: spc_comp_tree_count=%s, c_num_trees = %s"%(cluster[self.proj_id], 
-						cluster['ClusterNumber'], spc_comp_tree_count, c_num_trees))
-
-				# throw out species where its count = 0
-				spc_comp = {k:v for k,v in spc_comp.items() if v > 0} # eg. {'PB': 2, 'PT': 1, 'PO': 3 ...}
-				spc_comp_grp = {k:v for k,v in spc_comp_grp.items() if v > 0} # eg. {'PO': 6,...}
-
-				# calculate percentage
-				spc_comp_perc = {k:round(float(v)*100/spc_comp_tree_count,1) for k,v in spc_comp.items()}
-				spc_comp_grp_perc = {k:round(float(v)*100/spc_comp_tree_count,1) for k,v in spc_comp_grp.items()}
-
-				self.logger.debug("spc_comp: %s"%spc_comp) # eg. {'BW': 2, 'PB': 1, 'PT': 13}
-				self.logger.debug("spc_comp_grp: %s"%spc_comp_grp) # eg.{'BW': 2, 'PO': 14}
-				self.logger.debug("spc_comp_perc: %s"%spc_comp_perc) # eg. {'BW': 12.5, 'PB': 6.2, 'PT': 81.2}
-				self.logger.debug("spc_comp_grp_perc: %s"%spc_comp_grp_perc) # eg. {'BW': 12.5, 'PO': 87.5}
-
-				# assemble the collected information to the record dictionary.
-				record[self.c_spc_comp] = spc_comp
-				record[self.c_spc_comp_grp] = spc_comp_grp
-				record[self.c_spc_comp_perc] = spc_comp_perc
-				record[self.c_spc_comp_grp_perc] = spc_comp_grp_perc
-
-
-				# ecosite values:
-				ecosite = cluster['MoistureEcosite'] # moisture and nutrient eg. 'wet'
-				eco_nutri = cluster['NutrientEcosite01'] # eg. Poor, Very Poor, Rich...
-				eco_comment = cluster['CommentsEcosite'].replace("'","") # eg. 'this is a landing site'
-
-				self.logger.debug("c_ecosite: %s"%ecosite)
-				self.logger.debug("c_eco_comment: %s"%eco_comment)
-				self.logger.debug("c_eco_nutri: %s"%eco_nutri)
-
-				record[self.c_ecosite] = ecosite
-				record[self.c_eco_comment] = eco_comment
-				record[self.c_eco_nutri] = eco_nutri
-
-
-				# all these records components are assembled and appended as a new record in the cluster summary table.
-				# self.logger.info("cluster summary: %s"%record)
-				self.clus_summary_dict_lst.append(record)
+									spc_dict_16m2[spc_code] = spc_count # eg. {'BW':2}																
+					# sum up
+					c_spc_count[plotname] = [spc_dict_8m2, spc_dict_16m2] # eg. {'P1':[{'BW':2, 'SW':1}, {'BW':2}] }
+				
+				# if the total tree count of this plot is still zero, this site is unoccupied.
+				# this can happen if Unoccupied = No, but the number of total trees in the plot is zero.
+				if p_num_trees == 0: 
+					site_occ -= 1
+					c_site_occ_raw[plotname] = 0
+					site_occ_reason[plotname] = 'Unspecified'
+					c_spc_count[plotname] = None
+
+
+		self.logger.debug("c_spc_count = %s"%(c_spc_count))
+		# eg. TIM-Gil01 201 c_spc_count = {'P1': [{'BF': 1}, {'PJ': 2}], 'P2': None, 'P3': [{'PT': 2, 'LA': 1, 'CE': 2}, {'PJ': 2, 'PW': 1}],
+		# 	'P4': [{'PR': 2, 'SB': 1}, {'PJ': 2}], 'P5': None, 'P6': [{'PW': 2, 'PR': 1}, {}], 'P7': [{}, {}], 'P8': [{'BF': 2}, {'PJ': 3}]}
+		self.logger.debug("c_num_trees = %s"%(c_num_trees))
+
+
+
+		# Calculating effective density (ED)
+		# for clearcut sites, the survey area is 8m2
+		# for shelterwood sites, the survey area is both 8m2 and 16m2
+		# the ED is calculated for 8m2 and 16m2, then the numbers added together for final ED.
+		# for example, a cluster where 14 trees are found in 8m2, and 6 trees in 16m2,
+		# ED = '14trees'x 10000/('8m2'x'8plots') + '6trees'x 10000/('16m2'x'8plots') = 2187.5 + 468.75 = 2656.25
+		tree_count_8m2 = 0
+		tree_count_16m2 = 0
+		for plot_num, spc_info in c_spc_count.items():
+			if spc_info != None:
+				for spc8m2, count8m2 in spc_info[0].items():
+					tree_count_8m2 += count8m2
+				for spc16m2, count16m2 in spc_info[1].items():
+					tree_count_16m2 += count16m2
+		# number of trees for each cluster shouldn't exceed the limit
+		# if we consider upper limit of 0.5 tree per m2, 64x0.5= 32 max trees for CC, and 128x0.5=64 max trees for SH
+		tree_count_max_8m2 = 8*8*self.max_num_of_t_per_sqm
+		tree_count_max_16m2 = 16*8*self.max_num_of_t_per_sqm
+		if tree_count_8m2 > tree_count_max_8m2: tree_count_8m2 = tree_count_max_8m2
+		if tree_count_16m2 > tree_count_max_16m2: tree_count_16m2 = tree_count_max_16m2
+		# Calculate Effective Density
+		c_eff_dens = (tree_count_8m2*10000/(8*8)) + (tree_count_16m2*10000/(16*8))
+		self.logger.debug("c_eff_dens = %s"%(c_eff_dens))
+
+		# Site Occupancy
+		site_occ = float(site_occ)/self.num_of_plots # this will give you the site occupancy value between 0 and 1. eg. site_occ = 0.875, 
+
+		# assemble the collected information to the record dictionary.
+		record[self.c_comments] = comments_dict # eg. {'cluster': '7 staff', 'P1': 'all residual trees', ... }
+		record[self.c_photos] = photos_dict
+		record[self.c_site_occ_raw] = c_site_occ_raw
+		record[self.c_site_occ] = site_occ
+		record[self.c_site_occ_reason] = site_occ_reason # eg. {'P1':'', 'P2': 'Road', ...}
+		record[self.c_spc_count] = c_spc_count # eg. {'P1': [{'BF': 1}, {'PJ': 2}], 'P2': None, ...}
+		record[self.c_num_trees] = c_num_trees # eg. 15
+		record[self.c_eff_dens] = c_eff_dens
+		record[self.c_invalid_spc_code] = invalid_spc_codes # eg. [[],['XY'],[],[],...]
+
+		self.logger.debug("Site Occ = %s"%site_occ)
+		self.logger.debug("photos_dict = %s"%photos_dict)
+
+
+		# we've gathered all the information we need from the cluster_survey table, but we need to summarize them.
+		# summarizing c_spc_count into the following formats:
+		spc_comp = {spc:0 for spc in self.spc_to_check}  # {spcname:count} eg. {'PB': 0, 'PT': 0, 'PO': 0 ...}
+		# spc_comp_grp for each species grouping. eg. {'SpeciesGroup': {'PO': 0,...}, 'SpeciesGroup_short': {'PO': 0,...}}
+		spc_comp_by_grouping = {key:{spcgrp:0 for spcgrp in grp_2_spc_dict.keys()} for key, grp_2_spc_dict in self.spc_registry.groupings.items()}
+		grouping_tree_count = {key:0 for key in self.spc_registry.groupings.keys()} # a grouping may not have all the species
+		spc_comp_tree_count = 0 
+
+		# loop through c_spc_count
+		for plot_name, spc_info in c_spc_count.items():
+			if spc_info != None:
+				# spc_info is a list with two dictionaries: eg. [{'PT': 2, 'LA': 1, 'CE': 2}, {'PJ': 2, 'PW': 1}]
+				for spc_count in spc_info:
+					for spc_name, count in spc_count.items(): # eg. spc_name = 'PT' and count = 2
+						spc_comp[spc_name] += count
+						spc_comp_tree_count += count
+						# populate the spc_comp_grp of each grouping
+						for key, grp in self.spc_registry.groups(spc_name):
+							spc_comp_by_grouping[key][grp] += count
+							grouping_tree_count[key] += count
+
+		# spc_comp_tree_count should match c_num_trees we derived above. double checking it here
+		if spc_comp_tree_count != c_num_trees:
+			self.logger.info("!!!! ProjID: %s clus %s. Total number of trees error: spc_comp_tree_count=%s, c_num_trees = %s"%(proj_id, 
+				clus_num, spc_comp_tree_count, c_num_trees))
+
+		# throw out species where its count = 0
+		spc_comp = {k:v for k,v in spc_comp.items() if v > 0} # eg. {'PB': 2, 'PT': 1, 'PO': 3 ...}
+		spc_comp_by_grouping = {key:{k:v for k,v in grp_comp.items() if v > 0} for key, grp_comp in spc_comp_by_grouping.items()} # eg. {'SpeciesGroup': {'PO': 6,...},...}
+
+		# calculate percentage
+		spc_comp_perc = {k:round(float(v)*100/spc_comp_tree_count,1) for k,v in spc_comp.items()}
+		spc_comp_perc_by_grouping = {key:{k:round(float(v)*100/grouping_tree_count[key],1) for k,v in grp_comp.items()} for key, grp_comp in spc_comp_by_grouping.items()}
+
+		# the species group csv in [SPC] csv is the main grouping
+		spc_comp_grp = spc_comp_by_grouping[self.spc_registry.primary_grouping] # eg. {'PO': 6,...}
+		spc_comp_grp_perc = spc_comp_perc_by_grouping[self.spc_registry.primary_grouping]
+
+		self.logger.debug("spc_comp: %s"%spc_comp) # eg. {'BW': 2, 'PB': 1, 'PT': 13}
+		self.logger.debug("spc_comp_grp: %s"%spc_comp_grp) # eg.{'BW': 2, 'PO': 14}
+		self.logger.debug("spc_comp_perc: %s"%spc_comp_perc) # eg. {'BW': 12.5, 'PB': 6.2, 'PT': 81.2}
+		self.logger.debug("spc_comp_grp_perc: %s"%spc_comp_grp_perc) # eg. {'BW': 12.5, 'PO': 87.5}
+
+		# assemble the collected information to the record dictionary.
+		record[self.c_spc_comp] = spc_comp
+		record[self.c_spc_comp_grp] = spc_comp_grp
+		record[self.c_spc_comp_perc] = spc_comp_perc
+		record[self.c_spc_comp_grp_perc] = spc_comp_grp_perc
+		record[self.c_spc_comp_by_grouping] = spc_comp_by_grouping
+		record[self.c_spc_comp_perc_by_grouping] = spc_comp_perc_by_grouping
+
+
+		# ecosite values:
+		ecosite = cluster[col['MoistureEcosite']] # moisture and nutrient eg. 'wet'
+		eco_nutri = cluster[col['NutrientEcosite01']] # eg. Poor, Very Poor, Rich...
+		eco_comment = cluster[col['CommentsEcosite']].replace("'","") # eg. 'this is a landing site'
+
+		self.logger.debug("c_ecosite: %s"%ecosite)
+		self.logger.debug("c_eco_comment: %s"%eco_comment)
+		self.logger.debug("c_eco_nutri: %s"%eco_nutri)
+
+		record[self.c_ecosite] = ecosite
+		record[self.c_eco_comment] = eco_comment
+		record[self.c_eco_nutri] = eco_nutri
+
+
+		# all these records components are assembled into one record of the cluster summary table.
+		return record
 
 # example cluster summary: {'cluster_uid': 398, 'cluster_number': '21', 'proj_id': 'WAW-NAG-395', 'creation_date': '2021-10-15', 
 # 'silvsys': 'CC', 'spc_count': {'P1': [{'SB': 1}, {}], 'P2': [{'SB': 2}, {}], 'P3': None, 'P4': [{'SB': 1}, {}], 'P5': [{'SB': 1}, {}], 'P6': [{'SB': 2}, {}], 'P7': None, 'P8': [{'BF': 1}, {}]}, 
@@ -461,65 +537,86 @@ class Run_analysis:
 			local sync location = 'C:/Users/kimdan/Government of Ontario/Regeneration Assessment Program - RAP Picture Library/Michaud130_C192_P4.jpg'
 			sharepoint = 'https://ontariogov.sharepoint.com/:i:/r/sites/MNRF-ROD-EXT/RAP/RAP%20Picture%20Library/Michaud130_C192_P4.jpg'
 		third, copy the photos to the local sync location (if the picture is not already there)
+		if the input is TDT's zip file, the photos are copied straight out of the zip.
 		"""
 		self.logger.info("Running photo_alternate_paths method")
-		# we will ultimately alter the self.clus_summary_dict_lst. first, we make a copy of it to loop it and change it as we go.
-		temp_clus_summary_dict_lst = self.clus_summary_dict_lst.copy()
+		zip_file, zip_data_folder = self.open_photo_zip()
 
-		
 		# loop through the cluster summary records (each record is a dictionary)
-		for index, record in enumerate(temp_clus_summary_dict_lst):
-			# these two dictionaries will be filled out and added to the clus_summary_dict_lst's record
-			c_local_sync_photopath = {}
-			c_sharepoint_photopath = {}
-			# loop through the photo dictionary i.e. record['photos']			
-			for location_taken, url_txt in record[self.c_photos].items():
-				# location_taken can be 'cluster' or 'P1'...'P8'
-				# url can be 'images/connectspatial/25aa1a61-367f-4ffk.jpg|images/connectspatial/25aa1a61-367f-4ffa.jpg'
-				
-				c_local_sync_photopath[location_taken] = []
-				c_sharepoint_photopath[location_taken] = []	
-
-				# split the url in case there's more than one urls
-				urls = url_txt.split('|') # eg. ['images/connectspatial/25aa1a61-367f-4ffk.jpg', 'images/connectspatial/25aa1a61-367f-4ffa.jpg']
-				if urls != ['']: # if there's at least one url
-					for num, url in enumerate(urls):
-						# get the original full-path of the photo
-						original_fullpath = os.path.join(self.cfg_dict['INPUT']['inputdatafolderpath'], url) # eg. C:\RAP_2021\data\Regeneration Assessment Program_18-Oct-21_04-55\data\images\connectspatial\25aa1a61-367f-4ffa.jpg
-						filename = os.path.split(original_fullpath)[1] #eg. '25aa1a61-367f-4ffk.jpg'
-						last4letters = filename[-8:-4] #eg. '4ffk' - last 4 characters of the original filename. This makes the picture tracible to the original and makes the filename unique
-
-						# Rename the photo files
-						# proj_id + C + cluster_number + photo_location + last4letters + creation date
-						# For example,
-						# WAW-NAG-395_C28_cluster_4ffk_2021-10-15.jpg
-						# SAU-NSF-4_C16_P1_a23w_2021-10-15.jpg  if there's more than one photo for that location
-						new_filename = "%s_C%s_%s"%(record[self.c_proj_id], record[self.c_clus_num], location_taken) # SAU-NSF-4_C16_P1
-						new_filename += "_%s"%last4letters # _4ffk
-						new_filename += "_%s"%record[self.c_creation_date] # _2021-10-15
-						new_filename = new_filename.replace(' ', '') # no blank space should exist in the name
-						new_filename += filename[-4:] # .jpg
-
-						new_local_fullpath = os.path.join(self.cfg_dict['OUTPUT']['output_photopath'], new_filename) # eg. 'C:/Users/kimdan/Government of Ontario/Regeneration Assessment Program - RAP Picture Library/SAU-NSF-4_C16_P1_4ffk_2021-10-15.jpg'
-						new_sharepoint_fullpath = self.cfg_dict['OUTPUT']['sharepoint_photopath'] + '/' + new_filename # eg. 'https://ontariogov.sharepoint.com/:i:/r/sites/MNRF-ROD-EXT/RAP/RAP%20Picture%20Library/SAU-NSF-4_C16_P1_4ffk_2021-10-15.jpg'
-						
-						# time to copy over!!
-						if not os.path.exists(new_local_fullpath):
-							self.logger.info("Copying photo: %s"%new_filename)
-							print("Copying photo: %s"%new_filename)
-							shutil.copy2(original_fullpath, new_local_fullpath)
-
-						# write the new paths down to the summary dictionary
-						c_local_sync_photopath[location_taken].append(new_local_fullpath) 
-						c_sharepoint_photopath[location_taken].append(new_sharepoint_fullpath) 
-
-			self.clus_summary_dict_lst[index][self.c_local_sync_photopath] = c_local_sync_photopath
-			self.clus_summary_dict_lst[index][self.c_sharepoint_photopath] = c_sharepoint_photopath
+		for record in self.clus_summary_dict_lst:
+			self.photo_paths(record, zip_file, zip_data_folder)
+		if zip_file != None:
+			zip_file.close()
 
 		# for i in range(len(self.clus_summary_dict_lst)):
 		# 	self.logger.info(str(self.clus_summary_dict_lst[i][self.c_local_sync_photopath]))
 		# 	self.logger.info(str(self.clus_summary_dict_lst[i][self.c_sharepoint_photopath]))
 
+
+
+	def open_photo_zip(self):
+		"""returns [zip_file, zip_data_folder] if the input is TDT's zip file, otherwise [None, None]. the zip_file must be closed by the caller."""
+		input_path = self.cfg_dict['INPUT']['inputdatafolderpath']
+		if not common_functions.is_zip_input(input_path):
+			return [None, None]
+		zip_file = zipfile.ZipFile(input_path)
+		return [zip_file, common_functions.zip_data_folder(zip_file)] # eg. 'Regeneration Assessment Program_18-Oct-21_04-55/data/'
+
+
+
+	def photo_paths(self, record, zip_file, zip_data_folder):
+		"""renames and copies the photos of one cluster summary record and adds the local sync and sharepoint paths to the record"""
+		input_path = self.cfg_dict['INPUT']['inputdatafolderpath']
+		# these two dictionaries will be filled out and added to the clus_summary_dict_lst's record
+		c_local_sync_photopath = self.Clus_photos()
+		c_sharepoint_photopath = self.Clus_photos()
+		# loop through the photo dictionary i.e. record['photos']			
+		for location_taken, url_txt in record[self.c_photos].items():
+			# location_taken can be 'cluster' or 'P1'...'P8'
+			# url can be 'images/connectspatial/25aa1a61-367f-4ffk.jpg|images/connectspatial/25aa1a61-367f-4ffa.jpg'
+			
+			c_local_sync_photopath[location_taken] = []
+			c_sharepoint_photopath[location_taken] = []	
+
+			# split the url in case there's more than one urls
+			urls = url_txt.split('|') # eg. ['images/connectspatial/25aa1a61-367f-4ffk.jpg', 'images/connectspatial/25aa1a61-367f-4ffa.jpg']
+			if urls != ['']: # if there's at least one url
+				for num, url in enumerate(urls):
+					# get the original full-path of the photo
+					original_fullpath = os.path.join(input_path, url) # eg. C:\RAP_2021\data\Regeneration Assessment Program_18-Oct-21_04-55\data\images\connectspatial\25aa1a61-367f-4ffa.jpg
+					filename = os.path.split(original_fullpath)[1] #eg. '25aa1a61-367f-4ffk.jpg'
+					last4letters = filename[-8:-4] #eg. '4ffk' - last 4 characters of the original filename. This makes the picture tracible to the original and makes the filename unique
+
+					# Rename the photo files
+					# proj_id + C + cluster_number + photo_location + last4letters + creation date
+					# For example,
+					# WAW-NAG-395_C28_cluster_4ffk_2021-10-15.jpg
+					# SAU-NSF-4_C16_P1_a23w_2021-10-15.jpg  if there's more than one photo for that location
+					new_filename = "%s_C%s_%s"%(record[self.c_proj_id], record[self.c_clus_num], location_taken) # SAU-NSF-4_C16_P1
+					new_filename += "_%s"%last4letters # _4ffk
+					new_filename += "_%s"%record[self.c_creation_date] # _2021-10-15
+					new_filename = new_filename.replace(' ', '') # no blank space should exist in the name
+					new_filename += filename[-4:] # .jpg
+
+					new_local_fullpath = os.path.join(self.cfg_dict['OUTPUT']['output_photopath'], new_filename) # eg. 'C:/Users/kimdan/Government of Ontario/Regeneration Assessment Program - RAP Picture Library/SAU-NSF-4_C16_P1_4ffk_2021-10-15.jpg'
+					new_sharepoint_fullpath = self.cfg_dict['OUTPUT']['sharepoint_photopath'] + '/' + new_filename # eg. 'https://ontariogov.sharepoint.com/:i:/r/sites/MNRF-ROD-EXT/RAP/RAP%20Picture%20Library/SAU-NSF-4_C16_P1_4ffk_2021-10-15.jpg'
+					
+					# time to copy over!!
+					if not os.path.exists(new_local_fullpath):
+						self.logger.info("Copying photo: %s"%new_filename)
+						print("Copying photo: %s"%new_filename)
+						if zip_file != None:
+							common_functions.copy_zip_member(zip_file, zip_data_folder + url, new_local_fullpath)
+						else:
+							shutil.copy2(original_fullpath, new_local_fullpath)
+
+					# write the new paths down to the summary dictionary
+					c_local_sync_photopath[location_taken].append(new_local_fullpath) 
+					c_sharepoint_photopath[location_taken].append(new_sharepoint_fullpath) 
+
+		record[self.c_local_sync_photopath] = c_local_sync_photopath
+		record[self.c_sharepoint_photopath] = c_sharepoint_photopath
+
 # eg. c_local_sync_photopath = {'cluster': ['C:\\Users\\kimdan\\Government of Ontario\\Regeneration Assessment Program - 
 # RAP Picture Library\\NOR-HWY11-5_C462_cluster_12fa_2021-09-15.jpg'], 'P1': [], 'P2': ['C:\\Users\\kimdan\\Government of Ontario
 # \\Regeneration Assessment Program - RAP Picture Library\\NOR-HWY11-5_C462_P2_4fd7_2021-09-15.jpg'], 'P3': [], 'P4': [], 'P5': 
@@ -533,7 +630,7 @@ class Run_analysis:
 	def clus_summary_to_sqlite(self):
 		""" Writing the cluster summary dictionary list to a brand new table in the sqlite database.
 		"""
-		common_functions.dict_lst_to_sqlite(self.clus_summary_dict_lst, self.db_filepath, self.clus_summary_tblname, self.logger)
+		common_functions.dict_lst_to_sqlite(self.clus_summary_dict_lst, self.db_filepath, self.clus_summary_tblname, self.logger, indexes=self.clus_summary_indexes)
 
 
 
@@ -552,344 +649,607 @@ class Run_analysis:
 		# loop through each record (project) in the shapefile (shapefile but in dictionary form)
 		# Note that all keys in prj_shp_in_dict are in upper case
 		for prj in self.prj_shp_in_dict:
-			# record dictionary will act as a template for this cluster and the values will be filled out as we go.
-			record = self.proj_summary_dict.copy()
 			proj_id = prj[self.prj_shp_prjid_fieldname] # project id from the shapefile
-			self.logger.info('\tWorking on ProjectID: %s'%proj_id)
-			p_analysis_comments = [] # comments will be appended here
-
-			# copying information from the shapefile to this summary table:
-			record[self.p_proj_id] = proj_id
-			record[self.p_num_clus] = prj['NUMCLUSTER']
-			record[self.p_silvsys] = prj['SILVSYS']
-			record[self.p_area] = prj['AREA_HA']
-			record[self.p_plot_size] = 16 if prj['SILVSYS'] =='SH' else 8
-			record[self.p_spatial_fmu] = prj['FMU']
-			record[self.p_spatial_dist] = prj['DISTRICT']
-			record[self.p_lat] = prj['LAT']
-			record[self.p_lon] = prj['LON']
-
-			record[self.p_yrdep] = prj['YRDEP']
-			record[self.p_depfu] = prj['DEPLETIONF']
-			record[self.p_yrorg] = prj['YRORG']
-			record[self.p_sgr] = prj['SGR']
-			record[self.p_targetfu] = prj['TARGETFU']
-			record[self.p_targetspc] = prj['TARGETSPC']
-			record[self.p_targetso] = prj['TARGETSO']
-
-			record[self.p_sfl_as_yr] = prj['SFL_AS_YR']
-			record[self.p_sfl_as_method] = prj['SFL_ASMETH']
-			record[self.p_sfl_spcomp] = prj['SFL_SPCOMP']
-			record[self.p_sfl_so] = prj['SFL_SO']
-			record[self.p_sfl_fu] = prj['SFL_FU']
-			record[self.p_sfl_effden] = prj['SFL_EFFDEN']
-
-
-			# grap and summarize cluster data (clus_summary_dict_lst) into project summary
-			cluster_data_of_this_proj = []
-			cluster_num_lst = []
-			for clus_summary in self.clus_summary_dict_lst:
-				if clus_summary['proj_id'] == proj_id:
-					cluster_data_of_this_proj.append(clus_summary)
-					cluster_num_lst.append(clus_summary['cluster_number'])
-			cluster_num_lst.sort()
-
-			# check for duplicate cluster number
-			duplicate_clus = set([clus_num for clus_num in cluster_num_lst if cluster_num_lst.count(clus_num) > 1])
-			if len(duplicate_clus) > 0:
-				duplicate_clus = list(duplicate_clus)
-				duplicate_clus_str = ''
-				for clus in duplicate_clus:
-					duplicate_clus_str += clus + ', '
-				duplicate_clus_str = duplicate_clus_str[:-2]
-				self.logger.info("!!!! Duplicate cluster found: %s"%duplicate_clus_str)
-				p_analysis_comments.append("Duplicate cluster found: %s"%duplicate_clus_str)
-
-			# Number of clusters surveyed as far
-			num_clus_surveyed = len(cluster_num_lst)
-			self.logger.info("\t\tSurveyed Cluster Count: %s of %s"%(num_clus_surveyed,prj['NUMCLUSTER']))
-			is_survey_complete = False if num_clus_surveyed < int(prj['NUMCLUSTER']) else True
-			record[self.p_num_clus_surv] = num_clus_surveyed
-			record[self.p_lst_of_clus] = cluster_num_lst		
-			record[self.p_is_complete] = is_survey_complete
-
-
-			# Assessment start and last assessment date
-			clus_survey_dates = [] # eg. ['2021-09-14', '2021-09-14', '2021-10-04',...]
-			for cluster in cluster_data_of_this_proj:
-				clus_survey_dates.append(cluster[self.c_creation_date])
-			if len(clus_survey_dates) < 1:
-				assess_start_date = ''
-				assess_last_date = ''
-			else:
-				clus_survey_dates.sort()
-				assess_start_date = clus_survey_dates[0]
-				assess_last_date = clus_survey_dates[-1]
-			record[self.p_assess_start_date] = assess_start_date
-			record[self.p_assess_last_date] = assess_last_date
-
-
-			# Assessors (surveyors), Surveyor's FMU, Surveyor's District
-			# These information is available not in the cluster summary but in the raw data (cc_cluster_in_dict)
-			cluster_raw_data = self.sh_cluster_in_dict if prj['SILVSYS'] == 'SH' else self.cc_cluster_in_dict
-			assessors_lst = []
-			surveyors_fmu_lst = []
-			surveyors_dist_lst = []
-			for cluster in cluster_raw_data:
-				if cluster[self.fin_proj_id] == proj_id:
-					assessors_lst.append(cluster['Surveyors'])
-					surveyors_fmu_lst.append(cluster['ForestManagementUnit'])
-					surveyors_dist_lst.append(cluster['DistrictName'])
-			assessors = [i for i in set(assessors_lst) if len(i)>0]
-			surveyors_fmu = [i for i in set(surveyors_fmu_lst) if len(i)>0]
-			surveyors_dist = [i for i in set(surveyors_dist_lst) if len(i)>0]
-			record[self.p_assessors] = assessors # eg. ['Mitchell Sissing', 'Group ']
-			record[self.p_fmu] = surveyors_fmu
-			record[self.p_dist] = surveyors_dist # eg. ['North Bay']
-
-			# comments summary
-			comments = {} # combination of all comments
-			for cluster in cluster_data_of_this_proj:
-				comments[cluster['cluster_number']] = cluster[self.c_comments]
-			record[self.p_comments] = comments # eg. {'456': {'cluster': '', 'ecosite': '', 'P1': '',...}
-
-			# Effective density data eg. {'109': 1225, '108': 1375,...}
-			effective_density_data = {}
-			for cluster in cluster_data_of_this_proj:
-				effective_density_data[cluster['cluster_number']] = cluster[self.c_eff_dens]
-			# Effective density # eg. {'mean': 1979.1667, 'stdv': 1271.9428, 'ci': 1334.8221, 'upper_ci': 3313.9888, 'lower_ci': 644.3446, 'n': 6, 'confidence': 0.95}
-			effective_density = mymath.mean_std_ci(effective_density_data) 
-			record[self.p_effect_dens_data] = effective_density_data
-			record[self.p_effect_dens] = effective_density
-
-			# number of clusters where at least 1 plot is occupied with trees # this should be the n for species calculation
-			lst_of_occupied_clus = []
-			for cluster in cluster_data_of_this_proj:
-				if cluster[self.c_site_occ] > 0:
-					lst_of_occupied_clus.append(cluster['cluster_number'])
-			lst_of_occupied_clus = list(set(lst_of_occupied_clus)) # removing duplicate clusters (there shouldn't be duplicates)
-			num_cl_occupied = len(lst_of_occupied_clus)
-			record[self.p_num_cl_occupied] = num_cl_occupied
-
-			# site occupancy
-			so_data = {} # eg. {'109': 0.875, '108': 1...}
-			so_reason = {} # eg. {'109': {'P1': 'Treed', 'P2': ''...}}, '108': {'P1': 'Shrubs', 'P2': '', }}
-			for cluster in cluster_data_of_this_proj:
-				so_data[cluster['cluster_number']]=cluster[self.c_site_occ]
-				so_reason[cluster['cluster_number']]=cluster[self.c_site_occ_reason]
-			so = mymath.mean_std_ci(so_data)
-			record[self.p_so_data] = so_data
-			record[self.p_so] = so
-			record[self.p_so_reason] = so_reason
-
-
-			# SPECIES ANALYSIS: 'species_found', 'species_grps_found', 'species_data_percent', 'species_grp_data_percent', 'spcomp', spcomp_grp'
-			spc_dict = {} # eg. {'109': {'BW': 30.0, 'SW': 70.0}, '108': {'BF': 18.2, 'LA': 9.1, 'SW': 72.7},...}
-			spc_grp_dict = {}
-			for cluster in cluster_data_of_this_proj:
-				if cluster[self.c_site_occ] > 0:
-					spc_dict[cluster['cluster_number']] = cluster[self.c_spc_comp_perc]
-					spc_grp_dict[cluster['cluster_number']] = cluster[self.c_spc_comp_grp_perc]
-			# calculate spc_found and spc_grp_found
-			spc_found = [] # eg.['CB', 'BN', 'SW', 'LA', 'BW', 'BF']
-			spc_grp_found = [] # eg. ['CB', 'BN', 'LA', 'BW', 'SX', 'BF']
-			for v in spc_dict.values():
-				for i in v.keys():
-					spc_found.append(i)
-			for v in spc_grp_dict.values():
-				for i in v.keys():
-					spc_grp_found.append(i)					
-			spc_found = list(set(spc_found))
-			spc_grp_found = list(set(spc_grp_found))
-			# calculate spc_data and spc_grp_data (n = len(lst_of_occupied_clus))
-			clusters_dict = {clus_num:0 for clus_num in lst_of_occupied_clus} # eg. {'109':0, '103':0, '104':0,...}
-			spc_data = {spc:clusters_dict.copy() for spc in spc_found} # eg. {'BF': {'109':0, '103':0}, 'BW': {'109':0, '103':0}, ...}
-			spc_grp_data = {spc:clusters_dict.copy() for spc in spc_grp_found}
-			# calculate spcomp and spcomp_grp
-			for clus_num, spc_rec in spc_dict.items():
-				for spc, perc in spc_rec.items():
-					spc_data[spc][clus_num] = perc
-			for clus_num, spc_rec in spc_grp_dict.items():
-				for spc, perc in spc_rec.items():
-					spc_grp_data[spc][clus_num] = perc
-			# calculate p_spc and p_spc_grp (mean, stdev, etc.)
-			spc = {spc: mymath.mean_std_ci(data) for spc, data in spc_data.items()}
-			spc_grp = {spc: mymath.mean_std_ci(data) for spc, data in spc_grp_data.items()}
-			record[self.p_spc_found] = spc_found # ['CE', 'BF', 'PO', 'PB', 'BW', 'PT']
-			record[self.p_spc_grp_found] = spc_grp_found # ['CE', 'BW', 'BF', 'PO']
-			record[self.p_spc_data] = spc_data # {'CE': {'25': 0, '3': 25.0, '20': 0, ...}, 'BF': {'25': 0, '3': 25.0, '20': 0,...}}
-			record[self.p_spc_grp_data] = spc_grp_data 
-			record[self.p_spc] = spc # {'CE': {'mean': 1.7857, 'stdv': 6.6815, 'ci': 3.8578, ...}, 'BF': {'mean': 1.7857, 'stdv': 6.6815, 'ci'...}}
-			record[self.p_spc_grp] = spc_grp
-
-			# ecosite
-			ecosite_data = {} # eg. {'109':['moist','rich in nutrient','some comment'], '103':['dry','',''],...}
-			for cluster in cluster_data_of_this_proj:
-				ecosite_data[cluster['cluster_number']] = [cluster[self.c_ecosite],cluster[self.c_eco_nutri],cluster[self.c_eco_comment].replace("'","")]
-			if len(ecosite_data) > 0:
-				moist = list(set([eco[0] for eco in ecosite_data.values()]))
-				eco_moisture = {i:0 for i in moist} #eg. {'moist': 0, 'dry':0, ...}
-				eco_count = 0
-				for eco in ecosite_data.values():
-					eco_moisture[eco[0]] += 1
-					eco_count += 1
-				# turn the count into percent
-				eco_moisture = {k:round(float(v)*100/eco_count, 1) for k,v in eco_moisture.items()}
-			else:
-				eco_moisture = {} 
-			record[self.p_ecosite_data] = ecosite_data # {'356': ['fresh', 'Moderately Rich', ''], '357': ['fresh', 'Moderately Rich', ''],...}
-			record[self.p_eco_moisture] = eco_moisture # {'moist': 3.3, 'wet': 3.3, 'fresh': 93.3}
+			# clusters of this project from the cluster summary and from the raw data of the project's silvsys (cc_cluster_rows or sh_cluster_rows)
+			cluster_data_of_this_proj = [clus_summary for clus_summary in self.clus_summary_dict_lst if clus_summary['proj_id'] == proj_id]
+			cluster_raw_data = self.sh_cluster_rows if prj['SILVSYS'] == 'SH' else self.cc_cluster_rows
+			proj_id_idx = self.survey_cols['SH' if prj['SILVSYS'] == 'SH' else 'CC'][self.fin_proj_id]
+			cluster_raw_data = [cluster for cluster in cluster_raw_data if cluster[proj_id_idx] == proj_id]
+			# finally, append the record to the table
+			self.proj_summary_dict_lst.append(self.summarize_project(prj, cluster_data_of_this_proj, cluster_raw_data))
 
-			# add analysis comments and warnings
-			record[self.p_analysis_comments] = p_analysis_comments
 
-			# finally, append the record to the table
-			self.proj_summary_dict_lst.append(record)
+
+	def summarize_project(self, prj, cluster_data_of_this_proj, cluster_raw_data):
+		"""
+		summarizes one project and returns the project summary record.
+		prj is the project's record in the shapefile, cluster_data_of_this_proj is the cluster summary records of the project
+		and cluster_raw_data is the project's records (tuples) in the survey table of its silvsys.
+		"""
+		# record dictionary will act as a template for this cluster and the values will be filled out as we go.
+		record = self.Proj_summary()
+		proj_id = prj[self.prj_shp_prjid_fieldname] # project id from the shapefile
+		self.logger.info('\tWorking on ProjectID: %s'%proj_id)
+		p_analysis_comments = [] # comments will be appended here
+
+		# copying information from the shapefile to this summary table:
+		record[self.p_proj_id] = proj_id
+		record[self.p_num_clus] = prj['NUMCLUSTER']
+		record[self.p_silvsys] = prj['SILVSYS']
+		record[self.p_area] = prj['AREA_HA']
+		record[self.p_plot_size] = 16 if prj['SILVSYS'] =='SH' else 8
+		record[self.p_spatial_fmu] = prj['FMU']
+		record[self.p_spatial_dist] = prj['DISTRICT']
+		record[self.p_lat] = prj['LAT']
+		record[self.p_lon] = prj['LON']
+
+		record[self.p_yrdep] = prj['YRDEP']
+		record[self.p_depfu] = prj['DEPLETIONF']
+		record[self.p_yrorg] = prj['YRORG']
+		record[self.p_sgr] = prj['SGR']
+		record[self.p_targetfu] = prj['TARGETFU']
+		record[self.p_targetspc] = prj['TARGETSPC']
+		record[self.p_targetso] = prj['TARGETSO']
+
+		record[self.p_sfl_as_yr] = prj['SFL_AS_YR']
+		record[self.p_sfl_as_method] = prj['SFL_ASMETH']
+		record[self.p_sfl_spcomp] = prj['SFL_SPCOMP']
+		record[self.p_sfl_so] = prj['SFL_SO']
+		record[self.p_sfl_fu] = prj['SFL_FU']
+		record[self.p_sfl_effden] = prj['SFL_EFFDEN']
+
+
+		# summarize cluster data of this project (cluster_data_of_this_proj) into project summary
+		cluster_num_lst = [clus_summary['cluster_number'] for clus_summary in cluster_data_of_this_proj]
+		cluster_num_lst.sort()
+
+		# check for duplicate cluster number
+		duplicate_clus = set([clus_num for clus_num in cluster_num_lst if cluster_num_lst.count(clus_num) > 1])
+		if len(duplicate_clus) > 0:
+			duplicate_clus = list(duplicate_clus)
+			duplicate_clus_str = ''
+			for clus in duplicate_clus:
+				duplicate_clus_str += clus + ', '
+			duplicate_clus_str = duplicate_clus_str[:-2]
+			self.logger.info("!!!! Duplicate cluster found: %s"%duplicate_clus_str)
+			p_analysis_comments.append("Duplicate cluster found: %s"%duplicate_clus_str)
+
+		# Number of clusters surveyed as far
+		num_clus_surveyed = len(cluster_num_lst)
+		self.logger.info("\t\tSurveyed Cluster Count: %s of %s"%(num_clus_surveyed,prj['NUMCLUSTER']))
+		is_survey_complete = False if num_clus_surveyed < int(prj['NUMCLUSTER']) else True
+		record[self.p_num_clus_surv] = num_clus_surveyed
+		record[self.p_lst_of_clus] = cluster_num_lst		
+		record[self.p_is_complete] = is_survey_complete
+
+
+		# Assessment start and last assessment date
+		clus_survey_dates = [] # eg. ['2021-09-14', '2021-09-14', '2021-10-04',...]
+		for cluster in cluster_data_of_this_proj:
+			clus_survey_dates.append(cluster[self.c_creation_date])
+		if len(clus_survey_dates) < 1:
+			assess_start_date = ''
+			assess_last_date = ''
+		else:
+			clus_survey_dates.sort()
+			assess_start_date = clus_survey_dates[0]
+			assess_last_date = clus_survey_dates[-1]
+		record[self.p_assess_start_date] = assess_start_date
+		record[self.p_assess_last_date] = assess_last_date
+
+
+		# Assessors (surveyors), Surveyor's FMU, Surveyor's District
+		# These information is available not in the cluster summary but in the raw data (cluster_raw_data)
+		assessors_lst = []
+		surveyors_fmu_lst = []
+		surveyors_dist_lst = []
+		col = self.survey_cols.get('SH' if prj['SILVSYS'] == 'SH' else 'CC') # column plan of the survey table of cluster_raw_data
+		for cluster in cluster_raw_data:
+			assessors_lst.append(cluster[col['Surveyors']])
+			surveyors_fmu_lst.append(cluster[col['ForestManagementUnit']])
+			surveyors_dist_lst.append(cluster[col['DistrictName']])
+		# sorted, so that the same clusters always give the same text (the excel and pdf reports are only re-written when the text changes)
+		assessors = sorted([i for i in set(assessors_lst) if len(i)>0])
+		surveyors_fmu = sorted([i for i in set(surveyors_fmu_lst) if len(i)>0])
+		surveyors_dist = sorted([i for i in set(surveyors_dist_lst) if len(i)>0])
+		record[self.p_assessors] = assessors # eg. ['Mitchell Sissing', 'Group ']
+		record[self.p_fmu] = surveyors_fmu
+		record[self.p_dist] = surveyors_dist # eg. ['North Bay']
+
+		# comments summary
+		comments = {} # combination of all comments
+		for cluster in cluster_data_of_this_proj:
+			comments[cluster['cluster_number']] = cluster[self.c_comments]
+		record[self.p_comments] = comments # eg. {'456': {'cluster': '', 'ecosite': '', 'P1': '',...}
+
+		# Effective density data eg. {'109': 1225, '108': 1375,...}
+		effective_density_data = {}
+		for cluster in cluster_data_of_this_proj:
+			effective_density_data[cluster['cluster_number']] = cluster[self.c_eff_dens]
+		# Effective density # eg. {'mean': 1979.1667, 'stdv': 1271.9428, 'ci': 1334.8221, 'upper_ci': 3313.9888, 'lower_ci': 644.3446, 'n': 6, 'confidence': 0.95}
+		effective_density = mymath.mean_std_ci(effective_density_data) 
+		record[self.p_effect_dens_data] = effective_density_data
+		record[self.p_effect_dens] = effective_density
+
+		# number of clusters where at least 1 plot is occupied with trees # this should be the n for species calculation
+		lst_of_occupied_clus = []
+		for cluster in cluster_data_of_this_proj:
+			if cluster[self.c_site_occ] > 0:
+				lst_of_occupied_clus.append(cluster['cluster_number'])
+		lst_of_occupied_clus = sorted(set(lst_of_occupied_clus)) # removing duplicate clusters (there shouldn't be duplicates)
+		num_cl_occupied = len(lst_of_occupied_clus)
+		record[self.p_num_cl_occupied] = num_cl_occupied
+
+		# site occupancy
+		so_data = {} # eg. {'109': 0.875, '108': 1...}
+		so_reason = {} # eg. {'109': {'P1': 'Treed', 'P2': ''...}}, '108': {'P1': 'Shrubs', 'P2': '', }}
+		for cluster in cluster_data_of_this_proj:
+			so_data[cluster['cluster_number']]=cluster[self.c_site_occ]
+			so_reason[cluster['cluster_number']]=cluster[self.c_site_occ_reason]
+		so = mymath.mean_std_ci(so_data)
+		record[self.p_so_data] = so_data
+		record[self.p_so] = so
+		record[self.p_so_reason] = so_reason
+
+
+		# SPECIES ANALYSIS: 'species_found', 'species_grps_found', 'species_data_percent', 'species_grp_data_percent', 'spcomp', spcomp_grp'
+		spc_dict = {} # eg. {'109': {'BW': 30.0, 'SW': 70.0}, '108': {'BF': 18.2, 'LA': 9.1, 'SW': 72.7},...}
+		spc_grp_dict_by_grouping = {key:{} for key in self.spc_registry.groupings.keys()} # eg. {'SpeciesGroup': {'109': {'BW': 30.0, 'SX': 70.0},...},...}
+		for cluster in cluster_data_of_this_proj:
+			if cluster[self.c_site_occ] > 0:
+				spc_dict[cluster['cluster_number']] = cluster[self.c_spc_comp_perc]
+				for key, grp_comp_perc in cluster[self.c_spc_comp_perc_by_grouping].items():
+					spc_grp_dict_by_grouping[key][cluster['cluster_number']] = grp_comp_perc
+		# calculate spc_found, spc_data (n = len(lst_of_occupied_clus)) and spcomp for species and for the species groups of each grouping
+		spc_found, spc_data, spc = self.spcomp_stats(spc_dict, lst_of_occupied_clus)
+		spc_grp_data_by_grouping = {}
+		spc_grp_by_grouping = {}
+		for key, spc_grp_dict in spc_grp_dict_by_grouping.items():
+			spc_grp_found, spc_grp_data, spc_grp = self.spcomp_stats(spc_grp_dict, lst_of_occupied_clus)
+			spc_grp_data_by_grouping[key] = spc_grp_data
+			spc_grp_by_grouping[key] = spc_grp
+			if key == self.spc_registry.primary_grouping:
+				record[self.p_spc_grp_found] = spc_grp_found # ['CE', 'BW', 'BF', 'PO']
+				record[self.p_spc_grp_data] = spc_grp_data 
+				record[self.p_spc_grp] = spc_grp
+		record[self.p_spc_found] = spc_found # ['CE', 'BF', 'PO', 'PB', 'BW', 'PT']
+		record[self.p_spc_data] = spc_data # {'CE': {'25': 0, '3': 25.0, '20': 0, ...}, 'BF': {'25': 0, '3': 25.0, '20': 0,...}}
+		record[self.p_spc] = spc # {'CE': {'mean': 1.7857, 'stdv': 6.6815, 'ci': 3.8578, ...}, 'BF': {'mean': 1.7857, 'stdv': 6.6815, 'ci'...}}
+		record[self.p_spc_grp_data_by_grouping] = spc_grp_data_by_grouping
+		record[self.p_spc_grp_by_grouping] = spc_grp_by_grouping
+
+		# ecosite
+		ecosite_data = {} # eg. {'109':['moist','rich in nutrient','some comment'], '103':['dry','',''],...}
+		for cluster in cluster_data_of_this_proj:
+			ecosite_data[cluster['cluster_number']] = [cluster[self.c_ecosite],cluster[self.c_eco_nutri],cluster[self.c_eco_comment].replace("'","")]
+		if len(ecosite_data) > 0:
+			moist = sorted(set([eco[0] for eco in ecosite_data.values()]))
+			eco_moisture = {i:0 for i in moist} #eg. {'moist': 0, 'dry':0, ...}
+			eco_count = 0
+			for eco in ecosite_data.values():
+				eco_moisture[eco[0]] += 1
+				eco_count += 1
+			# turn the count into percent
+			eco_moisture = {k:round(float(v)*100/eco_count, 1) for k,v in eco_moisture.items()}
+		else:
+			eco_moisture = {} 
+		record[self.p_ecosite_data] = ecosite_data # {'356': ['fresh', 'Moderately Rich', ''], '357': ['fresh', 'Moderately Rich', ''],...}
+		record[self.p_eco_moisture] = eco_moisture # {'moist': 3.3, 'wet': 3.3, 'fresh': 93.3}
+
+		# add analysis comments and warnings
+		record[self.p_analysis_comments] = p_analysis_comments
+
+		return record
+
+
+
+	def spcomp_stats(self, spc_dict, lst_of_occupied_clus):
+		"""
+		spc_dict is the species (or species group) percent of each occupied cluster. eg. {'109': {'BW': 30.0, 'SW': 70.0}, '108': {'BF': 18.2, 'SW': 81.8},...}
+		returns [spc_found, spc_data, spcomp]
+		spc_found eg. ['BW', 'SW', 'BF']
+		spc_data eg. {'BW': {'109': 30.0, '108': 0}, 'SW': {'109': 70.0, '108': 81.8}, 'BF': {'109': 0, '108': 18.2}} (n = len(lst_of_occupied_clus))
+		spcomp eg. {'BW': {'mean': 15.0, 'stdv': 21.2132, 'ci': ...}, ...}
+		"""
+		spc_found = [] # eg.['CB', 'BN', 'SW', 'LA', 'BW', 'BF']
+		for v in spc_dict.values():
+			for i in v.keys():
+				spc_found.append(i)
+		spc_found = sorted(set(spc_found))
+		clusters_dict = {clus_num:0 for clus_num in lst_of_occupied_clus} # eg. {'109':0, '103':0, '104':0,...}
+		spc_data = {spc:clusters_dict.copy() for spc in spc_found} # eg. {'BF': {'109':0, '103':0}, 'BW': {'109':0, '103':0}, ...}
+		for clus_num, spc_rec in spc_dict.items():
+			for spc, perc in spc_rec.items():
+				spc_data[spc][clus_num] = perc
+		# calculate mean, stdev, etc.
+		spcomp = {spc: mymath.mean_std_ci(data) for spc, data in spc_data.items()}
+		return [spc_found, spc_data, spcomp]
+
+
+
+	def bootstrap_projects(self):
+		"""
+		adds bootstrap confidence intervals (boot_lower_ci, boot_upper_ci) to the effective density, site occupancy and species composition 
+		statistics of each project. eg. {'mean': 7.06, 'stdv': 7.6229, 'ci': 9.465, ..., 'boot_lower_ci': 1.2, 'boot_upper_ci': 14.1}
+		unlike the t-based ci, these are never below 0 or above 100% for percentages, which matters for small projects.
+		the projects are resampled in a process pool (see mymath.bootstrap_project).
+		"""
+		if not self.bootstrap_ci:
+			return
+		self.logger.info('Running bootstrap_projects method (%s replicates)'%self.bootstrap_replicates)
+
+		# for each project: [proj_id, [[ed_data, so_data], [spc_data..., spc_grp_data of each grouping...]], replicates, confidence, seed]
+		# the stats dictionaries to be updated are kept in the same order.
+		tasks = []
+		stats_to_update = {} # eg. {'P-1': [[ed_stats, so_stats], [spc_stats..., spc_grp_stats...]]}
+		for record in self.proj_summary_dict_lst:
+			proj_id = record[self.p_proj_id]
+			all_clus_data = [record[self.p_effect_dens_data], record[self.p_so_data]]
+			all_clus_stats = [record[self.p_effect_dens], record[self.p_so]]
+			occupied_clus_data = [data for spc, data in record[self.p_spc_data].items()]
+			occupied_clus_stats = [record[self.p_spc][spc] for spc in record[self.p_spc_data].keys()]
+			for key, spc_grp_data in record[self.p_spc_grp_data_by_grouping].items():
+				occupied_clus_data += [data for spc_grp, data in spc_grp_data.items()]
+				occupied_clus_stats += [record[self.p_spc_grp_by_grouping][key][spc_grp] for spc_grp in spc_grp_data.keys()]
+			tasks.append([proj_id, [all_clus_data, occupied_clus_data], self.bootstrap_replicates, 0.95, self.bootstrap_seed])
+			stats_to_update[proj_id] = [all_clus_stats, occupied_clus_stats]
+
+		workers = self.bootstrap_workers if self.bootstrap_workers > 0 else os.cpu_count()
+		if workers > 1 and len(tasks) > 1:
+			with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+				results = list(executor.map(mymath.bootstrap_project, tasks, chunksize = max(1, len(tasks)//(workers*4))))
+		else:
+			results = [mymath.bootstrap_project(task) for task in tasks]
+
+		for proj_id, boot_groups in results:
+			for stats_lst, boot_lst in zip(stats_to_update[proj_id], boot_groups):
+				for stats, boot in zip(stats_lst, boot_lst):
+					stats.update(boot) # stats and boot are both empty if n < 2
+		# (spcomp_grp is the same dictionary as the main grouping's in spcomp_by_grouping, so it's updated too)
 
 
 
 	def proj_summary_to_sqlite(self):
 		""" Writing the cluster summary dictionary list to a brand new table in the sqlite database.
 		"""
-		common_functions.dict_lst_to_sqlite(self.proj_summary_dict_lst, self.db_filepath, self.proj_summary_tblname, self.logger)
+		common_functions.dict_lst_to_sqlite(self.proj_summary_dict_lst, self.db_filepath, self.proj_summary_tblname, self.logger, indexes=self.proj_summary_indexes)
+
+
+
+	def create_accumulator_table(self):
+		"""
+		writes the running (n, mean, m2) of each project and metric to a new table (proj_stats_accumulator).
+		the stats from these are the same as the effective density, site occupancy and spcomp in Project Summary (up to floating point rounding).
+		with a warehouse, the accumulators of the last run of the season are updated with only the new, re-surveyed and removed clusters (see accumulator.py).
+		"""
+		self.logger.info('Running create_accumulator_table method')
+		proj_acc = self.load_accumulator()
+		seen = proj_acc.update(self.clus_summary_dict_lst)
+		self.save_accumulator(proj_acc, seen)
+
+
+
+	def load_accumulator(self):
+		"""a Proj_accumulator with the accumulators and clusters of this season from the warehouse (empty if there's no warehouse or nothing's been saved yet)"""
+		proj_acc = accumulator.Proj_accumulator(self.clus_summary_attr, self.logger)
+		if self.warehouse_db != '':
+			proj_acc.load(self.warehouse_db, self.proj_accum_tblname, self.proj_accum_clus_tblname, self.season)
+		return proj_acc
+
+
+
+	def save_accumulator(self, proj_acc, seen):
+		"""
+		takes the clusters that are no longer in the survey data out of the accumulators (seen = (proj_id, cluster_number) of this run's clusters),
+		writes them to this run's sqlite database and, with a warehouse, saves them there for the next run.
+		"""
+		num_removed = proj_acc.remove_missing(seen)
+		self.logger.info("Accumulators: %s clusters added or replaced, %s removed, %s unchanged"%(proj_acc.num_updated, num_removed, len(seen) - proj_acc.num_updated))
+		proj_acc.save(self.db_filepath, self.proj_accum_tblname)
+		if self.warehouse_db != '':
+			proj_acc.save(self.warehouse_db, self.proj_accum_tblname, season = self.season)
+			proj_acc.save_clusters(self.warehouse_db, self.proj_accum_clus_tblname, self.season)
 
 
 
 	def create_plot_table(self):
 		"""
-		go through self.clus_summary_dict_lst again and create two plot summary tables on the sqlite database. (one for CC and one for SH)
+		go through self.clus_summary_dict_lst again and create the plot summary tables on the sqlite database.
 		This table would be closest thing to the raw data collected.
+		Plot_Summary has one record per plot (site occupancy and reason for unoccupancy), and
+		plot_tally has one record per plot, plot size and species (long format, non-zero tree counts only).
+		The wide tables with one column per species (Plot_Summary_cc and Plot_Summary_sh) are created as views on top of these two.
 		"""
-		# first we need a list of all species codes found in the raw data
-		# this list will be used to create attribute names of the plot_summary table.
-		all_spc_codes_from_raw_data = []
-		for record in self.clus_summary_dict_lst:
-			for data in record[self.c_spc_count].values(): # eg. data =  [{'PL': 1, 'MR': 1}, {}] or just None
-				if data != None:
-					for item in data: # eg. item = {'PL': 1, 'MR': 1}
-						for spc_code in item.keys():
-							if len(spc_code) > 0 and spc_code not in all_spc_codes_from_raw_data:
-								all_spc_codes_from_raw_data.append(spc_code)
-		all_spc_codes_from_raw_data.sort()
-
-		# create a record template
-		plot_summary_dict = {}
-
-		# loop through the clusters and populate each records
+		self.logger.info('Running create_plot_table method')
+		con = sqlite3.connect(self.db_filepath)
+		cur = con.cursor()
+		self.new_plot_tables(cur)
+
+		# loop through the clusters and write the plot records one cluster at a time
 		for clus_record in self.clus_summary_dict_lst:
-			silvsys = clus_record[self.c_silvsys] # 'CC' or 'SH'
-			# loop through the number of plots we have
-			for i in range(self.num_of_plots):
-				plot_record = plot_summary_dict.copy()
-				plotnum = str(i+1)
-				plotname = 'P' + plotnum
-
-				plot_record['proj_id'] = clus_record[self.c_proj_id]
-				plot_record['cluster_num'] = clus_record[self.c_clus_num]
-				plot_record['plot_num'] = plotnum
-				plot_record['site_occupied'] = clus_record[self.c_site_occ_raw][plotname]
-				plot_record['reason_for_unoccupancy'] = clus_record[self.c_site_occ_reason][plotname]
-
-				# get tree counts for each species for each plot
-				# note that for each species, we need 2 counts - one for 8sqm and one for 16sqm
-				if silvsys == 'SH':
-					plotsizes = ['8sqm', '16sqm']
-					for spc_code in all_spc_codes_from_raw_data:
-						for index, plotsize in enumerate(plotsizes):
-							spc_count = clus_record[self.c_spc_count] # eg {'P1': [{'PL': 1, 'MR': 1}, {}], 'P2': None,...}
-							try:
-								spc_count = spc_count[plotname][index][spc_code]
-							except (KeyError, TypeError):
-								spc_count = 0
-							plot_record[spc_code+'_'+plotsize] = spc_count
-					self.plot_summary_dict_lst_sh.append(plot_record)
-				else:
-					for spc_code in all_spc_codes_from_raw_data:
-						spc_count = clus_record[self.c_spc_count] # eg {'P1': [{'PL': 1, 'MR': 1}, {}], 'P2': None,...}
-						try:
-							spc_count = spc_count[plotname][0][spc_code]
-						except (KeyError, TypeError):
-							spc_count = 0
-						plot_record['_'+spc_code] = spc_count
+			self.write_plot_rows(cur, clus_record)
 
-					self.plot_summary_dict_lst_cc.append(plot_record)
+		self.finish_plot_tables(con, cur)
+		con.close()
 
 
-		# create the table on the sqlite database
-		self.plotcount_cc_sh = {'CC': len(self.plot_summary_dict_lst_cc), 'SH':len(self.plot_summary_dict_lst_sh)}
-		if self.plotcount_cc_sh['CC'] > 0:
-			common_functions.dict_lst_to_sqlite(self.plot_summary_dict_lst_cc, self.db_filepath, self.plot_summary_tblname + '_cc', self.logger)
-		else:
-			self.logger.info("!!!! There's no CC clusters/plots. Cannot create plot summary table for CC")
-		if self.plotcount_cc_sh['SH'] > 0:	
-			common_functions.dict_lst_to_sqlite(self.plot_summary_dict_lst_sh, self.db_filepath, self.plot_summary_tblname + '_sh', self.logger)
-		else:
-			self.logger.info("!!!! There's no SH clusters/plots. Cannot create plot summary table for SH")
+
+	def new_plot_tables(self, cur):
+		"""(re)creates the empty plot summary and plot tally tables"""
+		for silvsys in ['_cc', '_sh']:
+			cur.execute("DROP VIEW IF EXISTS %s"%(self.plot_summary_tblname + silvsys))
+		cur.execute("DROP TABLE IF EXISTS %s"%self.plot_summary_tblname)
+		cur.execute("DROP TABLE IF EXISTS %s"%self.plot_tally_tblname)
+		cur.execute("""CREATE TABLE %s (cluster_uid INTEGER, silvsys TEXT, proj_id TEXT, cluster_num TEXT, plot_num INTEGER, 
+			site_occupied INTEGER, reason_for_unoccupancy TEXT)"""%self.plot_summary_tblname)
+		cur.execute("""CREATE TABLE %s (cluster_uid INTEGER, silvsys TEXT, proj_id TEXT, cluster_num TEXT, plot_num INTEGER, 
+			size_class INTEGER, spc TEXT, count INTEGER)"""%self.plot_tally_tblname)
+
+		self.plotcount_cc_sh = {'CC': 0, 'SH': 0}
+
+
+
+	def write_plot_rows(self, cur, clus_record):
+		"""writes the plot summary and plot tally records of one cluster summary record"""
+		plot_sql = "INSERT INTO %s VALUES (?,?,?,?,?,?,?)"%self.plot_summary_tblname
+		tally_sql = "INSERT INTO %s VALUES (?,?,?,?,?,?,?,?)"%self.plot_tally_tblname
+		silvsys = clus_record[self.c_silvsys] # 'CC' or 'SH'
+		clus_key = [clus_record[self.c_clus_uid], silvsys, clus_record[self.c_proj_id], clus_record[self.c_clus_num]]
+		plot_rows = []
+		tally_rows = []
+		# loop through the number of plots we have
+		for i in range(self.num_of_plots):
+			plotnum = i+1
+			plotname = 'P' + str(plotnum)
+			plot_rows.append(clus_key + [plotnum, clus_record[self.c_site_occ_raw][plotname], clus_record[self.c_site_occ_reason][plotname]])
+
+			# tree counts for each species. note that for each species, we have 2 counts - one for 8sqm and one for 16sqm
+			spc_info = clus_record[self.c_spc_count][plotname] # eg. [{'PL': 1, 'MR': 1}, {}] or None
+			if spc_info != None:
+				for size_class, spc_count in zip([8, 16], spc_info):
+					for spc_code, count in spc_count.items():
+						if len(spc_code) > 0 and count != 0:
+							tally_rows.append(clus_key + [plotnum, size_class, spc_code, count])
+
+		cur.executemany(plot_sql, plot_rows)
+		cur.executemany(tally_sql, tally_rows)
+		self.plotcount_cc_sh[silvsys] += len(plot_rows)
+
+
+
+	def finish_plot_tables(self, con, cur):
+		"""indexes the plot tables and creates the wide views once all the plots have been written"""
+		self.logger.info("%s plots have been written to %s"%(self.plotcount_cc_sh, self.plot_summary_tblname))
+
+		con.commit()
+		common_functions.create_indexes(self.db_filepath, self.plot_summary_tblname, self.plot_summary_indexes, self.logger)
+		common_functions.create_indexes(self.db_filepath, self.plot_tally_tblname, self.plot_tally_indexes, self.logger)
+
+		# create the wide views (one column per species)
+		for silvsys in ['CC', 'SH']:
+			if self.plotcount_cc_sh[silvsys] > 0:
+				self.create_plot_pivot_view(cur, silvsys)
+			else:
+				self.logger.info("!!!! There's no %s clusters/plots. Cannot create plot summary table for %s"%(silvsys, silvsys))
+
+		con.commit()
+
+
+
+	def create_plot_pivot_view(self, cur, silvsys):
+		"""
+		creates Plot_Summary_cc or Plot_Summary_sh view that pivots plot_tally into one column per species.
+		for CC, the columns are named _BF, _BW,... and for SH, BF_8sqm, BF_16sqm, BW_8sqm,...
+		every species found in the raw data (CC and SH) gets a column and the count is 0 if the species was not found in the plot.
+		"""
+		# list of all species codes found in the raw data eg. ['BF', 'BW', 'PJ', 'SB']
+		all_spc_codes_from_raw_data = [row[0] for row in cur.execute("SELECT DISTINCT spc FROM %s ORDER BY spc"%self.plot_tally_tblname)]
+
+		spc_columns = ''
+		for spc_code in all_spc_codes_from_raw_data:
+			if silvsys == 'SH':
+				for size_class in [8, 16]:
+					spc_columns += ",\n\t\tCOALESCE(SUM(CASE WHEN t.spc = '%s' AND t.size_class = %s THEN t.count END), 0) AS %s_%ssqm"%(spc_code, size_class, spc_code, size_class)
+			else:
+				spc_columns += ",\n\t\tCOALESCE(SUM(CASE WHEN t.spc = '%s' AND t.size_class = 8 THEN t.count END), 0) AS _%s"%(spc_code, spc_code)
+
+		viewname = self.plot_summary_tblname + '_' + silvsys.lower()
+		sql = """CREATE VIEW %s AS
+		SELECT p.proj_id, p.cluster_num, p.plot_num, p.site_occupied, p.reason_for_unoccupancy%s
+		FROM %s p LEFT JOIN %s t ON t.silvsys = p.silvsys AND t.cluster_uid = p.cluster_uid AND t.plot_num = p.plot_num
+		WHERE p.silvsys = '%s'
+		GROUP BY p.rowid
+		ORDER BY p.rowid"""%(viewname, spc_columns, self.plot_summary_tblname, self.plot_tally_tblname, silvsys)
+		self.logger.debug(sql)
+		cur.execute(sql)
 
 
 
 
 
-	def create_z_tables(self):
-		""" a table will be created for each project. table name example: z_NOR-PAPINEAU-2
-		Each of these tables will carry processed data in a easily readable format.
+	def create_proj_clus_table(self):
+		""" a single table (project_cluster_detail) carrying processed data of every active project in a easily readable format.
+		one record per project and cluster, keyed by (proj_id, Cluster_Num).
 		This will make it easy to print out on browsers and etc.
+		There's a column for every species found in the season (eg. _BF, _SW). 
+		The value is null if the species was not found in that project - use the project's species_found list to select the columns.
+		If create_z_views is True, a z_ view will be created for each project (eg. z_NOR-PAPINEAU-2) with the same content the old z_ tables had.
 		Ingredients:
 			self.proj_summary_dict_lst
-			self.clus_summary_dict_lst
 		"""
-		
-		active_projs = [record['proj_id'] for record in self.proj_summary_dict_lst if int(record[self.p_num_clus_surv]) > 0]
+		self.logger.info('Running create_proj_clus_table method')
+		active_projs = [record for record in self.proj_summary_dict_lst if int(record[self.p_num_clus_surv]) > 0]
 
-		# create tables
-		for proj in active_projs:
-			proj_sum_dict = [record for record in self.proj_summary_dict_lst if record['proj_id'] == proj][0] # this returns a single record in Project_summary table in a dictionary format
-			# clus_sum_dict = [record for record in self.clus_summary_dict_lst if record['proj_id'] == proj]
-			lst_of_clus = sorted(list(set(proj_sum_dict[self.p_lst_of_clus]))) # eg ['179', '183', '184', '189', '190', '901']
-			num_of_rows = len(lst_of_clus)
-			
-			# deciding the attributes for this new table
-			attr = ['Cluster_Num', 'Site_Occ', 'Ef_Density', 'Moisture', 'Silvsys']
-			spc_list = sorted(['_'+ spcname for spcname in proj_sum_dict[self.p_spc_found]]) # ['_AB', '_CE', '_OR', '_PT', '_PW', '_SB', '_SW']
-			attr += spc_list
+		# every species found in the active projects eg. ['_AB', '_BF', '_CE', '_OR', '_PT', '_PW', '_SB', '_SW']
+		all_spc_list = sorted(set(['_'+ spcname for proj_sum_dict in active_projs for spcname in proj_sum_dict[self.p_spc_found]]))
+		attr = ['proj_id', 'Cluster_Num', 'Site_Occ', 'Ef_Density', 'Moisture', 'Silvsys'] + all_spc_list
 
-			# making an empty list of dictionaries which will later turn into a table
-			rec_template = {attribute:'' for attribute in attr} #eg {'Cluster Num': '', 'Site Occ': '', 'Ef Density': '', 'Moisture': '', 'AB': '',...}
-			table = [] # will be filled with filled out rec_templates
+		con = sqlite3.connect(self.db_filepath)
+		cur = con.cursor()
+		cur.execute("DROP TABLE IF EXISTS %s"%self.proj_clus_tblname)
+		cur.execute("CREATE TABLE %s (%s, PRIMARY KEY (proj_id, Cluster_Num))"%(self.proj_clus_tblname, ','.join(attr)))
+		insert_sql = "INSERT INTO %s VALUES (%s)"%(self.proj_clus_tblname, ','.join(['?']*len(attr)))
 
-			# fill out the table
+		# fill out the table
+		for proj_sum_dict in active_projs:
+			lst_of_clus = sorted(list(set(proj_sum_dict[self.p_lst_of_clus]))) # eg ['179', '183', '184', '189', '190', '901']
+			spc_found = proj_sum_dict[self.p_spc_found] # eg. ['CE', 'BF', 'PO', 'PB', 'BW', 'PT']
+			rows = []
 			for clus in lst_of_clus:
-				rec = rec_template.copy()
-				rec['Cluster_Num'] = clus
-				rec['Site_Occ'] = proj_sum_dict[self.p_so_data][clus] # 0.75
-				rec['Ef_Density'] = proj_sum_dict[self.p_effect_dens_data][clus] # 1446
-				rec['Moisture'] = proj_sum_dict[self.p_ecosite_data][clus][0] # 'moist'
-				rec['Silvsys'] = proj_sum_dict[self.p_silvsys] # 'CC'
-				for spc in spc_list:
-					try:
-						rec[spc] = proj_sum_dict[self.p_spc_data][spc[1:]][clus] # percent of that species in this cluster
-					except KeyError:
-						rec[spc] = 0
-				table.append(rec)
+				row = [proj_sum_dict['proj_id'], clus,
+						proj_sum_dict[self.p_so_data][clus], # 0.75
+						proj_sum_dict[self.p_effect_dens_data][clus], # 1446
+						proj_sum_dict[self.p_ecosite_data][clus][0], # 'moist'
+						proj_sum_dict[self.p_silvsys]] # 'CC'
+				for spc in all_spc_list:
+					if spc[1:] in spc_found:
+						# percent of that species in this cluster
+						row.append(proj_sum_dict[self.p_spc_data].get(spc[1:], {}).get(clus, 0))
+					else:
+						row.append(None)
+				rows.append(row)
+			cur.executemany(insert_sql, rows)
+
+		self.logger.info("%s projects have been written to %s"%(len(active_projs), self.proj_clus_tblname))
+
+		# optionally, create a z_ view for each project
+		if self.create_z_views:
+			for proj_sum_dict in active_projs:
+				proj = proj_sum_dict['proj_id']
+				viewname = common_functions.create_proj_tbl_name(proj) # eg. 'Test Project1' will become 'z_Test_Project1'
+				columns = ['Cluster_Num', 'Site_Occ', 'Ef_Density', 'Moisture', 'Silvsys'] + sorted(['_'+ spcname for spcname in proj_sum_dict[self.p_spc_found]])
+				cur.execute("DROP VIEW IF EXISTS %s"%viewname)
+				cur.execute("CREATE VIEW %s AS SELECT %s FROM %s WHERE proj_id = '%s' ORDER BY rowid"%(viewname, ','.join(columns), self.proj_clus_tblname, proj.replace("'", "''")))
+			self.logger.info("z_ views have been created for %s projects"%len(active_projs))
+
+		con.commit()
+		con.close()
+
+
+
+	def stream_projects(self):
+		"""
+		does what sqlite_to_dict, summarize_clusters, photo_alternate_paths, clus_summary_to_sqlite, summarize_projects,
+		create_accumulator_table and create_plot_table do, but one project at a time (used when [CALC] streaming = True).
+		the survey tables are read from cursors in the order of fin_proj_id, and the cluster summary, plot summary and plot tally records 
+		of each project are written to the database before moving on to the next project.
+		only the project summaries (self.proj_summary_dict_lst) are kept in memory for the rest of run_all, 
+		so the memory used is bounded by the largest project rather than by the whole season.
+		the tables have the same content either way, but the clusters and plots are in the order of the projects.
+		"""
+		self.logger.info('Running stream_projects method')
+		self.prj_shp_in_dict = common_functions.sqlite_2_dict(self.db_filepath, self.prj_shp_tbl_name) # one record per project
+		prj_by_proj_id = {prj[self.prj_shp_prjid_fieldname]: prj for prj in self.prj_shp_in_dict}
+		proj_summary_by_proj_id = {}
+
+		con = sqlite3.connect(self.db_filepath)
+		cur = con.cursor()
+		# (re)create the output tables. Cluster_Summary has the same untyped columns dict_lst_to_sqlite would have given it
+		cur.execute("DROP TABLE IF EXISTS %s"%self.clus_summary_tblname)
+		cur.execute("CREATE TABLE %s (%s)"%(self.clus_summary_tblname, ','.join(self.clus_summary_dict.keys())))
+		clus_sql = "INSERT INTO %s VALUES (%s)"%(self.clus_summary_tblname, ','.join(['?']*len(self.clus_summary_dict)))
+		self.new_plot_tables(cur)
+		proj_acc = self.load_accumulator()
+		seen = set() # (proj_id, cluster_number) of the clusters streamed
+		zip_file, zip_data_folder = self.open_photo_zip()
+		num_clus = 0
+
+		for proj_id, cc_clusters, sh_clusters in self.survey_by_project(con):
+			self.logger.debug("\tStreaming ProjectID: %s (%s clusters)"%(proj_id, len(cc_clusters) + len(sh_clusters)))
+			clus_records = [self.summarize_cluster(cluster, 'CC') for cluster in cc_clusters] + [self.summarize_cluster(cluster, 'SH') for cluster in sh_clusters]
+			for record in clus_records:
+				self.photo_paths(record, zip_file, zip_data_folder)
+				self.write_plot_rows(cur, record)
+			# same values as dict_lst_to_sqlite writes (everything as text, " replaced by ')
+			cur.executemany(clus_sql, [[str(v).replace('"',"'") for v in record.values()] for record in clus_records])
+			seen |= proj_acc.update(clus_records)
+			num_clus += len(clus_records)
+
+			# clusters whose proj_id is not in the shapefile are in the cluster summary, but not in the project summary
+			if proj_id in prj_by_proj_id:
+				prj = prj_by_proj_id[proj_id]
+				cluster_raw_data = sh_clusters if prj['SILVSYS'] == 'SH' else cc_clusters
+				proj_summary_by_proj_id[proj_id] = self.summarize_project(prj, clus_records, cluster_raw_data)
+			con.commit()
+
+		if zip_file != None:
+			zip_file.close()
+		self.logger.info("%s clusters have been written to %s"%(num_clus, self.clus_summary_tblname))
+		if num_clus < 1:
+			err_msg = '!!!! %s is empty!!!!!'%self.clus_summary_tblname
+			self.logger.info(err_msg)
+			raise Exception(err_msg)
+
+		# projects with no cluster surveyed yet. the project summary is in the order of the shapefile
+		for prj in self.prj_shp_in_dict:
+			proj_id = prj[self.prj_shp_prjid_fieldname]
+			if proj_id not in proj_summary_by_proj_id:
+				proj_summary_by_proj_id[proj_id] = self.summarize_project(prj, [], [])
+			self.proj_summary_dict_lst.append(proj_summary_by_proj_id[proj_id])
 
-			# create the name for this table.
-			tablename = common_functions.create_proj_tbl_name(proj) # eg. 'Test Project1' will become 'z_Test_Project1'
+		self.finish_plot_tables(con, cur)
+		con.close()
+		common_functions.create_indexes(self.db_filepath, self.clus_summary_tblname, self.clus_summary_indexes, self.logger)
+		self.save_accumulator(proj_acc, seen)
 
-			# create and populate a new sqltable for this project
-			common_functions.dict_lst_to_sqlite(dict_lst=table, db_filepath=self.db_filepath, new_tablename = tablename, logger=self.logger)
+
+
+	def survey_by_project(self, con):
+		"""
+		yields [proj_id, cc_clusters, sh_clusters] for each fin_proj_id found in the clearcut and shelterwood survey tables, in the order of fin_proj_id.
+		cc_clusters and sh_clusters are lists of tuples (same as cc_cluster_rows and sh_cluster_rows, but of one project only).
+		the column plan of each survey table goes to self.survey_cols.
+		the rows are fetched from the cursors as they are needed, so only one project's clusters are in memory at a time.
+		"""
+		projects = [] # one iterator of [proj_id, rows] per survey table
+		for silvsys, tbl_name in [['CC', self.clearcut_tbl_name], ['SH', self.shelterwood_tbl_name]]:
+			cur = con.cursor()
+			cur.execute("SELECT * FROM %s ORDER BY %s, rowid"%(tbl_name, self.fin_proj_id)) # fin_proj_id is indexed by determine_project_id
+			self.survey_cols[silvsys] = self.column_plan([col[0] for col in cur.description], silvsys)
+			projects.append(itertools.groupby(cur, key=operator.itemgetter(self.survey_cols[silvsys][self.fin_proj_id])))
+
+		current = [next(proj_iter, None) for proj_iter in projects] # eg. [('NOR-HWY11-5', <rows>), None]
+		while current != [None, None]:
+			proj_id = min([proj[0] for proj in current if proj != None])
+			clusters = []
+			for i, proj in enumerate(current):
+				if proj != None and proj[0] == proj_id:
+					clusters.append(list(proj[1]))
+					current[i] = next(projects[i], None)
+				else:
+					clusters.append([])
+			yield [proj_id] + clusters
+
+
+
+	def methods(self):
+		"""names of the methods run_all runs, in order. RAP_benchmark.py measures each of them as a stage."""
+		if self.streaming:
+			methods = ['define_attr_names', 'stream_projects', 'bootstrap_projects', 'proj_summary_to_sqlite', 'create_proj_clus_table']
+		else:
+			methods = ['sqlite_to_dict', 'define_attr_names', 'summarize_clusters', 'photo_alternate_paths', 'clus_summary_to_sqlite',
+				'summarize_projects', 'bootstrap_projects', 'proj_summary_to_sqlite', 'create_accumulator_table', 'create_plot_table', 'create_proj_clus_table']
+		if self.sql_metrics:
+			# right after Cluster_Summary is written
+			methods.insert(methods.index('stream_projects' if self.streaming else 'clus_summary_to_sqlite') + 1, 'sql_cluster_metrics')
+		return methods
+
+
+
+	def sql_cluster_metrics(self):
+		"""
+		recalculates the site occupancy, number of trees and effective density of every cluster in Cluster_Summary with sql aggregate queries
+		on plot_obs and tree_tally (see sql_metrics.py and unpivot.py). the sql results are checked against the python results before they are written to Cluster_Summary.
+		"""
+		self.logger.info('Running sql_cluster_metrics method')
+		sm = sql_metrics.Sql_metrics(self.cfg_dict, self.db_filepath, self.clus_summary_attr, self.logger)
+		sm.run_all()
 
 
 
 	def run_all(self):
-		self.sqlite_to_dict()
-		self.define_attr_names()
-		self.summarize_clusters()
-		self.photo_alternate_paths()
-		self.clus_summary_to_sqlite()
-		self.summarize_projects()
-		self.proj_summary_to_sqlite()
-		self.create_plot_table()
-		self.create_z_tables()
+		for method in self.methods():
+			getattr(self, method)()
 
 
 
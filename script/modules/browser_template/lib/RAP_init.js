@@ -23,6 +23,11 @@ $("#docmenu").on("click", function(){
 	$(".doc").fadeIn(200)
 })
 
+$("#qamenu").on("click", function(){
+	$(".tab").hide()
+	$(".qa").fadeIn(200)
+})
+
 
 
 
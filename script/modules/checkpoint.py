@@ -0,0 +1,106 @@
+# keeps track of the stages of RAP.py that have completed, so that a run that crashed (eg. to_browsers failing on a locked file)
+# can be resumed from the stage that failed instead of starting over with the csv ingest, project id assignment and photo copying.
+# after each stage, RAP.py saves the stage name and the variables the later stages need to checkpoint.json in the output folder:
+#	db_filepath, tablenames_n_rec_count, clearcut_tbl_name, shelterwood_tbl_name, clus_summary_attr, proj_summary_attr, plotcount_cc_sh
+# usage: python RAP.py --from-stage to_browsers   (or --from-stage resume to start from the stage after the last completed one)
+#        python RAP.py --only-stage to_pdf
+
+import os, json
+
+
+# the stages of RAP.py in the order they run
+STAGES = ['csv2sqlite', 'unpivot', 'shp2sqlite', 'determine_project_id', 'qa', 'analysis', 'rollup', 'to_csv', 'to_parquet', 'to_excel',
+			'sweep', 'warehouse', 'to_pdf', 'to_browsers']
+
+
+
+class Checkpoint:
+	def __init__(self, output_folderpath, logger):
+		self.filepath = os.path.join(output_folderpath, 'checkpoint.json')
+		self.logger = logger
+		self.completed = [] # stages completed so far eg. ['csv2sqlite', 'shp2sqlite', 'determine_project_id']
+		self.variables = {} # eg. {'db_filepath': 'C:\\TEMP\\RAP2021_output3\\sqlite\\RAP_211121081100.sqlite', 'plotcount_cc_sh': {'CC': 1200, 'SH': 320},...}
+
+
+	def load(self):
+		"""reads checkpoint.json of the previous run. returns False if there isn't one (or it can't be read)."""
+		if not os.path.isfile(self.filepath):
+			self.logger.info("!!!!! Error - %s doesn't exist. The output folder has no completed stage to resume from."%self.filepath)
+			return False
+		try:
+			with open(self.filepath) as f:
+				saved = json.load(f)
+		except ValueError:
+			self.logger.info("!!!!! Error - %s is not a valid checkpoint."%self.filepath)
+			return False
+		self.completed = saved['completed']
+		self.variables = saved['variables']
+		self.logger.info("Checkpoint loaded. Completed stages: %s"%self.completed)
+		return True
+
+
+	def stages_to_run(self, from_stage = None, only_stage = None):
+		"""
+		returns the list of stages to run, or None if the stages before the requested one haven't been completed.
+		from_stage can be 'resume' - the stage after the last completed one.
+		"""
+		if only_stage != None:
+			first = STAGES.index(only_stage)
+			stages = [only_stage]
+		else:
+			if from_stage == 'resume':
+				not_completed = [i for i, stage in enumerate(STAGES) if stage not in self.completed]
+				if len(not_completed) == 0:
+					self.logger.info("All the stages were completed in the previous run. Nothing to resume.")
+					return []
+				first = not_completed[0]
+			else:
+				first = STAGES.index(from_stage)
+			stages = STAGES[first:]
+
+		missing = [stage for stage in STAGES[:first] if stage not in self.completed]
+		if len(missing) > 0:
+			self.logger.info("!!!!! Error - cannot start from %s. These stages have not been completed: %s"%(STAGES[first], missing))
+			return None
+		return stages
+
+
+	def save(self, stage, variables):
+		"""records that the stage has completed with the variables the later stages need (must be json serializable)"""
+		self.completed = [s for s in STAGES if s in self.completed or s == stage]
+		self.variables.update(variables)
+		self.write()
+		self.logger.debug("Checkpoint saved after %s"%stage)
+
+
+	def invalidate(self, stages):
+		"""forgets that these stages were completed (they are about to run again), so a stage that fails halfway won't look completed."""
+		self.completed = [s for s in self.completed if s not in stages]
+		self.write()
+
+
+	def write(self):
+		with open(self.filepath, 'w') as f:
+			json.dump({'completed': self.completed, 'variables': self.variables}, f, indent=1)
+
+##############    End of class "Checkpoint"   ######################
+
+
+
+
+
+# testing
+if __name__ == '__main__':
+	import tempfile, shutil, log
+	logfile = os.path.basename(__file__) + '_deleteMeLater.txt'
+	logger = log.logger(logfile, debug = True)
+	tmp = tempfile.mkdtemp()
+	cp = Checkpoint(tmp, logger)
+	cp.save('csv2sqlite', {'db_filepath': os.path.join(tmp, 'RAP.sqlite')})
+	cp.save('unpivot', {})
+	cp.save('shp2sqlite', {})
+	cp = Checkpoint(tmp, logger)
+	cp.load()
+	print(cp.stages_to_run(from_stage = 'resume')) # ['determine_project_id', 'qa', ...]
+	print(cp.stages_to_run(only_stage = 'to_browsers')) # None
+	shutil.rmtree(tmp)
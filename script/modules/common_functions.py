@@ -98,13 +98,20 @@ def open_spc_group_csv(spc_group_csv_file):
 
 
 
-def sqlite_2_dict(sqlite_db_file, tablename):
+def sqlite_2_dict(sqlite_db_file, tablename, query=None, params=()):
+	"""turns a sqlite table into a list of dictionaries.
+	optionally you can include sqlite query with ? placeholders and its params.
+	eg. query = "SELECT * FROM Cluster_Summary WHERE proj_id = ?", params = ('P-1',)
+	"""
 	import sqlite3
 
 	con = sqlite3.connect(sqlite_db_file)
 	con.row_factory = sqlite3.Row
 	c = con.cursor()
-	c.execute('SELECT * FROM %s'%tablename)
+	if query == None:
+		c.execute('SELECT * FROM %s'%tablename)
+	else:
+		c.execute(query, params)
 
 	result = [dict(row) for row in c.fetchall()]
 	# print(result)
@@ -112,6 +119,26 @@ def sqlite_2_dict(sqlite_db_file, tablename):
 	
 	return result
 
+def sqlite_2_tuples(sqlite_db_file, tablename, query=None, params=()):
+	"""same as sqlite_2_dict, but the records are plain tuples instead of dictionaries.
+	returns [column_names, rows] eg. [['unique_id', 'ClusterNumber', ...], [(1, '1101', ...), (2, '1102', ...)]]
+	use this for wide tables such as the survey tables (200+ columns) and look the values up by their index in column_names.
+	"""
+	import sqlite3
+
+	con = sqlite3.connect(sqlite_db_file)
+	c = con.cursor()
+	if query == None:
+		c.execute('SELECT * FROM %s'%tablename)
+	else:
+		c.execute(query, params)
+
+	column_names = [col[0] for col in c.description]
+	rows = c.fetchall()
+	con.close()
+
+	return [column_names, rows]
+
 def create_proj_tbl_name(proj_id, prefix = 'z_'):
 	"""input the project id and it will output a project table name
 	special characters will be replaced by "_" and it will have a prefix of z_.
@@ -145,11 +172,12 @@ def select_tallest_x(trees_in_plotx = [['La', 1.0], ['La', 2.0], ['La', 0.8], ['
 	return selected_trees
 
 
-def dict_lst_to_sqlite(dict_lst, db_filepath, new_tablename, logger):
+def dict_lst_to_sqlite(dict_lst, db_filepath, new_tablename, logger, indexes=[]):
 	"""
 	create a new table in the sqlite database and populate it with the list of dictionaries given
 	Only works on list of dictionaries where all dictionaries has the same list of keys.
 	eg. [{'id':1, 'name':'daniel'},{'id':2, 'name':'sam'}]
+	optionally, indexes (see create_indexes function) will be created once the table is populated.
 	"""
 	import sqlite3
 
@@ -221,6 +249,36 @@ def dict_lst_to_sqlite(dict_lst, db_filepath, new_tablename, logger):
 	con.commit()
 	con.close()
 
+	if len(indexes) > 0:
+		create_indexes(db_filepath, new_tablename, indexes, logger)
+
+
+def create_indexes(db_filepath, tablename, indexes, logger):
+	"""
+	create indexes on an existing table in the sqlite database.
+	indexes is a list of attribute names or tuples of attribute names (for multi-column indexes).
+	eg. ['proj_id', ('silvsys', 'cluster_uid')] will create idx_Cluster_Summary_proj_id and idx_Cluster_Summary_silvsys_cluster_uid
+	indexes on attributes that the table doesn't have will be skipped.
+	"""
+	import sqlite3
+
+	con = sqlite3.connect(db_filepath)
+	cur = con.cursor()
+	attr_names = [row[1] for row in cur.execute("PRAGMA table_info(%s)"%tablename)]
+
+	for index in indexes:
+		cols = [index] if isinstance(index, str) else list(index)
+		if not set(cols).issubset(attr_names):
+			logger.info("!!!! Cannot create index on %s%s - attribute not found."%(tablename, cols))
+			continue
+		index_name = no_special_char('idx_%s_%s'%(tablename, '_'.join(cols)))
+		sql = "CREATE INDEX IF NOT EXISTS %s ON %s (%s)"%(index_name, tablename, ','.join(cols))
+		logger.debug(sql)
+		cur.execute(sql)
+
+	con.commit()
+	con.close()
+
 
 def sort_integers(lst):
 	"""
@@ -245,9 +303,42 @@ def sort_integers(lst):
 
 
 
-def sqlite_2_html(sqlite_db_file, tablename, query=None, rename_header = {}, table_id="example"):
+def is_zip_input(path):
+	"""True if path is a zip file (eg. TDT's download, C:\raw_data\RAP_project_2020-07-13_4.zip) rather than a folder of csv files"""
+	import os, zipfile
+	return os.path.isfile(path) and zipfile.is_zipfile(path)
+
+
+def zip_data_folder(zip_file):
+	"""
+	returns the folder in the zip (an open zipfile.ZipFile) that has the csv files, as a prefix of the member names. 
+	eg. 'Regeneration Assessment Program_21-Nov-21_08-11/data/' or '' if the csv files are at the root of the zip.
+	the photo paths in the csv files (eg. 'images/connectspatial/25aa1a61-367f-4ffa.jpg') are relative to this folder.
+	returns None if there's no csv file in the zip.
+	"""
+	csv_members = [name for name in zip_file.namelist() if name.upper().endswith('.CSV')]
+	if len(csv_members) == 0:
+		return None
+	shallowest = min(csv_members, key=lambda name: name.count('/'))
+	return shallowest[:shallowest.rfind('/') + 1]
+
+
+
+def copy_zip_member(zip_file, member, dst):
+	"""copies a file in the zip (an open zipfile.ZipFile) to dst (full path) without extracting the zip. like shutil.copy2, the modified time is kept."""
+	import os, shutil, time
+	info = zip_file.getinfo(member)
+	with zip_file.open(info) as fsrc, open(dst, 'wb') as fdst:
+		shutil.copyfileobj(fsrc, fdst)
+	mtime = time.mktime(info.date_time + (0, 0, -1))
+	os.utime(dst, (mtime, mtime))
+
+
+
+def sqlite_2_html(sqlite_db_file, tablename, query=None, rename_header = {}, table_id="example", params=()):
 	"""turns a sqlite table into a string that you can use to create a table in html
 	optionally you can include sqlite query, and add a dictionary to replace attribute names.
+	params are bound to the ? placeholders of the query. eg. query = "SELECT * FROM Cluster_Summary WHERE proj_id = ?", params = ('P-1',)
 	for example, if rename_header = {'proj_id': 'Project ID'}, then proj_id attribute name "proj_id" will be replaced by "Project ID"
 	"""
 	import sqlite3
@@ -258,7 +349,7 @@ def sqlite_2_html(sqlite_db_file, tablename, query=None, rename_header = {}, tab
 	if query == None:
 		c.execute('SELECT * FROM %s'%tablename)
 	else:
-		c.execute(query)
+		c.execute(query, params)
 
 	result = [dict(row) for row in c.fetchall()]
 	attrs = result[0].keys() # list of attributes
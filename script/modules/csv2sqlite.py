@@ -1,4 +1,4 @@
-import os, csv, sqlite3
+import os, io, csv, sqlite3, zipfile
 
 # importing custom modules
 if __name__ == '__main__':
@@ -6,9 +6,12 @@ if __name__ == '__main__':
 else:
 	from modules import common_functions
 
+
+
 class Csv2sqlite:
 	"""turns a list of csv files into tables in a new sqlite database.
 	The newly created sqlite database will have a name like 'SEM_NER_200110110426.sqlite'
+	csvfolderpath can also be TDT's download (zip file). The csv files are then read straight out of the zip without extracting it.
 	returns the full path of the newly created db and the number of records in each.
 	"""
 	def __init__(self, csvfolderpath, db_output_path, unique_id_fieldname, logger, ignore_testdata):
@@ -17,14 +20,17 @@ class Csv2sqlite:
 		self.logger.info('\n')		
 		self.logger.info('--> Running csv2sqlite module')
 		self.csvfolderpath = csvfolderpath # where the csv files are stored
+		self.zip_filepath = csvfolderpath if common_functions.is_zip_input(csvfolderpath) else None # eg. C:\raw_data\RAP_project_2020-07-13_4.zip
 		self.db_path = db_output_path # where you want to save the newly created sqlite file
 		self.unique_id_fieldname = unique_id_fieldname
 		self.ignore_testdata = ignore_testdata
+		self.batch_size = 1000 # number of rows inserted at a time
 
 		# self.overwrite = overwrite  <- inactive. delete this unless you need non-overwriting option.
 		self.db_name = ''
 		self.db_fullpath_new = ''
 		self.tablenames_n_rec_count = {}
+		self.tables_in_progress = {} # tables that are being written. eg. {'Clearcut_Survey_v2021': {'fieldnames': [...], 'insert_sql': 'INSERT INTO...', 'row_counter': 1000}}
 
 		# this fieldname will be used as the new primary key field when moving the csv files to the sqlite.
 
@@ -56,8 +62,17 @@ class Csv2sqlite:
 	def getcsvfilelist(self):
 		"""
 		creates a list of csv file paths based on the input csv folder path
+		if the input is a zip file, the list has the names of the csv files in the zip instead. eg. ['RAP_project_2020-07-13_4/data/Clearcut_Survey_v2021.csv',...]
 		"""
-		if os.path.isdir(self.csvfolderpath):
+		if self.zip_filepath != None:
+			self.logger.info('Reading the csv files straight from the zip file: %s'%self.zip_filepath)
+			with zipfile.ZipFile(self.zip_filepath) as zip_file:
+				data_folder = common_functions.zip_data_folder(zip_file) # eg. 'RAP_project_2020-07-13_4/data/'
+				self.csvfile_list = [name for name in zip_file.namelist() if data_folder != None and name.startswith(data_folder)
+									and '/' not in name[len(data_folder):] and name.upper()[-4:] == '.CSV']
+			if len(self.csvfile_list) == 0:
+				self.logger.info('*** ERROR: No csv file found in the zip file: %s'%self.zip_filepath)
+		elif os.path.isdir(self.csvfolderpath):
 			self.csvfile_list = [os.path.join(self.csvfolderpath,file) for file in os.listdir(self.csvfolderpath) if file.upper()[-4:] == '.CSV']
 			if len(self.csvfile_list) == 0:
 				self.logger.info('*** ERROR: No csv file found in the directory: %s'%self.csvfolderpath)
@@ -72,20 +87,76 @@ class Csv2sqlite:
 		This module assumes that the fieldnames in those csv files are unique and have no special character.
 		Reads the input csv files and outputs it into the sqlite database.
 		This module is not specific to RAP project csv files, and can be applied to any csv files.
+		The csv files are read by read_csv method and the sqlite database is written by write_msg method, one batch of rows at a time.
 		"""
-
+		con = sqlite3.connect(self.db_fullpath_new)
+		cur = con.cursor()
 		for csv_fullpath in self.csvfile_list:
+			self.read_csv(csv_fullpath, lambda msg: self.write_msg(cur, msg))
+		con.commit()
+		con.close()
 
-			csvfile = open(csv_fullpath, encoding='utf-8-sig') # this encoding is necessary to remove BOM from the beginning of CSV.
-			reader = csv.reader(csvfile)
-			fieldnames = next(reader) # a list of field names.
 
-			# table name is bascially the csv file name
-			table_name = os.path.split(csv_fullpath)[1]
-			table_name = table_name[:-4] # remove '.csv'
-			table_name = common_functions.no_special_char(table_name)
+	def read_csv(self, csv_fullpath, put):
+		"""
+		reads a csv file and passes it on to the writer as messages:
+			('start', table_name, fieldnames)
+			('rows', table_name, [row, row,...])  - in batches of self.batch_size rows
+			('end', table_name, err_counter)
+		"""
+		if self.zip_filepath != None:
+			# csv_fullpath is the name of the csv file in the zip
+			zip_file = zipfile.ZipFile(self.zip_filepath)
+			csvfile = io.TextIOWrapper(zip_file.open(csv_fullpath), encoding='utf-8-sig')
+		else:
+			zip_file = None
+			csvfile = open(csv_fullpath, encoding='utf-8-sig') # this encoding is necessary to remove BOM from the beginning of CSV.
+		reader = csv.reader(csvfile)
+		fieldnames = next(reader) # a list of field names.
+
+		# table name is bascially the csv file name
+		table_name = os.path.split(csv_fullpath)[1]
+		table_name = table_name[:-4] # remove '.csv'
+		table_name = common_functions.no_special_char(table_name)
+		put(('start', table_name, fieldnames))
+
+		batch = []
+		err_counter = 0
+		for row in reader:
+			# check if number of fieldnames matches with number of values to be inserted
+			# for terraflex projects, this is most likely because lat lon values are missing.
+			if len(fieldnames) < len(row):
+				# this is usually the case where the FIELDNAME "latitude" or "longitude" is missing
+				err_counter += 1
+				continue
+
+			if len(fieldnames) > len(row):
+				# this is usually the case where the VALUE of "latitude" or "longitude" is missing
+				# This can be resolved by putting 0 in the place of those missing values.
+				difference = len(fieldnames) - len(row)
+				blank_fill = [0 for i in range(difference)]  # [0, 0, 0] if 3 values are missing.
+				row = row + blank_fill
+
+			batch.append(row)
+			if len(batch) >= self.batch_size:
+				put(('rows', table_name, batch))
+				batch = []
+
+		if len(batch) > 0:
+			put(('rows', table_name, batch))
+		put(('end', table_name, err_counter))
+		csvfile.close()
+		if zip_file != None:
+			zip_file.close()
+
+
+	def write_msg(self, cur, msg):
+		"""writes the messages from read_csv method to the sqlite database"""
+		msg_type, table_name, content = msg
+
+		if msg_type == 'start':
+			fieldnames = content
 			self.logger.info("working on '%s'"%table_name)
-
 			# the sql script for creating a new table
 			create_t_sql = "CREATE TABLE %s "%table_name
 			str_fieldnames = '('
@@ -98,91 +169,71 @@ class Csv2sqlite:
 			# we are going to sneak in a unique_id field that auto-increments as we add data.
 			create_t_sql += str_fieldnames[0] + '%s integer primary key autoincrement, '%self.unique_id_fieldname + str_fieldnames[1:] + ";"
 
-
-			# creating/opening the sql database and table
-			con = sqlite3.connect(self.db_fullpath_new)
-			cur = con.cursor()
 			try:
 				self.logger.debug("Creating a new table: %s"%table_name)
-				# print(create_t_sql)
 				cur.execute(create_t_sql)
 			except:
 				self.logger.info("* WARNING: Table '%s' already exists. Dropping and recreating the table."%table_name)
 				cur.execute("DROP TABLE %s"%table_name)	
 				cur.execute(create_t_sql)
 
-
 			# inserting values
 			self.logger.debug("running INSERT statement...")
-			insert_sql = "INSERT INTO %s %s"%(table_name, str_fieldnames)
-			row_counter = 0
-			err_counter = 0
-			for row in reader:
-				# check if number of fieldnames matches with number of values to be inserted
-				# for terraflex projects, this is most likely because lat lon values are missing.
-				if len(fieldnames) < len(row):
-					# this is usually the case where the FIELDNAME "latitude" or "longitude" is missing
-					err_counter += 1
-					continue
-
-				if len(fieldnames) > len(row):
-					# this is usually the case where the VALUE of "latitude" or "longitude" is missing
-					# This can be resolved by putting 0 in the place of those missing values.
-					difference = len(fieldnames) - len(row)
-					blank_fill = [0 for i in range(difference)]  # [0, 0, 0] if 3 values are missing.
-					row = row + blank_fill
-
-				val = str(tuple(row))
-				values_sql = " VALUES %s;"%val
-				sql = insert_sql + values_sql
-				# print(sql)
-				cur.execute(sql)
-				row_counter += 1
-
-			if err_counter > 0:
-				self.logger.info("* WARNING: Some fieldnames (such as lat long) seems to be missing in table %s. This can be caused by \
-					the most recently added project or cluster survey not having gps coordinates collected."%table_name)
-
-			# check if fieldnames include latitude and longitude
-			# starting Dec 2020, there are not latitude and longitude field in terraflex connect,
-			# 	instead, they have X, and Y fields. So we need to manually create latitude and longitude fields.
-			# this is done by renaming attribute names. X = longitude, Y = latitude
-			if 'longitude' not in fieldnames or 'latitude' not in fieldnames:
-				self.logger.info("%s does not have latitude or longitude field. Looking for X & Y fields instead..."%table_name)
-				for orig, new in {'X':'longitude', 'Y':'latitude'}.items():
-					if orig in fieldnames:
-						rename_sql = "ALTER TABLE %s RENAME COLUMN %s TO %s"%(table_name, orig, new) #eg. ALTER TABLE cluster_survey RENAME COLUMN X TO longitude
-						cur.execute(rename_sql)
-						self.logger.info("In the table, %s, fieldname '%s' has been renamed to '%s'"%(table_name, orig, new))
-						# update fieldnames (replace X with longitude and etc.)
-						for index, fieldname in enumerate(fieldnames):
-							if fieldname == orig:
-								fieldnames[index] = new
-
-			# Note that starting Dec 2020, if the user have not collected lat long, the X, Y value will be blank instead of 0, 0.
-
-			# delete test data
-			if self.ignore_testdata == True:
-				self.logger.debug("deleting test data records...")
-				delete_sql = "DELETE FROM %s WHERE TestData = 'Yes';"%table_name
-				# for example, DELETE FROM l387081_Cluster_Survey_Testing_ WHERE TestData = 'Yes';
-				cur.execute(delete_sql)
-
-				# count remaining records
-				count_sql = "SELECT * FROM %s"%table_name
-				count = len(cur.execute(count_sql).fetchall())
-				deleted_counter = row_counter - count
-				self.logger.info("Number of deleted records (test data): %s"%deleted_counter)
-				row_counter = count
-
-			self.logger.info("%s rows have been added to '%s' table in the sqlite database."%(row_counter, table_name))
-
-			fieldnames.append(self.unique_id_fieldname)
-			self.tablenames_n_rec_count[table_name] = [fieldnames,row_counter]
-
-			con.commit()
-			con.close()
-			csvfile.close()
+			insert_sql = "INSERT INTO %s %s VALUES (%s)"%(table_name, str_fieldnames, ','.join(['?']*len(fieldnames)))
+			self.tables_in_progress[table_name] = {'fieldnames': fieldnames, 'insert_sql': insert_sql, 'row_counter': 0}
+
+		elif msg_type == 'rows':
+			table = self.tables_in_progress[table_name]
+			cur.executemany(table['insert_sql'], content)
+			table['row_counter'] += len(content)
+
+		elif msg_type == 'end':
+			table = self.tables_in_progress.pop(table_name)
+			self.finish_table(cur, table_name, table['fieldnames'], table['row_counter'], err_counter = content)
+
+
+	def finish_table(self, cur, table_name, fieldnames, row_counter, err_counter):
+		"""once all the rows are in, rename X, Y fields, delete test data and record the number of records"""
+		if err_counter > 0:
+			self.logger.info("* WARNING: Some fieldnames (such as lat long) seems to be missing in table %s. This can be caused by \
+				the most recently added project or cluster survey not having gps coordinates collected."%table_name)
+
+		# check if fieldnames include latitude and longitude
+		# starting Dec 2020, there are not latitude and longitude field in terraflex connect,
+		# 	instead, they have X, and Y fields. So we need to manually create latitude and longitude fields.
+		# this is done by renaming attribute names. X = longitude, Y = latitude
+		if 'longitude' not in fieldnames or 'latitude' not in fieldnames:
+			self.logger.info("%s does not have latitude or longitude field. Looking for X & Y fields instead..."%table_name)
+			for orig, new in {'X':'longitude', 'Y':'latitude'}.items():
+				if orig in fieldnames:
+					rename_sql = "ALTER TABLE %s RENAME COLUMN %s TO %s"%(table_name, orig, new) #eg. ALTER TABLE cluster_survey RENAME COLUMN X TO longitude
+					cur.execute(rename_sql)
+					self.logger.info("In the table, %s, fieldname '%s' has been renamed to '%s'"%(table_name, orig, new))
+					# update fieldnames (replace X with longitude and etc.)
+					for index, fieldname in enumerate(fieldnames):
+						if fieldname == orig:
+							fieldnames[index] = new
+
+		# Note that starting Dec 2020, if the user have not collected lat long, the X, Y value will be blank instead of 0, 0.
+
+		# delete test data
+		if self.ignore_testdata == True:
+			self.logger.debug("deleting test data records...")
+			delete_sql = "DELETE FROM %s WHERE TestData = 'Yes';"%table_name
+			# for example, DELETE FROM l387081_Cluster_Survey_Testing_ WHERE TestData = 'Yes';
+			cur.execute(delete_sql)
+
+			# count remaining records
+			count_sql = "SELECT COUNT(*) FROM %s"%table_name
+			count = cur.execute(count_sql).fetchone()[0]
+			deleted_counter = row_counter - count
+			self.logger.info("Number of deleted records (test data): %s"%deleted_counter)
+			row_counter = count
+
+		self.logger.info("%s rows have been added to '%s' table in the sqlite database."%(row_counter, table_name))
+
+		fieldnames.append(self.unique_id_fieldname)
+		self.tablenames_n_rec_count[table_name] = [fieldnames,row_counter]
 
 
 	def fix_misspelled_fieldnames(self):
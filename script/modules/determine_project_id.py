@@ -415,6 +415,18 @@ class Determine_project_id:
 
 
 
+	def index_survey_tables(self):
+		"""
+		index the clearcut and shelterwood survey tables on unique_id, fin_proj_id and ClusterNumber
+		so the updates below and the per-project/per-cluster queries on the raw survey data don't need a full table scan.
+		"""
+		self.logger.info('Creating indexes on the survey tables')
+		indexes = [self.unique_id_field, self.fin_proj_id_field, 'ClusterNumber', (self.fin_proj_id_field, 'ClusterNumber')]
+		for tablename in [self.clearcut_tbl_name, self.shelterwood_tbl_name]:
+			common_functions.create_indexes(self.db_filepath, tablename, indexes, self.logger)
+
+
+
 	def return_updated_variables(self):
 		return [self.tablenames_n_rec_count, self.uniq_id_to_proj_id, self.clearcut_tbl_name, self.shelterwood_tbl_name, self.summary_dict]
 
@@ -429,6 +441,7 @@ class Determine_project_id:
 		self.check_results()
 		self.check_silvsys()
 		self.summarize_results()
+		self.index_survey_tables()
 		self.populate_projID_fields()
 
 
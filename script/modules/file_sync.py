@@ -0,0 +1,141 @@
+# copies files only when they are new or have changed, keeping a manifest (size, mtime and sha1) of what's been copied.
+# the output folder is deleted at every run, but the site is published to a folder that's kept between runs (eg. a OneDrive folder sync'ed with SharePoint).
+# re-writing an unchanged file there makes OneDrive upload it again, which is slow for the multi-megabyte pdfs. With the manifest, unchanged files are left alone.
+# where the file system allows it, a file is hard linked (or reflinked) instead of copied.
+# a hard link shares the data with the source, so files that are edited after they're copied (eg. the html templates) must be copied (link=False).
+
+import os, sys, json, shutil, hashlib
+
+
+
+class File_sync:
+	def __init__(self, manifest_filepath, logger):
+		self.manifest_filepath = manifest_filepath # json file. None to keep the manifest in memory only
+		self.logger = logger
+		self.manifest = {} # {dst_filepath: {'src_size': 1234, 'src_mtime': 1634567890.1, 'dst_size': 1234, 'dst_mtime': 1634567890.1, 'sha1': 'a94a8fe5cc...'}, ...}
+		if manifest_filepath != None and os.path.isfile(manifest_filepath):
+			try:
+				with open(manifest_filepath) as f:
+					self.manifest = json.load(f)
+			except ValueError:
+				self.logger.info("!!!! %s is not a valid manifest. All the files will be copied again."%manifest_filepath)
+		self.synced = set() # dst files copied (or found unchanged) by this instance
+		self.num_copied = 0
+		self.num_unchanged = 0
+
+
+	def copy(self, src, dst, link=False):
+		"""copies src to dst (full file paths) if dst is missing or different from src. returns True if copied."""
+		self.synced.add(dst)
+		src_stat = os.stat(src)
+		record = self.manifest.get(dst)
+		if os.path.isfile(dst):
+			dst_stat = os.stat(dst)
+			# quick check - neither src nor dst has changed since the last copy
+			if record != None and record['src_size'] == src_stat.st_size and record['src_mtime'] == src_stat.st_mtime \
+				and record['dst_size'] == dst_stat.st_size and record['dst_mtime'] == dst_stat.st_mtime:
+				self.num_unchanged += 1
+				return False
+			# src was saved again (or dst isn't in the manifest yet) but the content may still be the same
+			if src_stat.st_size == dst_stat.st_size:
+				src_sha1 = file_sha1(src)
+				if src_sha1 == file_sha1(dst):
+					self.manifest[dst] = self.record(src_stat, dst_stat, src_sha1)
+					self.num_unchanged += 1
+					return False
+
+		dst_folder = os.path.dirname(dst)
+		if dst_folder != '' and not os.path.isdir(dst_folder):
+			os.makedirs(dst_folder)
+		if os.path.lexists(dst):
+			os.remove(dst) # never write into dst - it may be a hard link of a previous source
+		if link:
+			link_or_copy(src, dst)
+		else:
+			shutil.copy2(src, dst)
+		self.manifest[dst] = self.record(src_stat, os.stat(dst), file_sha1(src))
+		self.num_copied += 1
+		return True
+
+
+	def copy_tree(self, src_folder, dst_folder, link=False):
+		"""copies every file in src_folder (and its sub folders) to the same relative path in dst_folder"""
+		for root, dirs, files in os.walk(src_folder):
+			for f in files:
+				src_file = os.path.join(root, f)
+				self.copy(src_file, os.path.join(dst_folder, os.path.relpath(src_file, src_folder)), link)
+
+
+	def remove_stale(self):
+		"""deletes the files that were copied by a previous run but not by this one (files that aren't in the manifest are never deleted)"""
+		num_removed = 0
+		for dst in list(self.manifest.keys()):
+			if dst not in self.synced:
+				if os.path.isfile(dst):
+					os.remove(dst)
+					num_removed += 1
+				del self.manifest[dst]
+		return num_removed
+
+
+	def save(self):
+		if self.manifest_filepath != None:
+			with open(self.manifest_filepath, 'w') as f:
+				json.dump(self.manifest, f, indent=1)
+		self.logger.debug("%s files copied, %s unchanged files skipped"%(self.num_copied, self.num_unchanged))
+
+
+	@staticmethod
+	def record(src_stat, dst_stat, sha1):
+		return {'src_size': src_stat.st_size, 'src_mtime': src_stat.st_mtime, 'dst_size': dst_stat.st_size, 'dst_mtime': dst_stat.st_mtime, 'sha1': sha1}
+
+##############    End of class "File_sync"   ######################
+
+
+
+def file_sha1(filepath):
+	sha1 = hashlib.sha1()
+	with open(filepath, 'rb') as f:
+		for chunk in iter(lambda: f.read(1024*1024), b''):
+			sha1.update(chunk)
+	return sha1.hexdigest()
+
+
+def link_or_copy(src, dst):
+	"""hard link if src and dst are on the same drive, otherwise reflink (copy-on-write clone, on linux file systems that support it), otherwise copy"""
+	try:
+		os.link(src, dst)
+		return 'link'
+	except (OSError, AttributeError, NotImplementedError):
+		pass
+	if sys.platform.startswith('linux'):
+		import fcntl
+		FICLONE = 0x40049409
+		try:
+			with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+				fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+			shutil.copystat(src, dst)
+			return 'reflink'
+		except OSError:
+			os.remove(dst)
+	shutil.copy2(src, dst)
+	return 'copy'
+
+
+
+
+
+# testing
+if __name__ == '__main__':
+	import tempfile, log
+	logfile = os.path.basename(__file__) + '_deleteMeLater.txt'
+	logger = log.logger(logfile, debug = True)
+	tmp = tempfile.mkdtemp()
+	src = os.path.join(tmp, 'src.pdf')
+	with open(src, 'w') as f:
+		f.write('pdf')
+	fs = File_sync(os.path.join(tmp, 'manifest.json'), logger)
+	print(fs.copy(src, os.path.join(tmp, 'pub', 'src.pdf'), link=True)) # True
+	print(fs.copy(src, os.path.join(tmp, 'pub', 'src.pdf'), link=True)) # False
+	fs.save()
+	shutil.rmtree(tmp)
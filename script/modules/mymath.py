@@ -1,3 +1,4 @@
+import zlib
 import numpy as np
 import scipy.stats
 
@@ -21,6 +22,92 @@ def mean_std_ci(data, confidence=0.95):
     return return_value
 
 
+def bootstrap_ci(data_lst, replicates=2000, confidence=0.95, rng=None):
+    """percentile bootstrap confidence interval of the mean.
+    data_lst is a list of dictionaries with the same keys (eg. the same clusters), one dictionary per variable (eg. per species)
+    eg. [{'101': 30.0, '102': 0, '103': 50.0}, {'101': 70.0, '102': 100.0, '103': 50.0}]
+    the clusters are resampled once for each replicate and the same resample is used for all the variables,
+    so all variables x replicates are calculated at once.
+    returns a list of dictionaries (same order as data_lst). eg. [{'boot_lower_ci': 0.0, 'boot_upper_ci': 50.0}, {...}]
+    the dictionary is empty if n < 2 (same as mean_std_ci)
+    """
+    if len(data_lst) == 0:
+        return []
+    keys = list(data_lst[0].keys())
+    n = len(keys)
+    if n < 2:
+        return [{} for data in data_lst]
+    if rng is None:
+        rng = np.random.default_rng()
+    a = 1.0 * np.array([[data[k] for k in keys] for data in data_lst]) # (variables, n)
+    # each replicate is turned into the number of times each cluster is drawn, so the means of all replicates are one matrix product
+    resample = rng.integers(0, n, size=(replicates, n)) # (replicates, n)
+    counts = np.bincount((resample + np.arange(replicates)[:, None] * n).ravel(), minlength=replicates * n).reshape(replicates, n)
+    means = a @ counts.T / n # (variables, replicates)
+    lower, upper = np.percentile(means, [100 * (1 - confidence) / 2., 100 * (1 + confidence) / 2.], axis=1)
+    return [{'boot_lower_ci':round(float(lower[i]),4), 'boot_upper_ci':round(float(upper[i]),4)} for i in range(len(data_lst))]
+
+
+def bootstrap_project(task):
+    """bootstrap_ci for one project. used by Run_analysis.bootstrap_projects (possibly in a separate process).
+    task = [proj_id, data_groups, replicates, confidence, seed]
+    data_groups is a list of data_lst (see bootstrap_ci). each group has its own clusters. eg. [[ed_data, so_data], [spc_data1, spc_data2,...]]
+    the random generator is seeded with the seed and the project id, so the results don't depend on the order the projects are processed.
+    returns [proj_id, [bootstrap_ci results of each group]]
+    """
+    proj_id, data_groups, replicates, confidence, seed = task
+    rng = np.random.default_rng([seed, zlib.crc32(str(proj_id).encode())])
+    return [proj_id, [bootstrap_ci(data_lst, replicates, confidence, rng) for data_lst in data_groups]]
+
+
+def welford_add(acc, x):
+    """adds a value to a running (n, mean, m2) accumulator (Welford's algorithm). eg. welford_add((2, 3.0, 2.0), 6) -> (3, 4.0, 8.0)
+    m2 is the sum of squared differences from the mean, so the variance is m2/(n-1).
+    """
+    n, mean, m2 = acc
+    n += 1
+    delta = x - mean
+    mean += delta / n
+    m2 += delta * (x - mean)
+    return (n, mean, m2)
+
+
+def welford_remove(acc, x):
+    """takes a value that was added to a running (n, mean, m2) accumulator back out of it. eg. welford_remove((3, 4.0, 8.0), 6) -> (2, 3.0, 2.0)"""
+    n, mean, m2 = acc
+    if n <= 1:
+        return (0, 0.0, 0.0)
+    n -= 1
+    old_mean = mean
+    mean = (old_mean * (n + 1) - x) / n
+    m2 -= (x - mean) * (x - old_mean)
+    return (n, mean, max(m2, 0.0))
+
+
+def welford_merge(acc_a, acc_b):
+    """merges two (n, mean, m2) accumulators of separate data (Chan et al.). the result is the same as accumulating all the data at once (up to floating point rounding)."""
+    n_a, mean_a, m2_a = acc_a
+    n_b, mean_b, m2_b = acc_b
+    n = n_a + n_b
+    if n == 0:
+        return (0, 0.0, 0.0)
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta * delta * n_a * n_b / n
+    return (n, mean, m2)
+
+
+def welford_stats(acc, confidence=0.95):
+    """same output as mean_std_ci, but from a (n, mean, m2) accumulator. the running mean may differ from sum/n in the last bits, so the rounded values can differ in the 4th decimal"""
+    n, m, m2 = acc
+    if n < 2:
+        return {}
+    std = (max(m2, 0.0) / (n - 1)) ** 0.5
+    ci = std / n ** 0.5 * scipy.stats.t.ppf((1 + confidence) / 2., n-1)
+    ci = round(ci,4)
+    return {'mean':round(m,4), 'stdv':round(std,4), 'ci':ci, 'upper_ci':round(m+ci,4), 'lower_ci':round(m-ci,4), 'n':n, 'confidence':confidence}
+
+
 def check_duplicates(lst):
     """ input: any list
         output: None if all values in the list are unique
@@ -49,6 +136,11 @@ if __name__ == '__main__':
     print(mean_std_ci(data1))
     print(mean_std_ci(data2))
     print(mean_std_ci(data3))
+    print(bootstrap_ci([data1, data2], rng=np.random.default_rng(0)))
+    acc = (0, 0.0, 0.0)
+    for x in data1.values():
+        acc = welford_add(acc, x)
+    print(welford_stats(acc))
 
 
     # data3 = [1,2,3,4,5,6,7,8]
@@ -0,0 +1,224 @@
+# data quality checks of the survey data.
+# this module comes after determine_project_id.py (the checks need fin_proj_id) and before analysis.py.
+# the checks are declared in RULES below. Each rule is a SELECT statement that returns its violations
+# (survey_table, unique_id, proj_id, cluster_number, plot, value) from these temporary tables:
+#	qa_cluster - one row per cluster survey (both clearcut and shelterwood forms)
+#	qa_plot - one row per plot of each cluster survey
+#	qa_tree - one row per species entry (Species1..Species4 for clearcut, Species1..Species6 for shelterwood) of each plot
+#	qa_spc - one row per species label entered. spc_code and is_valid come from species.py (the same lookup analysis.py uses)
+# the wide survey tables are flattened into these tables once, and all the rules are run as a single INSERT statement.
+# every violation is written to the qa_issues table, and the number of violations of each rule to the qa_rules table.
+# the QA tab of the dashboard shows both (see to_browsers.py).
+# the checks don't stop the program - analysis.py still decides how the data is counted (eg. invalid species are not counted).
+
+import sqlite3
+
+# importing custom modules
+if __name__ == '__main__':
+	import common_functions
+else:
+	from modules import common_functions
+
+
+# lat should be between 41 and 57 and lon should be between -96 and -73 (same bounds as shp2sqlite.py's check_records)
+LAT_MIN, LAT_MAX, LON_MIN, LON_MAX = 41, 57, -96, -73
+
+# level: 'error' - the data can't be used as it is (the program may fail or the cluster is left out)
+#		 'warning' - the data is used, but not the way the field staff may have intended
+RULES = [
+	{'rule_id': 'no_project', 'level': 'error',
+	'description': "The cluster has no project ID (it's not in any project polygon and ProjIDManualOverride is empty).",
+	'sql': """SELECT survey_table, unique_id, proj_id, cluster_number, NULL, NULL FROM qa_cluster
+			WHERE proj_id IS NULL OR proj_id = ''"""},
+
+	{'rule_id': 'unknown_project', 'level': 'error',
+	'description': "The project ID of the cluster is not in the project shapefile.",
+	'sql': """SELECT survey_table, unique_id, proj_id, cluster_number, NULL, proj_id FROM qa_cluster
+			WHERE proj_id != '' AND UPPER(proj_id) NOT IN (SELECT UPPER({shp_proj_id}) FROM {shp})"""},
+
+	{'rule_id': 'silvsys_mismatch', 'level': 'warning',
+	'description': "The survey form (CC = clearcut, SH = shelterwood) doesn't match the project's SILVSYS in the shapefile.",
+	'sql': """SELECT c.survey_table, c.unique_id, c.proj_id, c.cluster_number, NULL, 'form: ' || c.silvsys || ', shpfile: ' || UPPER(s.SILVSYS)
+			FROM qa_cluster c JOIN {shp} s ON UPPER(s.{shp_proj_id}) = UPPER(c.proj_id)
+			WHERE UPPER(s.SILVSYS) != c.silvsys"""},
+
+	{'rule_id': 'duplicate_cluster', 'level': 'warning',
+	'description': "The cluster number was surveyed more than once in the project. Only the last survey is used.",
+	'sql': """SELECT c.survey_table, c.unique_id, c.proj_id, c.cluster_number, NULL, d.num_surveys || ' surveys'
+			FROM qa_cluster c JOIN (SELECT proj_id, cluster_number, COUNT(*) AS num_surveys FROM qa_cluster
+				WHERE proj_id != '' GROUP BY proj_id, cluster_number HAVING COUNT(*) > 1) d
+			ON c.proj_id = d.proj_id AND c.cluster_number = d.cluster_number"""},
+
+	{'rule_id': 'cluster_latlon', 'level': 'warning',
+	'description': "The cluster's latitude or longitude is missing or outside Ontario (lat {lat_min} to {lat_max}, lon {lon_min} to {lon_max}).",
+	'sql': """SELECT survey_table, unique_id, proj_id, cluster_number, NULL, latitude || ', ' || longitude FROM qa_cluster
+			WHERE NOT (CAST(latitude AS REAL) BETWEEN {lat_min} AND {lat_max} AND CAST(longitude AS REAL) BETWEEN {lon_min} AND {lon_max})"""},
+
+	{'rule_id': 'project_latlon', 'level': 'error',
+	'description': "The project's LAT or LON in the shapefile is outside Ontario (lat {lat_min} to {lat_max}, lon {lon_min} to {lon_max}).",
+	'sql': """SELECT '{shp}', NULL, {shp_proj_id}, NULL, NULL, LAT || ', ' || LON FROM {shp}
+			WHERE NOT (CAST(LAT AS REAL) BETWEEN {lat_min} AND {lat_max} AND CAST(LON AS REAL) BETWEEN {lon_min} AND {lon_max})"""},
+
+	{'rule_id': 'invalid_species', 'level': 'warning',
+	'description': "The species is not in the species group csv file. Its trees are not counted.",
+	'sql': """SELECT t.survey_table, t.unique_id, t.proj_id, t.cluster_number, t.plot, t.spc_name
+			FROM qa_tree t JOIN qa_spc s ON s.spc_name = t.spc_name
+			WHERE t.unoccupied != 'Yes' AND s.spc_code IS NOT NULL AND s.is_valid = 0"""},
+
+	{'rule_id': 'invalid_tree_count', 'level': 'error',
+	'description': "The number of trees is not a whole number.",
+	'sql': """SELECT t.survey_table, t.unique_id, t.proj_id, t.cluster_number, t.plot, t.spc_name || ': ' || t.spc_count
+			FROM qa_tree t JOIN qa_spc s ON s.spc_name = t.spc_name
+			WHERE t.unoccupied != 'Yes' AND s.is_valid = 1 AND t.spc_count NOT IN ('', '0') AND t.spc_count GLOB '*[^0-9]*'"""},
+
+	{'rule_id': 'trees_without_species', 'level': 'warning',
+	'description': "Number of trees entered without a species. The trees are not counted.",
+	'sql': """SELECT t.survey_table, t.unique_id, t.proj_id, t.cluster_number, t.plot, t.spc_count
+			FROM qa_tree t JOIN qa_spc s ON s.spc_name = t.spc_name
+			WHERE t.unoccupied != 'Yes' AND s.spc_code IS NULL AND t.spc_count NOT IN ('', '0')"""},
+
+	{'rule_id': 'occupied_plot_no_trees', 'level': 'warning',
+	'description': "The plot is not marked unoccupied but has no trees of a valid species. It's counted as unoccupied (reason: Unspecified).",
+	'sql': """SELECT p.survey_table, p.unique_id, p.proj_id, p.cluster_number, p.plot, NULL FROM qa_plot p
+			WHERE p.unoccupied != 'Yes' AND NOT EXISTS (SELECT 1 FROM qa_tree t JOIN qa_spc s ON s.spc_name = t.spc_name
+				WHERE t.survey_table = p.survey_table AND t.unique_id = p.unique_id AND t.plot = p.plot
+				AND s.is_valid = 1 AND t.spc_count NOT IN ('', '0'))"""},
+
+	{'rule_id': 'unoccupied_plot_with_trees', 'level': 'warning',
+	'description': "The plot is marked unoccupied but has trees entered. The trees are not counted.",
+	'sql': """SELECT p.survey_table, p.unique_id, p.proj_id, p.cluster_number, p.plot, p.unoccupied_reason FROM qa_plot p
+			WHERE p.unoccupied = 'Yes' AND EXISTS (SELECT 1 FROM qa_tree t
+				WHERE t.survey_table = p.survey_table AND t.unique_id = p.unique_id AND t.plot = p.plot AND t.spc_count NOT IN ('', '0'))"""},
+]
+
+
+
+class QA:
+	def __init__(self, cfg_dict, db_filepath, clearcut_tbl_name, shelterwood_tbl_name, spc_registry, logger):
+		self.db_filepath = db_filepath
+		self.logger = logger
+		self.spc_registry = spc_registry # species.Species_registry instance
+		self.survey_tbls = {'CC': clearcut_tbl_name, 'SH': shelterwood_tbl_name} # eg. {'CC': 'Clearcut_Survey_v2021', 'SH': 'Shelterwood_Survey_v2021'}
+		self.num_of_spc = {'CC': 4, 'SH': 6} # number of species entries per plot in each form
+		self.num_of_plots = int(cfg_dict['CALC']['num_of_plots'])
+		self.unique_id = cfg_dict['SQLITE']['unique_id_fieldname']
+		self.fin_proj_id = cfg_dict['SQLITE']['fin_proj_id']
+		self.shp_tblname = cfg_dict['SHP']['shp2sqlite_tablename']
+		self.shp_proj_id = cfg_dict['SHP']['project_id_fieldname']
+		self.qa_issues_tblname = cfg_dict['SQLITE']['qa_issues_tblname']
+		self.qa_rules_tblname = cfg_dict['SQLITE']['qa_rules_tblname']
+		self.disabled_rules = [rule_id.strip() for rule_id in cfg_dict['QA']['disabled_rules'].split(',') if rule_id.strip() != '']
+		self.rules = [rule for rule in RULES if rule['rule_id'] not in self.disabled_rules]
+
+		self.logger.info("\n")
+		self.logger.info("--> Running qa module")
+
+
+	def initiate_connection(self):
+		self.con = sqlite3.connect(self.db_filepath)
+		self.cur = self.con.cursor()
+
+
+	def flatten_survey(self):
+		"""fills the temporary qa_cluster, qa_plot, qa_tree and qa_spc tables (see the top of this script) from the survey tables"""
+		self.logger.debug("running flatten_survey method")
+		self.cur.execute("CREATE TEMP TABLE qa_cluster (survey_table TEXT, silvsys TEXT, unique_id INTEGER, proj_id TEXT, cluster_number TEXT, latitude TEXT, longitude TEXT)")
+		self.cur.execute("CREATE TEMP TABLE qa_plot (survey_table TEXT, unique_id INTEGER, proj_id TEXT, cluster_number TEXT, plot TEXT, unoccupied TEXT, unoccupied_reason TEXT)")
+		self.cur.execute("CREATE TEMP TABLE qa_tree (survey_table TEXT, unique_id INTEGER, proj_id TEXT, cluster_number TEXT, plot TEXT, unoccupied TEXT, spc_num INTEGER, spc_name TEXT, spc_count TEXT)")
+		self.cur.execute("CREATE TEMP TABLE qa_spc (spc_name TEXT PRIMARY KEY, spc_code TEXT, is_valid INTEGER)")
+
+		cluster_selects, plot_selects, tree_selects = [], [], []
+		for silvsys, tbl in self.survey_tbls.items():
+			common = "'%s', %s, IFNULL(%s, ''), ClusterNumber"%(tbl, self.unique_id, self.fin_proj_id)
+			cluster_selects.append("SELECT '%s', '%s', %s, IFNULL(%s, ''), ClusterNumber, latitude, longitude FROM %s"%(tbl, silvsys, self.unique_id, self.fin_proj_id, tbl))
+			for i in range(1, self.num_of_plots + 1):
+				plot_selects.append("SELECT %s, 'P%s', IFNULL(UnoccupiedPlot%s, ''), UnoccupiedreasonPlot%s FROM %s"%(common, i, i, i, tbl))
+				for spc_num in range(1, self.num_of_spc[silvsys] + 1):
+					tree_selects.append("SELECT %s, 'P%s', IFNULL(UnoccupiedPlot%s, ''), %s, IFNULL(Species%sSpeciesNamePlot%s, ''), TRIM(IFNULL(Species%sNumberofTreesPlot%s, '')) FROM %s"%(
+						common, i, i, spc_num, spc_num, i, spc_num, i, tbl))
+		self.cur.execute("INSERT INTO qa_cluster " + " UNION ALL ".join(cluster_selects))
+		self.cur.execute("INSERT INTO qa_plot " + " UNION ALL ".join(plot_selects))
+		self.cur.execute("INSERT INTO qa_tree " + " UNION ALL ".join(tree_selects))
+		self.cur.execute("CREATE INDEX temp.qa_tree_plot ON qa_tree (survey_table, unique_id, plot)")
+
+		# only the distinct species labels go through the species registry (there are only a few dozen labels in the terraflex picklist)
+		spc_names = [row[0] for row in self.cur.execute("SELECT DISTINCT spc_name FROM qa_tree")]
+		spc_rows = []
+		for spc_name in spc_names:
+			spc_code = self.spc_registry.code(spc_name) # eg. 'Bf (fir, balsam)' -> 'BF', '' -> None
+			spc_rows.append([spc_name, spc_code, 1 if spc_code != None and self.spc_registry.is_valid(spc_code) else 0])
+		self.cur.executemany("INSERT INTO qa_spc VALUES (?,?,?)", spc_rows)
+
+
+	def compile_rules(self):
+		"""all the rules in a single INSERT statement. eg. INSERT INTO qa_issues SELECT 'no_project', 'error', * FROM (SELECT ...) UNION ALL SELECT 'unknown_project', ..."""
+		params = {'shp': self.shp_tblname, 'shp_proj_id': self.shp_proj_id, 'lat_min': LAT_MIN, 'lat_max': LAT_MAX, 'lon_min': LON_MIN, 'lon_max': LON_MAX}
+		selects = ["SELECT '%s', '%s', * FROM (%s)"%(rule['rule_id'], rule['level'], rule['sql'].format(**params)) for rule in self.rules]
+		return "INSERT INTO %s (rule_id, level, survey_table, unique_id, proj_id, cluster_number, plot, value) %s"%(self.qa_issues_tblname, " UNION ALL ".join(selects))
+
+
+	def run_rules(self):
+		self.logger.debug("running run_rules method")
+		if len(self.disabled_rules) > 0:
+			self.logger.info("QA rules disabled: %s"%self.disabled_rules)
+		self.cur.execute("DROP TABLE IF EXISTS %s"%self.qa_issues_tblname)
+		self.cur.execute("""CREATE TABLE %s (rule_id TEXT, level TEXT, survey_table TEXT, unique_id INTEGER, proj_id TEXT,
+						cluster_number TEXT, plot TEXT, value TEXT)"""%self.qa_issues_tblname)
+		if len(self.rules) > 0:
+			self.cur.execute(self.compile_rules())
+		self.cur.execute("CREATE INDEX %s_proj_id ON %s (proj_id)"%(self.qa_issues_tblname, self.qa_issues_tblname))
+		self.cur.execute("CREATE INDEX %s_rule_id ON %s (rule_id)"%(self.qa_issues_tblname, self.qa_issues_tblname))
+
+
+	def summarize_rules(self):
+		"""writes the qa_rules table (one row per rule with the number of issues found) and logs the rules with issues"""
+		num_issues = dict(self.cur.execute("SELECT rule_id, COUNT(*) FROM %s GROUP BY rule_id"%self.qa_issues_tblname).fetchall()) # eg. {'invalid_species': 3, ...}
+		self.cur.execute("DROP TABLE IF EXISTS %s"%self.qa_rules_tblname)
+		self.cur.execute("CREATE TABLE %s (rule_id TEXT PRIMARY KEY, level TEXT, description TEXT, num_issues INTEGER)"%self.qa_rules_tblname)
+		params = {'lat_min': LAT_MIN, 'lat_max': LAT_MAX, 'lon_min': LON_MIN, 'lon_max': LON_MAX}
+		self.cur.executemany("INSERT INTO %s VALUES (?,?,?,?)"%self.qa_rules_tblname,
+			[[rule['rule_id'], rule['level'], rule['description'].format(**params), num_issues.get(rule['rule_id'], 0)] for rule in self.rules])
+		self.con.commit()
+
+		for rule in self.rules:
+			if num_issues.get(rule['rule_id'], 0) > 0:
+				self.logger.info("!!!! QA %s - %s: %s issues"%(rule['level'], rule['rule_id'], num_issues[rule['rule_id']]))
+		self.logger.info("%s QA issues found (see %s table)"%(sum(num_issues.values()), self.qa_issues_tblname))
+
+
+	def close_connection(self):
+		self.con.close()
+
+
+	def run_all(self):
+		self.initiate_connection()
+		self.flatten_survey()
+		self.run_rules()
+		self.summarize_rules()
+		self.close_connection()
+
+##############    End of class "QA"   ######################
+
+
+
+
+
+# testing
+if __name__ == '__main__':
+	import os, sys, argparse, log
+	sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+	from modules import species # species.py imports common_functions from the modules package when it's not run on its own
+
+	parser = argparse.ArgumentParser(description='Run the data quality rules on the sqlite database of a previous RAP run.')
+	parser.add_argument('db_filepath', help='sqlite database of a previous RAP run. eg. C:\\TEMP\\RAP2021_output3\\sqlite\\RAP_211121081100.sqlite')
+	parser.add_argument('--cfg', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RAP.cfg'), help='config file')
+	args = parser.parse_args()
+
+	cfg_dict = common_functions.cfg_to_dict(args.cfg)
+	cfg_folder = os.path.dirname(os.path.abspath(args.cfg))
+	spc_registry = species.Species_registry(os.path.join(cfg_folder, cfg_dict['SPC']['csv']),
+		[os.path.join(cfg_folder, f.strip()) for f in cfg_dict['SPC']['extra_csv'].split(',') if f.strip() != ''])
+	logfile = os.path.basename(__file__) + '_deleteMeLater.txt'
+	logger = log.logger(logfile, debug = True)
+	qa = QA(cfg_dict, args.db_filepath, 'Clearcut_Survey_v2021', 'Shelterwood_Survey_v2021', spc_registry, logger)
+	qa.run_all()
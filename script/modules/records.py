@@ -0,0 +1,91 @@
+# compact record types for the summaries built in analysis.py.
+# each cluster summary used to be a dictionary with 30 keys, holding five more dictionaries keyed by plot ('P1'...'P8').
+# every dictionary carries its own hash table, which adds up over a season of clusters. The records here keep their values in __slots__
+# (a fixed array per instance) and the attribute names are stored once per record type.
+# the records are read and written like dictionaries (record['proj_id'], keys(), values(), items()) and repr() gives the same text
+# as the dictionary would, so the tables written to the sqlite database (and everything that reads them back with eval) stay the same.
+
+from keyword import iskeyword
+
+
+
+class Record:
+	__slots__ = ()
+	_fields = () # attribute names in order eg. ('P1', 'P2', ..., 'P8'). set by record_type()
+	_field_set = frozenset()
+
+	def __init__(self, default = ''):
+		for field in self._fields:
+			setattr(self, field, default)
+
+	def __getitem__(self, key):
+		if key not in self._field_set:
+			raise KeyError(key)
+		return getattr(self, key)
+
+	def __setitem__(self, key, value):
+		if key not in self._field_set:
+			raise KeyError("%s is not an attribute of %s"%(key, type(self).__name__))
+		setattr(self, key, value)
+
+	def __contains__(self, key):
+		return key in self._field_set
+
+	def __iter__(self):
+		return iter(self._fields)
+
+	def __len__(self):
+		return len(self._fields)
+
+	def __eq__(self, other):
+		return self.to_dict() == (other.to_dict() if isinstance(other, Record) else other)
+
+	def __repr__(self):
+		return repr(self.to_dict()) # eg. "{'P1': 1, 'P2': 0, ...}" - same as the dictionary
+
+	def get(self, key, default = None):
+		return getattr(self, key) if key in self._field_set else default
+
+	def keys(self):
+		return list(self._fields)
+
+	def values(self):
+		return [getattr(self, field) for field in self._fields]
+
+	def items(self):
+		return [(field, getattr(self, field)) for field in self._fields]
+
+	def copy(self):
+		new = type(self).__new__(type(self))
+		for field in self._fields:
+			setattr(new, field, getattr(self, field))
+		return new
+
+	def to_dict(self):
+		return {field: getattr(self, field) for field in self._fields}
+
+
+
+def record_type(name, fields):
+	"""
+	creates a Record subclass with a slot for each field. fields must be valid python identifiers.
+	eg. Plots = record_type('Plots', ['P1', 'P2', 'P3']) then Plots() is {'P1': '', 'P2': '', 'P3': ''}
+	"""
+	fields = tuple(fields)
+	for field in fields:
+		if not field.isidentifier() or iskeyword(field) or hasattr(Record, field):
+			raise ValueError("%s cannot be an attribute name of %s"%(field, name))
+	return type(name, (Record,), {'__slots__': fields, '_fields': fields, '_field_set': frozenset(fields)})
+
+
+
+
+
+# testing
+if __name__ == '__main__':
+	import sys
+	Plots = record_type('Plots', ['P%s'%(i+1) for i in range(8)])
+	site_occ = Plots(default = 1)
+	site_occ['P3'] = 0
+	print(site_occ) # {'P1': 1, 'P2': 1, 'P3': 0, 'P4': 1, ...}
+	print(sys.getsizeof(site_occ), sys.getsizeof(site_occ.to_dict()))
@@ -0,0 +1,206 @@
+# this module comes after analysis.py module.
+# the purpose of this module is to summarize the projects by MNRF district and by FMU (District_Summary and FMU_Summary tables),
+# so that the managers don't have to put these together from the csv files by hand.
+# the rollups are SQL GROUP BY queries over two typed tables built from Project_Summary:
+#	proj_rollup_basis - one record per project: district, fmu, area, number of clusters, site occupancy and effective density
+#	proj_rollup_spc - one record per project and species (or species group): its percent in the project
+# the means are the ones in Project_Summary (same rounding as the project reports). a project with only one cluster (no stats in Project_Summary)
+# gets the value of that cluster. projects with no spatial_MNRF_district (or spatial_FMU) are rolled up under 'unknown'.
+# site occupancy, effective density and species composition are area-weighted means of the projects.
+# eg. effective density of a district = sum(area_ha * effective density of the project) / sum(area_ha) of the surveyed projects in the district.
+# species composition is weighted by the area of the projects with at least one occupied cluster.
+#
+# every run writes a new sqlite database, so the basis and the rollup tables are re-built from scratch each time (they're small - one record per project).
+# it can also be run on its own against the sqlite database of a previous run.
+# usage: python rollup.py C:\TEMP\RAP2021_output3\sqlite\RAP_211121081100.sqlite
+
+import os, csv, sqlite3
+
+# importing custom modules
+if __name__ == '__main__':
+	import common_functions
+else:
+	from modules import common_functions
+
+
+
+class Rollup:
+	def __init__(self, cfg_dict, db_filepath, logger):
+		self.db_filepath = db_filepath
+		self.logger = logger
+		self.proj_summary_tblname = cfg_dict['SQLITE']['proj_summary_tblname']
+		self.basis_tblname = 'proj_rollup_basis'
+		self.spc_tblname = 'proj_rollup_spc'
+		self.no_level_label = 'unknown' # district (and fmu) of the projects that don't have one
+		self.primary_grouping = os.path.splitext(os.path.basename(cfg_dict['SPC']['csv']))[0] # eg. 'SpeciesGroup'. spcomp column of the summary tables shows this grouping
+		self.csv_folder = os.path.join(cfg_dict['OUTPUT']['outputfolderpath'], 'csv')
+
+		# rollup tables and the attribute of proj_rollup_basis they are grouped by.
+		# the species composition of each goes to <tablename>_spcomp (one record per district (or fmu) and species (or species group)).
+		self.levels = {cfg_dict['SQLITE']['district_summary_tblname']: 'district', # eg. {'District_Summary': 'district', 'FMU_Summary': 'fmu'}
+						cfg_dict['SQLITE']['fmu_summary_tblname']: 'fmu'}
+
+		self.con = None
+		self.cur = None
+
+		self.logger.info("\n")
+		self.logger.info("--> Running rollup module")
+
+
+	def initiate_connection(self):
+		self.con = sqlite3.connect(self.db_filepath)
+		self.cur = self.con.cursor()
+
+
+	def close_connection(self):
+		self.con.commit()
+		self.con.close()
+
+
+	def create_tables(self):
+		"""(re)creates the basis and the rollup tables"""
+		for tblname in [self.basis_tblname, self.spc_tblname] + [t + suffix for t in self.levels.keys() for suffix in ['', '_spcomp']]:
+			self.cur.execute("DROP TABLE IF EXISTS %s"%tblname)
+		self.cur.execute("""CREATE TABLE %s (proj_id TEXT PRIMARY KEY, district TEXT, fmu TEXT, silvsys TEXT, area_ha REAL,
+			num_clusters_total INTEGER, num_clusters_surveyed INTEGER, num_clusters_occupied INTEGER, site_occ REAL, effective_density REAL)"""%self.basis_tblname)
+		self.cur.execute("CREATE TABLE %s (proj_id TEXT, metric TEXT, mean REAL, PRIMARY KEY (proj_id, metric))"%self.spc_tblname)
+		for tblname, level in self.levels.items():
+			self.cur.execute("""CREATE TABLE %s (%s TEXT PRIMARY KEY, num_projects INTEGER, num_projects_surveyed INTEGER,
+				num_clusters_total INTEGER, num_clusters_surveyed INTEGER, num_clusters_occupied INTEGER, area_ha REAL, surveyed_area_ha REAL,
+				site_occ REAL, effective_density REAL, spcomp TEXT)"""%(tblname, level))
+			self.cur.execute("CREATE TABLE %s_spcomp (%s TEXT, metric TEXT, perc REAL, num_projects INTEGER, PRIMARY KEY (%s, metric))"%(tblname, level, level))
+
+
+	def proj_mean(self, stats, data):
+		"""
+		the mean of a project's stats in Project_Summary. eg. {'mean': 1979.1667, 'stdv': 1271.9428,...} -> 1979.1667
+		the stats are empty when there's only one cluster (data eg. {'109': 1225}). its value is the mean then (rounded like mymath.mean_std_ci).
+		None if there's no cluster.
+		"""
+		if 'mean' in stats:
+			return stats['mean']
+		if len(data) == 1:
+			return round(float(list(data.values())[0]), 4)
+		return None
+
+
+	def build_basis(self):
+		"""
+		writes proj_rollup_basis and proj_rollup_spc from Project_Summary.
+		the species metrics are named as in accumulator.py. eg. 'spc:BF', 'spc_grp:SpeciesGroup:SX'
+		"""
+		basis_rows, spc_rows = [], []
+		no_level = {level: 0 for level in self.levels.values()} # number of projects without a district (fmu)
+		for proj in common_functions.sqlite_2_dict(self.db_filepath, self.proj_summary_tblname):
+			levels = {}
+			for level, attr in [['district', 'spatial_MNRF_district'], ['fmu', 'spatial_FMU']]:
+				levels[level] = proj[attr] if proj[attr] not in [None, '', 'None'] else self.no_level_label
+				if levels[level] == self.no_level_label:
+					no_level[level] += 1
+			basis_rows.append([proj['proj_id'], levels['district'], levels['fmu'], proj['silvsys'], self.number(proj['area_ha'], float),
+				self.number(proj['num_clusters_total'], int), self.number(proj['num_clusters_surveyed'], int), self.number(proj['num_clusters_occupied'], int),
+				self.proj_mean(eval(proj['site_occupancy']), eval(proj['site_occupancy_data'])),
+				self.proj_mean(eval(proj['effective_density']), eval(proj['effective_density_data']))])
+
+			spc_data = eval(proj['species_data_percent']) # eg. {'SW': {'189': 70.0, '183': 85.7}, 'BF': {'189': 0, '183': 7.1},...}
+			for spc, stats in eval(proj['spcomp']).items():
+				spc_rows.append([proj['proj_id'], 'spc:' + spc, self.proj_mean(stats, spc_data[spc])])
+			grp_data = eval(proj['species_grp_data_by_grouping']) # eg. {'SpeciesGroup': {'SX': {'189': 70.0, '183': 85.7}...}, 'SpeciesGroup_short': {...}}
+			for grouping, grp_stats in eval(proj['spcomp_by_grouping']).items():
+				for grp, stats in grp_stats.items():
+					spc_rows.append([proj['proj_id'], 'spc_grp:%s:%s'%(grouping, grp), self.proj_mean(stats, grp_data[grouping][grp])])
+
+		self.cur.executemany("INSERT INTO %s VALUES (?,?,?,?,?,?,?,?,?,?)"%self.basis_tblname, basis_rows)
+		self.cur.executemany("INSERT INTO %s VALUES (?,?,?)"%self.spc_tblname, [row for row in spc_rows if row[2] != None])
+		for level in self.levels.values():
+			self.cur.execute("CREATE INDEX idx_%s_%s ON %s (%s)"%(self.basis_tblname, level, self.basis_tblname, level))
+			if no_level[level] > 0:
+				self.logger.info("%s projects have no %s. They are rolled up under '%s'"%(no_level[level], level, self.no_level_label))
+		self.logger.info("%s projects written to %s"%(len(basis_rows), self.basis_tblname))
+
+
+	def number(self, value, cast):
+		"""the text value of Project_Summary as a number (cast = int or float). None if it's not a number. eg. '10.5' -> 10.5"""
+		try:
+			return cast(value)
+		except (TypeError, ValueError):
+			return None
+
+
+	def calc_rollups(self):
+		"""calculates each district (and fmu) from the basis"""
+		for tblname, level in self.levels.items():
+			self.cur.execute("""INSERT INTO %s
+				SELECT %s, COUNT(*), SUM(num_clusters_surveyed > 0), SUM(num_clusters_total), SUM(num_clusters_surveyed), SUM(num_clusters_occupied),
+					ROUND(TOTAL(area_ha), 1), ROUND(TOTAL(CASE WHEN effective_density IS NOT NULL THEN area_ha END), 1),
+					ROUND(SUM(area_ha * site_occ) / SUM(CASE WHEN site_occ IS NOT NULL THEN area_ha END), 4),
+					ROUND(SUM(area_ha * effective_density) / SUM(CASE WHEN effective_density IS NOT NULL THEN area_ha END), 1),
+					NULL
+				FROM %s GROUP BY %s"""%(tblname, level, self.basis_tblname, level))
+
+			# species (group) percent. a species not found in an occupied project counts as 0% of that project's area.
+			self.cur.execute("""INSERT INTO %s_spcomp
+				SELECT b.%s, a.metric, ROUND(SUM(b.area_ha * a.mean) / t.occupied_area_ha, 1), COUNT(*)
+				FROM %s a
+				JOIN %s b ON b.proj_id = a.proj_id
+				JOIN (SELECT %s, SUM(area_ha) AS occupied_area_ha FROM %s WHERE num_clusters_occupied > 0 GROUP BY %s) t ON t.%s = b.%s
+				GROUP BY b.%s, a.metric"""%(tblname, level, self.spc_tblname, self.basis_tblname, level, self.basis_tblname, level, level, level, level))
+
+			# spcomp column eg. 'SX 45.2, BF 20.1, PO 12.0'
+			prefix = 'spc_grp:%s:'%self.primary_grouping
+			spcomp = {} # eg. {'D1': ['SX 45.2', 'BF 20.1',...]}
+			for key, metric, perc in self.cur.execute("""SELECT %s, metric, perc FROM %s_spcomp WHERE substr(metric, 1, ?) = ?
+					ORDER BY perc DESC, metric"""%(level, tblname), (len(prefix), prefix)).fetchall():
+				spcomp.setdefault(key, []).append('%s %s'%(metric[len(prefix):], perc))
+			self.cur.executemany("UPDATE %s SET spcomp = ? WHERE %s = ?"%(tblname, level), [[', '.join(v), k] for k, v in spcomp.items()])
+
+			num_rec = self.cur.execute("SELECT COUNT(*) FROM %s"%tblname).fetchone()[0]
+			self.logger.info("%s: %s records calculated"%(tblname, num_rec))
+
+
+	def write_csv(self):
+		"""writes each rollup table to the csv folder. eg. csv\\_District_Summary.csv"""
+		if not os.path.isdir(self.csv_folder):
+			os.makedirs(self.csv_folder)
+		for tblname, level in self.levels.items():
+			output_csv = os.path.join(self.csv_folder, '_' + tblname + '.csv')
+			self.cur.execute("SELECT * FROM %s ORDER BY %s"%(tblname, level))
+			try:
+				with open(output_csv, 'w') as f:
+					writer = csv.writer(f, lineterminator='\n')
+					writer.writerow([d[0] for d in self.cur.description])
+					writer.writerows(self.cur.fetchall())
+				self.logger.info("%s has been written to %s"%(tblname, output_csv))
+			except PermissionError:
+				self.logger.info("!!!!! Error - could not create %s. Check if the file is being used."%output_csv)
+
+
+	def run_all(self):
+		self.initiate_connection()
+		self.create_tables()
+		self.build_basis()
+		self.calc_rollups()
+		self.con.commit()
+		self.write_csv()
+		self.close_connection()
+
+
+
+
+
+# testing
+if __name__ == '__main__':
+	import argparse, log
+
+	parser = argparse.ArgumentParser(description='Re-build the District and FMU rollup tables of the sqlite database of a previous RAP run.')
+	parser.add_argument('db_filepath', help='sqlite database of a previous RAP run. eg. C:\\TEMP\\RAP2021_output3\\sqlite\\RAP_211121081100.sqlite')
+	parser.add_argument('--cfg', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RAP.cfg'), help='config file')
+	args = parser.parse_args()
+
+	cfg_dict = common_functions.cfg_to_dict(args.cfg)
+	# the csv files go next to the sqlite database's folder (eg. RAP2021_output3\csv\_District_Summary.csv)
+	cfg_dict['OUTPUT']['outputfolderpath'] = os.path.dirname(os.path.dirname(os.path.abspath(args.db_filepath)))
+	logfile = os.path.basename(__file__) + '_deleteMeLater.txt'
+	logger = log.logger(logfile, debug = True)
+	ru = Rollup(cfg_dict, args.db_filepath, logger)
+	ru.run_all()
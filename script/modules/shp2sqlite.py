@@ -132,7 +132,7 @@ class Shp2sqlite:
 		in read_shpfile module above.
 		"""
 		self.logger.debug('Running shp2sqlite.to_sqlite()')
-		common_functions.dict_lst_to_sqlite(self.shp_in_dict, self.db_filepath, self.new_tablename, self.logger)
+		common_functions.dict_lst_to_sqlite(self.shp_in_dict, self.db_filepath, self.new_tablename, self.logger, indexes=[self.prjID_field.upper()])
 
 
 	def update_tablename_dict(self):
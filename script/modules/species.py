@@ -0,0 +1,94 @@
+# species registry built once from SpeciesGroup.csv and shared by the modules that deal with species.
+# summarize_clusters in analysis.py goes through up to 6 species slots x 8 plots for every cluster,
+# so turning the terraflex picklist label (eg. 'Bf (fir, balsam)') into a species code (eg. 'BF') and finding its group (eg. 'BF')
+# should be a dictionary lookup rather than string slicing and list scanning every time.
+# extra species group csv files (eg. SpeciesGroup_short.csv) can be added, so that the species composition is grouped several ways in one run.
+
+import os
+
+# importing custom modules
+if __name__ == '__main__':
+	import common_functions
+else:
+	from modules import common_functions
+
+
+
+class Species_registry:
+	def __init__(self, spc_group_csv_file, extra_spc_group_csv_files = []):
+		self.spc_group_csv_file = spc_group_csv_file
+
+		# grabbing (and checking) spcies group from SpeciesGroup.csv
+		self.spc_to_check, self.spc_group_dict = common_functions.open_spc_group_csv(spc_group_csv_file)
+		# spc_to_check eg. ['BF', 'BW', 'CE', 'LA', 'PO', 'PT', 'SB', 'SW']
+		# spc_group_dict eg. {'BF': ['BF'], 'BW': ['BW'], 'CE': ['CE'], 'LA': ['LA'], 'PO': ['PO'], 'PT': ['PT'], 'SX': ['SB', 'SW']}
+
+		self.valid_codes = set(self.spc_to_check) # eg. {'BF', 'BW', 'CE',...}
+		self.spc_2_grp = {spc: grp for grp, spcs_lst in self.spc_group_dict.items() for spc in spcs_lst} # eg. {'BF': 'BF', 'SB': 'SX', 'SW': 'SX',...}
+		self.label_2_code = {} # filled as we go. eg. {'Bf (fir, balsam)': 'BF', 'Sw (spruce, white)': 'SW', '': None}
+
+		# groupings - the species group csv above plus any extra species group csv files, so the species composition can be grouped in more than one way.
+		# the grouping key is the csv file name. eg. {'SpeciesGroup': {'BF': ['BF'], 'SX': ['SB', 'SW'],...}, 'SpeciesGroup_short': {...}}
+		# the list of valid species still comes from the first csv. species in an extra csv that are not in the first csv will never be counted.
+		self.primary_grouping = self.grouping_key(spc_group_csv_file) # eg. 'SpeciesGroup'
+		self.groupings = {self.primary_grouping: self.spc_group_dict}
+		for csv_file in extra_spc_group_csv_files:
+			key = self.grouping_key(csv_file)
+			if key in self.groupings:
+				raise Exception('Error in species group csv files. More than one csv file named "%s".'%key)
+			self.groupings[key] = common_functions.open_spc_group_csv(csv_file)[1]
+
+		# species code to the group of each grouping it belongs to. eg. {'SB': [('SpeciesGroup', 'SX'), ('SpeciesGroup_short', 'SX')], 'AB': [('SpeciesGroup', 'AX')],...}
+		self.spc_2_grps = {spc: [] for spc in self.spc_to_check}
+		for key, grp_2_spc_dict in self.groupings.items():
+			for grp, spcs_lst in grp_2_spc_dict.items():
+				for spc in spcs_lst:
+					if spc in self.spc_2_grps:
+						self.spc_2_grps[spc].append((key, grp))
+
+
+	def grouping_key(self, spc_group_csv_file):
+		"""eg. 'C:\\RAP\\SpeciesGroup_short.csv' -> 'SpeciesGroup_short'"""
+		return os.path.splitext(os.path.basename(spc_group_csv_file))[0]
+
+
+	def code(self, label):
+		"""turns the species label into a species code. eg. 'Bf (fir, balsam)' -> 'BF', 'Cat (catalpa)' -> 'CAT', '' -> None
+		the result is memoized since there are only a few dozen labels in the terraflex picklist."""
+		try:
+			return self.label_2_code[label]
+		except KeyError:
+			if len(label) >= 2:
+				spc_code = (label + ' ')[:3].strip().upper() # some species codes are 3 letters, so the extra space is necessary
+			else:
+				spc_code = None
+			self.label_2_code[label] = spc_code
+			return spc_code
+
+
+	def is_valid(self, spc_code):
+		"""True if the species code is in the first column of SpeciesGroup.csv"""
+		return spc_code in self.valid_codes
+
+
+	def group(self, spc_code):
+		"""the species group of the species code. eg. 'SB' -> 'SX'. None if the species is not in SpeciesGroup.csv"""
+		return self.spc_2_grp.get(spc_code)
+
+
+	def groups(self, spc_code):
+		"""the species group of the species code in each grouping. eg. 'SB' -> [('SpeciesGroup', 'SX'), ('SpeciesGroup_short', 'SX')]"""
+		return self.spc_2_grps.get(spc_code, [])
+
+
+
+
+
+# testing
+if __name__ == '__main__':
+	script_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..') # SpeciesGroup.csv and SpeciesGroup_short.csv are in the script folder
+	spc_registry = Species_registry(os.path.join(script_folder, 'SpeciesGroup.csv'), [os.path.join(script_folder, 'SpeciesGroup_short.csv')])
+	for label in ['Bf (fir, balsam)', 'Sb (spruce, black)', 'Cat (catalpa)', 'Xy', '-']:
+		spc_code = spc_registry.code(label)
+		print(label, spc_code, spc_registry.is_valid(spc_code), spc_registry.group(spc_code), spc_registry.groups(spc_code))
+	print(spc_registry.label_2_code)
@@ -0,0 +1,154 @@
+# the site occupancy, number of trees and effective density of each cluster, calculated by the sqlite database instead of python loops.
+# this module comes after analysis.py has written the Cluster_Summary table (it runs as part of analysis.py when [CALC] sql_metrics = True).
+# the metrics are calculated from plot_obs and tree_tally - the survey tables unpivoted by unpivot.py right after csv2sqlite.py - through this temporary view:
+#	sm_tally - one row per species entry of each plot with its size class (8 or 16 m2) and the number of trees as an integer.
+#			   only the valid species of the plots not marked unoccupied are in this view.
+# the metrics are then aggregate queries over sm_tally - the same rules as summarize_cluster of analysis.py:
+#	total_num_trees = number of trees of valid species in the plots not marked unoccupied
+#	site_occ = plots not marked unoccupied and with at least one tree, divided by num_of_plots
+#	effective_density = tree_count_8m2*10000/(8*8) + tree_count_16m2*10000/(16*8) where each tree count is capped at max_num_of_t_per_sqm
+# before the values are written to Cluster_Summary, they are checked against the values calculated in python. any difference is logged,
+# and Cluster_Summary is only updated when there is none (Project_Summary has already been calculated from the python values).
+
+import sqlite3
+
+# importing custom modules
+if __name__ == '__main__':
+	import common_functions
+else:
+	from modules import common_functions
+
+
+
+class Sql_metrics:
+	def __init__(self, cfg_dict, db_filepath, clus_summary_attr, logger):
+		self.db_filepath = db_filepath
+		self.logger = logger
+		self.num_of_plots = int(cfg_dict['CALC']['num_of_plots'])
+		self.max_num_of_t_per_sqm = float(cfg_dict['CALC']['max_num_of_t_per_sqm']) # 0.5
+		self.plot_obs_tblname = cfg_dict['SQLITE']['plot_obs_tblname']
+		self.tree_tally_tblname = cfg_dict['SQLITE']['tree_tally_tblname']
+		self.clus_summary_tblname = cfg_dict['SQLITE']['clus_summary_tblname']
+		self.clus_summary_attr = clus_summary_attr # eg. {'c_clus_uid': 'cluster_uid', 'c_silvsys': 'silvsys', 'c_num_trees': 'total_num_trees',...}
+		self.metrics = ['c_num_trees', 'c_site_occ', 'c_eff_dens'] # the cluster summary attributes calculated here
+
+		self.logger.info("\n")
+		self.logger.info("--> Running sql_metrics module")
+
+
+	def initiate_connection(self):
+		self.con = sqlite3.connect(self.db_filepath)
+		self.cur = self.con.cursor()
+		# the same text dict_lst_to_sqlite writes to Cluster_Summary (str(value)). eg. 0.8333333333333334 rather than sqlite's 0.833333333333333
+		self.con.create_function('py_str', 1, str, deterministic = True)
+
+
+	def create_tally_view(self):
+		"""creates the temporary sm_tally view (see the top of this script) on plot_obs and tree_tally"""
+		self.logger.debug("running create_tally_view method")
+		self.cur.execute("""CREATE TEMP VIEW sm_tally AS
+						SELECT t.silvsys, t.survey_uid, t.plot, t.size_class, CAST(t.count AS INTEGER) AS num_trees
+						FROM %s t JOIN %s p ON p.silvsys = t.silvsys AND p.survey_uid = t.survey_uid AND p.plot = t.plot
+						WHERE t.is_valid = 1 AND IFNULL(p.unoccupied, '') != 'Yes' AND t.count IS NOT NULL AND t.count != 0"""%(
+						self.tree_tally_tblname, self.plot_obs_tblname))
+
+
+	def calc_metrics(self):
+		"""the metrics of each cluster into the temporary sm_cluster table (silvsys, survey_uid, total_num_trees, site_occ, effective_density)"""
+		self.logger.debug("running calc_metrics method")
+		tree_count_max_8m2 = 8*8*self.max_num_of_t_per_sqm # eg. 32.0 for CC
+		tree_count_max_16m2 = 16*8*self.max_num_of_t_per_sqm
+		self.cur.execute("""CREATE TEMP TABLE sm_cluster AS
+						SELECT p.silvsys, p.survey_uid,
+							SUM(IFNULL(t.num_trees, 0)) AS total_num_trees,
+							SUM(IFNULL(p.unoccupied, '') != 'Yes' AND IFNULL(t.num_trees, 0) != 0) * 1.0 / %s AS site_occ,
+							MIN(SUM(IFNULL(t.trees_8m2, 0)), %s) * 10000.0 / (8*8) + MIN(SUM(IFNULL(t.trees_16m2, 0)), %s) * 10000.0 / (16*8) AS effective_density
+						FROM %s p LEFT JOIN (SELECT silvsys, survey_uid, plot, SUM(num_trees) AS num_trees,
+								SUM(CASE WHEN size_class = 8 THEN num_trees ELSE 0 END) AS trees_8m2,
+								SUM(CASE WHEN size_class = 16 THEN num_trees ELSE 0 END) AS trees_16m2
+							FROM sm_tally GROUP BY silvsys, survey_uid, plot) t
+						ON t.silvsys = p.silvsys AND t.survey_uid = p.survey_uid AND t.plot = p.plot
+						WHERE p.plot <= %s
+						GROUP BY p.silvsys, p.survey_uid"""%(self.num_of_plots, tree_count_max_8m2, tree_count_max_16m2, self.plot_obs_tblname, self.num_of_plots))
+		self.cur.execute("CREATE INDEX temp.sm_cluster_uid ON sm_cluster (silvsys, survey_uid)")
+
+
+	def check_against_cluster_summary(self):
+		"""
+		compares the metrics with the values analysis.py calculated in python (the values in Cluster_Summary now).
+		returns a list of the differences eg. [['CC', '398', 'site_occ', '0.75', 0.875]]. An empty list means the results are exactly the same.
+		"""
+		self.logger.debug("running check_against_cluster_summary method")
+		clus_uid = self.clus_summary_attr['c_clus_uid']
+		silvsys = self.clus_summary_attr['c_silvsys']
+		differences = []
+		for metric in self.metrics:
+			attr = self.clus_summary_attr[metric] # eg. 'site_occ'
+			sql_type = 'INTEGER' if metric == 'c_num_trees' else 'REAL'
+			rows = self.cur.execute("""SELECT c.%s, c.%s, '%s', c.%s, m.%s FROM %s c LEFT JOIN sm_cluster m ON m.silvsys = c.%s AND CAST(m.survey_uid AS TEXT) = c.%s
+								WHERE m.%s IS NULL OR CAST(c.%s AS %s) != m.%s"""%(silvsys, clus_uid, attr, attr, attr, self.clus_summary_tblname, silvsys, clus_uid,
+								attr, attr, sql_type, attr)).fetchall()
+			differences += [list(row) for row in rows]
+
+		num_clus = self.cur.execute("SELECT COUNT(*) FROM %s"%self.clus_summary_tblname).fetchone()[0]
+		for diff in differences:
+			self.logger.info("!!!! sql_metrics - %s cluster_uid %s: %s is %s in python and %s in sql"%tuple(diff))
+		self.logger.info("%s clusters checked. %s values are different from the python results"%(num_clus, len(differences)))
+		return differences
+
+
+	def update_cluster_summary(self):
+		"""writes the metrics to Cluster_Summary (as text, like the rest of the table)"""
+		self.logger.debug("running update_cluster_summary method")
+		clus_uid = self.clus_summary_attr['c_clus_uid']
+		silvsys = self.clus_summary_attr['c_silvsys']
+		match_sql = "FROM sm_cluster m WHERE m.silvsys = %s.%s AND CAST(m.survey_uid AS TEXT) = %s.%s"%(self.clus_summary_tblname, silvsys, self.clus_summary_tblname, clus_uid)
+		set_sql = ', '.join(["%s = (SELECT py_str(m.%s) %s)"%(self.clus_summary_attr[metric], self.clus_summary_attr[metric], match_sql) for metric in self.metrics])
+		self.cur.execute("UPDATE %s SET %s WHERE EXISTS (SELECT 1 %s)"%(self.clus_summary_tblname, set_sql, match_sql))
+		self.logger.info("%s clusters of %s updated with the sql results"%(self.cur.rowcount, self.clus_summary_tblname))
+		self.con.commit()
+
+
+	def close_connection(self):
+		self.con.close()
+
+
+	def run_all(self):
+		self.initiate_connection()
+		self.create_tally_view()
+		self.calc_metrics()
+		differences = self.check_against_cluster_summary()
+		if len(differences) == 0:
+			self.update_cluster_summary()
+		else:
+			self.logger.info("!!!! sql_metrics - %s values differ from the python results. %s is not updated (it keeps the python values)."%(len(differences),
+							self.clus_summary_tblname))
+		self.close_connection()
+
+##############    End of class "Sql_metrics"   ######################
+
+
+
+
+
+# testing
+# checks the sql results against the Cluster_Summary of a previous RAP run. Cluster_Summary is not updated.
+if __name__ == '__main__':
+	import os, argparse, log
+
+	parser = argparse.ArgumentParser(description='Check the sql site occupancy, number of trees and effective density against the Cluster_Summary of a previous RAP run.')
+	parser.add_argument('db_filepath', help='sqlite database of a previous RAP run. eg. C:\\TEMP\\RAP2021_output3\\sqlite\\RAP_211121081100.sqlite')
+	parser.add_argument('--cfg', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RAP.cfg'), help='config file')
+	args = parser.parse_args()
+
+	cfg_dict = common_functions.cfg_to_dict(args.cfg)
+	clus_summary_attr = {'c_clus_uid': 'cluster_uid', 'c_silvsys': 'silvsys', 'c_num_trees': 'total_num_trees', 'c_site_occ': 'site_occ', 'c_eff_dens': 'effective_density'}
+	logfile = os.path.basename(__file__) + '_deleteMeLater.txt'
+	logger = log.logger(logfile, debug = True)
+	sm = Sql_metrics(cfg_dict, args.db_filepath, clus_summary_attr, logger)
+	sm.initiate_connection()
+	sm.create_tally_view()
+	sm.calc_metrics()
+	differences = sm.check_against_cluster_summary()
+	sm.close_connection()
+	print('OK - the sql results are the same as the python results' if len(differences) == 0 else 'FAILED - %s differences'%len(differences))
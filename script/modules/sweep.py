@@ -0,0 +1,216 @@
+# this module comes after analysis.py module.
+# the purpose of this module is to see how the effective density and site occupancy would change under different [CALC] settings
+# (max_num_of_t_per_sqm and num_of_plots) without re-running the whole RAP for each value.
+# the plot level tallies (Plot_Summary and plot_tally tables) are loaded once into numpy arrays,
+# and the cluster effective density, cluster site occupancy and the project mean, stdv and ci are calculated for every combination of the values at once.
+# the result is a compact comparison table (one row per project per combination) written to the sqlite database and to a csv file.
+# the calculation follows summarize_clusters and summarize_projects methods of analysis.py.
+#
+# it can also be run on its own against the sqlite database of a previous run.
+# usage: python sweep.py C:\TEMP\RAP2021_output3\sqlite\RAP_211121081100.sqlite --max_num_of_t_per_sqm 0.25,0.5,1 --num_of_plots 6,7,8
+
+import os, csv, sqlite3
+import numpy as np
+import scipy.stats
+
+# importing custom modules
+if __name__ == '__main__':
+	import common_functions
+else:
+	from modules import common_functions
+
+
+
+class Sweep:
+	def __init__(self, cfg_dict, db_filepath, logger, max_num_of_t_per_sqm_lst = None, num_of_plots_lst = None):
+		self.db_filepath = db_filepath
+		self.logger = logger
+		self.plot_summary_tblname = cfg_dict['SQLITE']['plot_summary_tblname']
+		self.plot_tally_tblname = cfg_dict['SQLITE']['plot_tally_tblname']
+		self.sweep_tblname = cfg_dict['SWEEP']['sweep_tblname']
+		self.output_csv = os.path.join(cfg_dict['OUTPUT']['outputfolderpath'], 'csv', '_' + self.sweep_tblname + '.csv')
+		self.confidence = 0.95
+
+		# the values to be compared. eg. [0.25, 0.5, 1.0] and [6, 7, 8]
+		if max_num_of_t_per_sqm_lst == None:
+			max_num_of_t_per_sqm_lst = [float(i) for i in cfg_dict['SWEEP']['max_num_of_t_per_sqm'].split(',')]
+		if num_of_plots_lst == None:
+			num_of_plots_lst = [int(i) for i in cfg_dict['SWEEP']['num_of_plots'].split(',')]
+		self.max_num_of_t_per_sqm_lst = sorted(set(max_num_of_t_per_sqm_lst))
+		self.num_of_plots_lst = sorted(set(num_of_plots_lst))
+		# the values in the config file (to mark the rows that match the current analysis)
+		self.current_max_num_of_t_per_sqm = float(cfg_dict['CALC']['max_num_of_t_per_sqm'])
+		self.current_num_of_plots = int(cfg_dict['CALC']['num_of_plots'])
+
+		# numpy arrays to be assigned in load_tallies method. C = number of clusters, P = number of plots per cluster
+		self.proj_ids = [] # project id of each cluster (sorted by project). eg. ['P-1', 'P-1', 'P-2',...]
+		self.occupied = None # (C, P) 1 if the plot is occupied
+		self.trees_8m2 = None # (C, P) number of trees in the 8m2 plot
+		self.trees_16m2 = None # (C, P) number of trees in the 16m2 plot (shelterwood only)
+
+		self.sweep_dict_lst = [] # the comparison table. one dictionary per project per combination
+
+		self.logger.info("\n")
+		self.logger.info("--> Running sweep module")
+		self.logger.info("max_num_of_t_per_sqm values: %s"%self.max_num_of_t_per_sqm_lst)
+		self.logger.info("num_of_plots values: %s"%self.num_of_plots_lst)
+
+
+	def load_tallies(self):
+		"""loads Plot_Summary and plot_tally tables into numpy arrays. returns False if there's nothing to load."""
+		con = sqlite3.connect(self.db_filepath)
+		cur = con.cursor()
+		plots = cur.execute("""SELECT proj_id, cluster_num, silvsys, cluster_uid, plot_num, site_occupied FROM %s
+			ORDER BY proj_id, silvsys, cluster_uid, plot_num"""%self.plot_summary_tblname).fetchall()
+		if len(plots) == 0:
+			con.close()
+			self.logger.info("!!!! %s table is empty. Nothing to sweep."%self.plot_summary_tblname)
+			return False
+
+		# summarize_projects keeps the cluster data of a project by cluster number, so a duplicate cluster number counts only once (the last one).
+		# the same is done here so that the results match the Project_Summary table. eg. {('P-1', '101'): ('SH', 12),...}
+		last_clus = {(row[0], row[1]): (row[2], row[3]) for row in plots}
+		plots = [row for row in plots if last_clus[(row[0], row[1])] == (row[2], row[3])]
+
+		# cluster index. eg. {('CC', 1): 0, ('CC', 2): 1,...}
+		clus_index = {}
+		for proj_id, cluster_num, silvsys, cluster_uid, plot_num, site_occupied in plots:
+			if (silvsys, cluster_uid) not in clus_index:
+				clus_index[(silvsys, cluster_uid)] = len(clus_index)
+				self.proj_ids.append(proj_id if proj_id != None else '')
+		num_of_plots = max([row[4] for row in plots])
+
+		self.occupied = np.zeros((len(clus_index), num_of_plots))
+		self.trees_8m2 = np.zeros((len(clus_index), num_of_plots))
+		self.trees_16m2 = np.zeros((len(clus_index), num_of_plots))
+		for proj_id, cluster_num, silvsys, cluster_uid, plot_num, site_occupied in plots:
+			self.occupied[clus_index[(silvsys, cluster_uid)], plot_num - 1] = site_occupied
+
+		tally = cur.execute("""SELECT silvsys, cluster_uid, plot_num, size_class, SUM(count) FROM %s
+			GROUP BY silvsys, cluster_uid, plot_num, size_class"""%self.plot_tally_tblname).fetchall()
+		for silvsys, cluster_uid, plot_num, size_class, count in tally:
+			if (silvsys, cluster_uid) not in clus_index:
+				continue # duplicate cluster number
+			trees = self.trees_8m2 if size_class == 8 else self.trees_16m2
+			trees[clus_index[(silvsys, cluster_uid)], plot_num - 1] = count
+		con.close()
+
+		self.logger.info("Loaded %s plots of %s clusters"%(len(plots), len(clus_index)))
+
+		# we can't sweep more plots than the survey has
+		too_many = [n for n in self.num_of_plots_lst if n < 1 or n > num_of_plots]
+		if len(too_many) > 0:
+			self.logger.info("!!!! num_of_plots values %s are out of range (1 ~ %s) and will be skipped."%(too_many, num_of_plots))
+			self.num_of_plots_lst = [n for n in self.num_of_plots_lst if n not in too_many]
+		return len(self.num_of_plots_lst) > 0
+
+
+	def calculate(self):
+		"""
+		cluster effective density and site occupancy for every combination of max_num_of_t_per_sqm (M) and num_of_plots (N) values,
+		then the mean, stdv, ci of each project.
+		"""
+		max_t = np.array(self.max_num_of_t_per_sqm_lst) # (M,)
+		n_plots = np.array(self.num_of_plots_lst) # (N,)
+
+		# running totals over the plots. only the first n plots are used when num_of_plots = n
+		occupied_cum = np.cumsum(self.occupied, axis=1)[:, n_plots - 1].T # (N, C)
+		trees_8m2_cum = np.cumsum(self.trees_8m2, axis=1)[:, n_plots - 1].T
+		trees_16m2_cum = np.cumsum(self.trees_16m2, axis=1)[:, n_plots - 1].T
+
+		# site occupancy (N, C) -> (M, N, C). max_num_of_t_per_sqm doesn't change the site occupancy
+		site_occ = occupied_cum / n_plots[:, None]
+		site_occ = np.broadcast_to(site_occ, (len(max_t), len(n_plots), site_occ.shape[1]))
+
+		# effective density (M, N, C). same as summarize_clusters: the tree count is capped at 8plots x 8m2 (or 16m2) x max_num_of_t_per_sqm
+		cap_8m2 = (8*8*max_t)[:, None, None]
+		cap_16m2 = (16*8*max_t)[:, None, None]
+		eff_dens = np.minimum(trees_8m2_cum[None, :, :], cap_8m2)*10000/(8*8) + np.minimum(trees_16m2_cum[None, :, :], cap_16m2)*10000/(16*8)
+
+		# project statistics. the clusters are sorted by project, so each project is a slice
+		proj_lst, proj_start, proj_n = np.unique(np.array(self.proj_ids), return_index=True, return_counts=True)
+		ed_stats = self.proj_stats(eff_dens, proj_start, proj_n)
+		so_stats = self.proj_stats(site_occ, proj_start, proj_n)
+
+		# the comparison table
+		for m_index, max_num_of_t_per_sqm in enumerate(self.max_num_of_t_per_sqm_lst):
+			for n_index, num_of_plots in enumerate(self.num_of_plots_lst):
+				current = max_num_of_t_per_sqm == self.current_max_num_of_t_per_sqm and num_of_plots == self.current_num_of_plots
+				for p_index, proj_id in enumerate(proj_lst):
+					record = {'proj_id': str(proj_id), 'max_num_of_t_per_sqm': max_num_of_t_per_sqm, 'num_of_plots': num_of_plots,
+						'current_setting': current, 'n': int(proj_n[p_index])}
+					for prefix, stats in [['ed_', ed_stats], ['so_', so_stats]]:
+						for stat, values in stats.items():
+							value = values[m_index, n_index, p_index]
+							record[prefix + stat] = '' if np.isnan(value) else float(value) # blank if n < 2 (same as mymath.mean_std_ci)
+					self.sweep_dict_lst.append(record)
+
+
+	def proj_stats(self, data, proj_start, proj_n):
+		"""
+		same as mymath.mean_std_ci, but for all the projects and all the combinations at once.
+		data is (M, N, C) with the clusters sorted by project. returns {'mean': (M, N, number of projects), 'stdv': ..., 'ci': ..., 'upper_ci': ..., 'lower_ci': ...}
+		"""
+		with np.errstate(divide='ignore', invalid='ignore'):
+			mean = np.add.reduceat(data, proj_start, axis=2) / proj_n
+			sq_dev = np.add.reduceat((data - np.repeat(mean, proj_n, axis=2))**2, proj_start, axis=2)
+			stdv = np.sqrt(sq_dev / (proj_n - 1))
+			ci = stdv / np.sqrt(proj_n) * scipy.stats.t.ppf((1 + self.confidence) / 2., proj_n - 1)
+		ci = np.round(ci, 4)
+		stats = {'mean': np.round(mean, 4), 'stdv': np.round(stdv, 4), 'ci': ci, 'upper_ci': np.round(mean + ci, 4), 'lower_ci': np.round(mean - ci, 4)}
+		# mean_std_ci gives nothing if n < 2
+		for stat in stats.values():
+			stat[:, :, proj_n < 2] = np.nan
+		return stats
+
+
+	def write_table(self):
+		"""writes the comparison table to the sqlite database and to a csv file"""
+		if len(self.sweep_dict_lst) == 0:
+			return
+		common_functions.dict_lst_to_sqlite(self.sweep_dict_lst, self.db_filepath, self.sweep_tblname, self.logger, indexes=['proj_id'])
+
+		if not os.path.isdir(os.path.dirname(self.output_csv)):
+			os.makedirs(os.path.dirname(self.output_csv))
+		try:
+			with open(self.output_csv, 'w') as f:
+				writer = csv.DictWriter(f, fieldnames=self.sweep_dict_lst[0].keys(), lineterminator='\n')
+				writer.writeheader()
+				writer.writerows(self.sweep_dict_lst)
+			self.logger.info("Sweep results have been written to %s"%self.output_csv)
+		except PermissionError:
+			self.logger.info("!!!!! Error - could not create %s. Check if the file is being used."%self.output_csv)
+
+
+	def run_all(self):
+		if not self.load_tallies():
+			return
+		self.calculate()
+		self.write_table()
+
+
+
+
+
+# testing
+if __name__ == '__main__':
+	import argparse, log
+
+	parser = argparse.ArgumentParser(description='Compare effective density and site occupancy under different [CALC] settings using the sqlite database of a previous RAP run.')
+	parser.add_argument('db_filepath', help='sqlite database of a previous RAP run. eg. C:\\TEMP\\RAP2021_output3\\sqlite\\RAP_211121081100.sqlite')
+	parser.add_argument('--max_num_of_t_per_sqm', help='comma separated values. eg. 0.25,0.5,1 (default: [SWEEP] in RAP.cfg)')
+	parser.add_argument('--num_of_plots', help='comma separated values. eg. 6,7,8 (default: [SWEEP] in RAP.cfg)')
+	parser.add_argument('--cfg', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RAP.cfg'), help='config file')
+	args = parser.parse_args()
+
+	cfg_dict = common_functions.cfg_to_dict(args.cfg)
+	# the csv file goes next to the sqlite database's folder (eg. RAP2021_output3\csv\_sweep_summary.csv)
+	cfg_dict['OUTPUT']['outputfolderpath'] = os.path.dirname(os.path.dirname(os.path.abspath(args.db_filepath)))
+	max_num_of_t_per_sqm_lst = [float(i) for i in args.max_num_of_t_per_sqm.split(',')] if args.max_num_of_t_per_sqm else None
+	num_of_plots_lst = [int(i) for i in args.num_of_plots.split(',')] if args.num_of_plots else None
+
+	logfile = os.path.basename(__file__) + '_deleteMeLater.txt'
+	logger = log.logger(logfile, debug = False)
+	sw = Sweep(cfg_dict, args.db_filepath, logger, max_num_of_t_per_sqm_lst, num_of_plots_lst)
+	sw.run_all()
+	print("Done. See %s"%sw.output_csv)
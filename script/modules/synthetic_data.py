@@ -0,0 +1,271 @@
+# Purpose:
+# To generate a realistic (but fake) Terraflex export and project boundaries so that every stage of RAP can be run and benchmarked
+# without sharing the real survey data.
+# The output folder will look like this:
+#	<outfolder>\data\Clearcut_Survey_v2021.csv
+#	<outfolder>\data\Shelterwood_Survey_v2021.csv
+#	<outfolder>\data\images\connectspatial\*.jpg  (dummy photos)
+#	<outfolder>\shp\projects.geojson
+#	<outfolder>\shp\projects.shp  (only if gdal/ogr is installed)
+# The csv files have the exact wide schema read by csv2sqlite and analysis.py (Species1SpeciesNamePlot1, Species1NumberofTreesPlot1, ...
+# including the misspelled PhotosPot6 field of the clearcut form). Point inputdatafolderpath and project_shpfile in the config file to these.
+# The records are written one at a time, so the number of clusters can go from 100 up to 1M without running out of memory.
+#
+# usage: python synthetic_data.py C:\TEMP\RAP_synthetic 10000 --seed 1
+
+import os, csv, json, math, random
+
+
+# species names as they appear in the Terraflex form.
+spc_names = ['AB (ash, black)', 'AW (ash, white)', 'BD (basswood)', 'BE (beech, american)', 'BF (fir, balsam)', 'BN (butternut)',
+	'BW (birch, white/paper)', 'BY (birch, yellow)', 'CB (cherry, black)', 'CE (cedar, all/any)', 'CW (cedar, white)', 'EW (elm, white)',
+	'EX (elm, any/mix)', 'HE (hemlock, eastern)', 'HI (hickory, all/any)', 'IW (ironwood/hop-hornbeam)', 'LA (tamarack/larch)',
+	'MH (maple, sugar/hard)', 'MR (maple, red)', 'MS (maple, silver)', 'OB (oak, bur)', 'OR (oak, red)', 'OW (oak, white)',
+	'PB (poplar, balsam)', 'PJ (pine, jack)', 'PL (aspen, largetooth)', 'PO (poplar, any/mix)', 'PR (pine, red)', 'PS (pine, scots)',
+	'PT (aspen, trembling)', 'PW (pine, white)', 'SB (spruce, black)', 'SN (spruce, norway)', 'SR (spruce, red)', 'SW (spruce, white)',
+	'SX (spruce, any/mix)']
+
+# the boreal species are picked a lot more often than the rest
+common_spc_names = ['BF (fir, balsam)', 'BW (birch, white/paper)', 'LA (tamarack/larch)', 'PJ (pine, jack)', 'PO (poplar, any/mix)',
+	'PT (aspen, trembling)', 'SB (spruce, black)', 'SW (spruce, white)']
+
+unoccupied_reasons = ['Slash', 'Road', 'Water', 'Rock', 'Treed', 'Unspecified']
+moisture = ['dry', 'fresh', 'moist', 'wet']
+nutrient = ['Very poor', 'Poor', 'Moderately Rich', 'Rich', 'Very rich']
+districts = ['Timmins', 'Kirkland Lake', 'Cochrane', 'Hearst', 'Chapleau', 'Wawa', 'Sault Ste. Marie', 'North Bay']
+fmus = ['Romeo Malette', 'Timiskaming', 'Abitibi River', 'Gordon Cosens', 'Hearst', 'Martel', 'Algoma', 'Nipissing']
+
+# content of the dummy photos (jpg start and end markers only). RAP copies and renames the photos but never opens them.
+dummy_jpg = b'\xff\xd8\xff\xd9'
+
+
+
+class Synthetic_data:
+	def __init__(self, outfolder, num_of_clusters, logger, seed = 0, clus_per_proj = 8, sh_ratio = 0.25, photo_rate = 0.05, testdata_rate = 0.01):
+		self.outfolder = outfolder
+		self.num_of_clusters = int(num_of_clusters) # total number of clusters (clearcut + shelterwood) eg. 100 ~ 1000000
+		self.logger = logger
+		self.rand = random.Random(seed) # the same seed always gives the same dataset
+		self.clus_per_proj = clus_per_proj # number of clusters surveyed in each project
+		self.sh_ratio = sh_ratio # proportion of the projects that are shelterwood
+		self.photo_rate = photo_rate # proportion of the plots with a photo
+		self.testdata_rate = testdata_rate # proportion of the clusters flagged as TestData = Yes
+		self.num_of_plots = 8
+
+		self.data_folder = os.path.join(outfolder, 'data')
+		self.photo_folder = os.path.join(self.data_folder, 'images', 'connectspatial')
+		self.shp_folder = os.path.join(outfolder, 'shp')
+		self.geojson_filepath = os.path.join(self.shp_folder, 'projects.geojson')
+		self.shp_filepath = os.path.join(self.shp_folder, 'projects.shp')
+
+		# project boundaries are squares laid out on a grid starting from the south west corner below.
+		self.grid_origin = [48.0, -82.0] # lat, lon
+		self.num_of_projs = int(math.ceil(self.num_of_clusters / self.clus_per_proj))
+		self.grid_width = int(math.ceil(math.sqrt(self.num_of_projs))) # number of projects in each row of the grid
+		self.proj_size = min(0.02, 2.0 / self.grid_width) # width of each project in degrees. the whole grid stays within 2 x 2 degrees.
+
+		self.projects = [] # eg. [{'ProjectID': 'SYN-00001', 'SILVSYS': 'CC', 'NUMCLUSTER': 10, 'bbox': [48.0, -82.0, 48.02, -81.98], ...},...]
+		self.photo_counter = 0
+
+		self.logger.info("\n")
+		self.logger.info("--> Running synthetic_data module")
+		self.logger.info("Generating %s clusters in %s projects at %s"%(self.num_of_clusters, self.num_of_projs, self.outfolder))
+
+
+	def create_folders(self):
+		for folder in [self.outfolder, self.data_folder, self.photo_folder, self.shp_folder]:
+			if not os.path.isdir(folder):
+				os.makedirs(folder)
+
+
+	def create_projects(self):
+		"""creates project records with the attributes analysis.py reads from the project shapefile"""
+		self.logger.info("Running create_projects method")
+		for i in range(self.num_of_projs):
+			row, col = divmod(i, self.grid_width)
+			south = self.grid_origin[0] + row * self.proj_size
+			west = self.grid_origin[1] + col * self.proj_size
+			margin = self.proj_size * 0.1 # gap between the projects
+			bbox = [south + margin, west + margin, south + self.proj_size - margin, west + self.proj_size - margin] # [min lat, min lon, max lat, max lon]
+			silvsys = 'SH' if self.rand.random() < self.sh_ratio else 'CC'
+			dist_index = self.rand.randrange(len(districts))
+			yrdep = self.rand.randint(2008, 2016)
+			targetspc = self.rand.choice(['SB', 'PJ', 'SW', 'PO', 'BW'])
+
+			self.projects.append({
+				'ProjectID': 'SYN-%06d'%(i+1),
+				'NUMCLUSTER': self.clus_per_proj + self.rand.randint(0, 4),
+				'SILVSYS': silvsys,
+				'AREA_HA': round(self.rand.uniform(5, 150), 2),
+				'FMU': fmus[dist_index],
+				'DISTRICT': districts[dist_index],
+				'LAT': round((bbox[0] + bbox[2]) / 2, 6),
+				'LON': round((bbox[1] + bbox[3]) / 2, 6),
+				'YRDEP': yrdep,
+				'DEPLETIONF': self.rand.choice(['SP1', 'SB1', 'PJ1', 'MW1', 'PO1']),
+				'YRORG': yrdep + 1,
+				'SGR': 'SYN%s'%self.rand.randint(1, 99),
+				'TARGETFU': self.rand.choice(['SP1', 'SB1', 'PJ1', 'MW1', 'PO1']),
+				'TARGETSPC': targetspc,
+				'TARGETSO': round(self.rand.uniform(0.4, 0.8), 2),
+				'SFL_AS_YR': 2021,
+				'SFL_ASMETH': self.rand.choice(['Ground', 'Aerial']),
+				'SFL_SPCOMP': '%s 60 BW 40'%targetspc if targetspc != 'BW' else 'BW 100',
+				'SFL_SO': round(self.rand.uniform(0.5, 1.0), 2),
+				'SFL_FU': self.rand.choice(['SP1', 'SB1', 'PJ1', 'MW1', 'PO1']),
+				'SFL_EFFDEN': self.rand.randint(800, 3000),
+				'bbox': bbox})
+
+
+	def write_projects(self):
+		"""writes the project polygons to GeoJSON (WGS84), then to a shapefile if ogr is available"""
+		self.logger.info("Running write_projects method")
+		with open(self.geojson_filepath, 'w') as f:
+			f.write('{"type": "FeatureCollection", "features": [\n')
+			for i, proj in enumerate(self.projects):
+				s, w, n, e = proj['bbox']
+				feature = {'type': 'Feature',
+					'properties': {k:v for k,v in proj.items() if k != 'bbox'},
+					'geometry': {'type': 'Polygon', 'coordinates': [[[w, s], [w, n], [e, n], [e, s], [w, s]]]}}
+				f.write(('' if i == 0 else ',\n') + json.dumps(feature))
+			f.write('\n]}\n')
+		self.logger.info("%s projects have been written to %s"%(len(self.projects), self.geojson_filepath))
+
+		try:
+			from osgeo import ogr
+		except ImportError:
+			self.logger.info("!!!! gdal/ogr is not installed. Only the GeoJSON has been written. Convert it to a shapefile to use it in RAP.")
+			return
+		src = ogr.Open(self.geojson_filepath)
+		driver = ogr.GetDriverByName('ESRI Shapefile')
+		if os.path.exists(self.shp_filepath):
+			driver.DeleteDataSource(self.shp_filepath)
+		driver.CopyDataSource(src, self.shp_filepath)
+		src = None
+		self.logger.info("Shapefile has been written to %s"%self.shp_filepath)
+
+
+	def get_fieldnames(self, silvsys):
+		"""fieldnames of the Terraflex csv export. CC has 4 species per plot and SH has 6 species per plot (1~3: 8m2, 4~6: 16m2)"""
+		num_of_spc = 4 if silvsys == 'CC' else 6
+		fieldnames = ['ClusterNumber', 'CreationDateTime', 'Surveyors', 'DistrictName', 'ForestManagementUnit', 'ProjectID02', 'ProjIDManualOverride']
+		for p in range(1, self.num_of_plots + 1):
+			fieldnames += ['UnoccupiedPlot%s'%p, 'UnoccupiedreasonPlot%s'%p]
+			for s in range(1, num_of_spc + 1):
+				fieldnames += ['Species%sSpeciesNamePlot%s'%(s,p), 'Species%sNumberofTreesPlot%s'%(s,p)]
+			# the clearcut form has the misspelled PhotosPot6 field (see csv2sqlite's fix_misspelled_fieldnames method)
+			fieldnames += ['CommentsPlot%s'%p, 'PhotosPot6' if (silvsys == 'CC' and p == 6) else 'PhotosPlot%s'%p]
+		fieldnames += ['MoistureEcosite', 'NutrientEcosite01', 'CommentsEcosite', 'GeneralComment', 'ClusterPhoto', 'TestData', 'X', 'Y']
+		return fieldnames
+
+
+	def dummy_photo(self):
+		"""writes a dummy photo and returns the relative path as it appears in the Terraflex export. eg. 'images/connectspatial/0000001a-5f3c.jpg'"""
+		self.photo_counter += 1
+		filename = '%08x-%04x.jpg'%(self.photo_counter, self.rand.getrandbits(16))
+		with open(os.path.join(self.photo_folder, filename), 'wb') as f:
+			f.write(dummy_jpg)
+		return 'images/connectspatial/' + filename
+
+
+	def photos(self):
+		"""returns '' most of the time, otherwise one or two photo paths separated by |"""
+		if self.rand.random() >= self.photo_rate:
+			return ''
+		return '|'.join([self.dummy_photo() for i in range(self.rand.choice([1, 1, 1, 2]))])
+
+
+	def create_cluster(self, proj, clus_num, fieldnames):
+		"""returns one cluster survey record (a dictionary) located within the project boundary"""
+		rec = {f:'' for f in fieldnames}
+		silvsys = proj['SILVSYS']
+		num_of_spc = 4 if silvsys == 'CC' else 6
+		s, w, n, e = proj['bbox']
+
+		rec['ClusterNumber'] = str(clus_num)
+		rec['CreationDateTime'] = '2021-%02d-%02dT%02d:%02d:00'%(self.rand.randint(6, 10), self.rand.randint(1, 28), self.rand.randint(7, 18), self.rand.randint(0, 59))
+		rec['Surveyors'] = self.rand.choice(['AB', 'CD', 'EF', 'GH']) + ', ' + self.rand.choice(['IJ', 'KL', 'MN'])
+		rec['DistrictName'] = proj['DISTRICT']
+		rec['ForestManagementUnit'] = proj['FMU']
+		rec['ProjectID02'] = proj['ProjectID']
+		rec['ProjIDManualOverride'] = 'Use GPS'
+
+		# most of the plots are occupied with 1-3 species. the tree count is occasionally left blank or 0.
+		for p in range(1, self.num_of_plots + 1):
+			if self.rand.random() < 0.15:
+				rec['UnoccupiedPlot%s'%p] = 'Yes'
+				rec['UnoccupiedreasonPlot%s'%p] = self.rand.choice(unoccupied_reasons)
+			else:
+				rec['UnoccupiedPlot%s'%p] = 'No'
+				for spc in range(1, num_of_spc + 1):
+					if spc in [1, 4] or self.rand.random() < 0.35:
+						rec['Species%sSpeciesNamePlot%s'%(spc,p)] = self.rand.choice(common_spc_names if self.rand.random() < 0.85 else spc_names)
+						rec['Species%sNumberofTreesPlot%s'%(spc,p)] = self.rand.choice(['1', '1', '2', '2', '3', '4', '5', '8', '0', ''])
+			rec['CommentsPlot%s'%p] = self.rand.choice(['', '', '', 'heavy slash', 'browsed', 'good regen'])
+			rec['PhotosPot6' if (silvsys == 'CC' and p == 6) else 'PhotosPlot%s'%p] = self.photos()
+
+		rec['MoistureEcosite'] = self.rand.choice(moisture)
+		rec['NutrientEcosite01'] = self.rand.choice(nutrient)
+		rec['CommentsEcosite'] = self.rand.choice(['', 'sandy', 'clay'])
+		rec['GeneralComment'] = self.rand.choice(['', '', 'all good', 'hard to access'])
+		rec['ClusterPhoto'] = self.photos()
+		rec['TestData'] = 'Yes' if self.rand.random() < self.testdata_rate else 'No'
+		rec['X'] = round(self.rand.uniform(w, e), 8)
+		rec['Y'] = round(self.rand.uniform(s, n), 8)
+		return rec
+
+
+	def write_clusters(self):
+		"""streams the cluster survey records to the clearcut and shelterwood csv files"""
+		self.logger.info("Running write_clusters method")
+		clus_count = {'CC': 0, 'SH': 0}
+		csvfiles = {'CC': os.path.join(self.data_folder, 'Clearcut_Survey_v2021.csv'), 'SH': os.path.join(self.data_folder, 'Shelterwood_Survey_v2021.csv')}
+		fieldnames = {silvsys: self.get_fieldnames(silvsys) for silvsys in ['CC', 'SH']}
+		files = {silvsys: open(csvfiles[silvsys], 'w', newline='', encoding='utf-8-sig') for silvsys in ['CC', 'SH']}
+		writers = {silvsys: csv.DictWriter(files[silvsys], fieldnames=fieldnames[silvsys]) for silvsys in ['CC', 'SH']}
+		for writer in writers.values():
+			writer.writeheader()
+
+		remaining = self.num_of_clusters
+		for proj in self.projects:
+			silvsys = proj['SILVSYS']
+			for clus_num in range(101, 101 + min(self.clus_per_proj, remaining)):
+				writers[silvsys].writerow(self.create_cluster(proj, clus_num, fieldnames[silvsys]))
+				clus_count[silvsys] += 1
+			remaining -= self.clus_per_proj
+			if remaining <= 0:
+				break
+
+		for f in files.values():
+			f.close()
+		self.logger.info("Clusters written: %s"%clus_count)
+		self.logger.info("Dummy photos written: %s"%self.photo_counter)
+
+
+	def run_all(self):
+		self.create_folders()
+		self.create_projects()
+		self.write_projects()
+		self.write_clusters()
+
+
+
+
+if __name__ == '__main__':
+	import argparse, log
+
+	parser = argparse.ArgumentParser(description='Generate a synthetic Terraflex export (csv, photos) and project boundaries for testing RAP at scale.')
+	parser.add_argument('outfolder', help='folder where data and shp folders will be created')
+	parser.add_argument('num_of_clusters', type=int, help='total number of clusters. eg. 100 ~ 1000000')
+	parser.add_argument('--seed', type=int, default=0, help='random seed. the same seed gives the same dataset')
+	parser.add_argument('--clus_per_proj', type=int, default=8, help='number of clusters surveyed in each project')
+	parser.add_argument('--sh_ratio', type=float, default=0.25, help='proportion of shelterwood projects')
+	parser.add_argument('--photo_rate', type=float, default=0.05, help='proportion of plots with a photo')
+	args = parser.parse_args()
+
+	logfile = os.path.basename(__file__) + '_deleteMeLater.txt'
+	logger = log.logger(logfile, debug = False)
+	syn = Synthetic_data(args.outfolder, args.num_of_clusters, logger, seed = args.seed, clus_per_proj = args.clus_per_proj,
+		sh_ratio = args.sh_ratio, photo_rate = args.photo_rate)
+	syn.run_all()
+	print("Done. See %s"%logfile)
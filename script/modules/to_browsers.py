@@ -4,13 +4,13 @@
 # this script uses the html/css/js template scripts in the "browser_template" folder
 # this module comes after analysis.py module.
 
-import sqlite3, os, shutil
+import sqlite3, os
 
 # importing custom modules
 if __name__ == '__main__':
-	import common_functions, html_to_aspx
+	import common_functions, html_to_aspx, to_pdf, file_sync
 else:
-	from modules import common_functions, html_to_aspx
+	from modules import common_functions, html_to_aspx, to_pdf, file_sync
 
 
 
@@ -20,10 +20,19 @@ class To_browsers:
 		self.logger = logger
 		self.clus_summary_tblname = cfg_dict['SQLITE']['clus_summary_tblname']
 		self.proj_summary_tblname = cfg_dict['SQLITE']['proj_summary_tblname']
+		self.proj_clus_tblname = cfg_dict['SQLITE']['proj_clus_tblname']
+		self.district_summary_tblname = cfg_dict['SQLITE']['district_summary_tblname']
+		self.fmu_summary_tblname = cfg_dict['SQLITE']['fmu_summary_tblname']
+		self.qa_issues_tblname = cfg_dict['SQLITE']['qa_issues_tblname']
+		self.qa_rules_tblname = cfg_dict['SQLITE']['qa_rules_tblname']
+		self.primary_grouping = os.path.splitext(os.path.basename(cfg_dict['SPC']['csv']))[0] # eg. 'SpeciesGroup'. the extra species groupings are shown in addition to this one
 		self.projects_shp = cfg_dict['SHP']['shp2sqlite_tablename']
 		self.dst_path = os.path.join(cfg_dict['OUTPUT']['outputfolderpath'], 'browser')
+		self.publish_folder = cfg_dict['OUTPUT']['publish_folder'].strip() # eg. a OneDrive folder sync'ed with SharePoint. '' = not published
 		self.report_doc_path = cfg_dict['PDF']['report_folder']
 		self.ref_doc_path = cfg_dict['PDF']['ref_folder']
+		self.proj_reports = cfg_dict['PDF']['proj_reports'].upper() == 'TRUE'
+		self.proj_report_folder = to_pdf.proj_report_folder(cfg_dict) # the project reports rendered by to_pdf.py
 
 		self.logger.info("\n")
 		self.logger.info("--> Running to_browsers module")
@@ -31,8 +40,8 @@ class To_browsers:
 
 
 	def tbl_2_dict(self):
-		"""Turns sqlite tables into list of dictionaries"""
-		self.clus_summary_dict = common_functions.sqlite_2_dict(self.db_filepath, self.clus_summary_tblname)
+		"""Turns sqlite tables into list of dictionaries
+		Cluster_Summary is not loaded as a whole - see get_clus_summary method"""
 		self.proj_summary_dict = common_functions.sqlite_2_dict(self.db_filepath, self.proj_summary_tblname)
 
 		# get project ids that actually has any data collected
@@ -40,6 +49,14 @@ class To_browsers:
 		self.logger.info("Active Projects: %s"%self.active_projs)
 
 
+	def get_clus_summary(self, proj):
+		"""returns records in Cluster_Summary table where the record's proj_id matches with the given proj_id (indexed query)
+		eg. [{"cluster_number" = '703', 'site_occ' = '0.75'}...,]
+		"""
+		sql = "SELECT * FROM %s WHERE proj_id = ? ORDER BY rowid"%self.clus_summary_tblname
+		return common_functions.sqlite_2_dict(self.db_filepath, self.clus_summary_tblname, query=sql, params=(proj,))
+
+
 	def move_templates(self):
 		""" copy and paste the template html/css/js from the 'browser_template' folder to the destination folder"""
 
@@ -57,17 +74,11 @@ class To_browsers:
 			except OSError:
 				self.logger.info("Creation of the directory %s failed"%self.dst_path)		
 
-		for root, dirs, files in os.walk(src_path):
-			for f in files:
-				src_file = os.path.join(root,f)
-				if root == src_path:
-					dst_folder = self.dst_path
-				else:
-					child_folder = os.path.split(root)[1]
-					dst_folder = os.path.join(self.dst_path,child_folder)
-					if not os.path.isdir(dst_folder): os.mkdir(dst_folder)
-				shutil.copy(src_file,dst_folder)
-
+		# only the templates that are missing or different are copied.
+		# they are never linked since the placeholders ($$Table%% etc.) are replaced in the copies.
+		template_sync = file_sync.File_sync(None, self.logger)
+		template_sync.copy_tree(src_path, self.dst_path)
+		template_sync.save()
 
 		self.logger.debug("successfully copied html/css/js files over")
 
@@ -109,6 +120,7 @@ class To_browsers:
 
 		con = sqlite3.connect(self.db_filepath)
 		cur = con.cursor()
+		cur.execute("DROP TABLE IF EXISTS %s"%self.dash_table) # already there if to_browsers is run again on the same database (RAP.py --only-stage to_browsers)
 		cur.execute(sql)
 
 		# Turn the sqlite table into html string
@@ -128,6 +140,57 @@ class To_browsers:
 		common_functions.replace_txt_in_file(txtfile = self.htmlfile, being_replaced='$$time_now%%', replacing_with=self.timenow)
 
 
+	def create_dashboard_rollup(self):
+		"""populates the dashboard's District and FMU summary section (replacing $$Rollup%% in index.html).
+		the tables are read as they are from District_Summary and FMU_Summary (see rollup.py) - the cluster data is not touched here.
+		"""
+		self.logger.debug("running create_dashboard_rollup method")
+		html = ''
+		con = sqlite3.connect(self.db_filepath)
+		for title, tblname, level, table_id in [('MNRF District Summary', self.district_summary_tblname, 'district', 'district_summary'),
+												('FMU Summary', self.fmu_summary_tblname, 'fmu', 'fmu_summary')]:
+			html += '\n<h3>%s</h3>\n'%title
+			if con.execute("SELECT COUNT(*) FROM %s"%tblname).fetchone()[0] == 0:
+				html += 'No data.'
+				continue
+			sql = """SELECT %s AS "%s", num_projects_surveyed||" of "||num_projects AS "Projects Surveyed",
+				num_clusters_surveyed||" of "||num_clusters_total AS "Clusters Surveyed", area_ha AS "Area ha",
+				site_occ AS "Site Occ (area-weighted)", effective_density AS "Effective Density (area-weighted)", spcomp AS "SPCOMP (area-weighted)"
+				FROM %s ORDER BY %s"""%(level, 'District' if level == 'district' else 'FMU', tblname, level)
+			html += common_functions.sqlite_2_html(self.db_filepath, tblname, query=sql, table_id=table_id)
+		con.close()
+
+		common_functions.replace_txt_in_file(txtfile = self.htmlfile, being_replaced='$$Rollup%%', replacing_with=html)
+
+
+	def create_dashboard_qa(self):
+		"""populates the QA tab (replacing $$QA%% in index.html) with the qa_rules and qa_issues tables made by qa.py.
+		the issues table is sorted by project, cluster and plot so that the issues of a cluster are listed together.
+		"""
+		self.logger.debug("running create_dashboard_qa method")
+		con = sqlite3.connect(self.db_filepath)
+		qa_tables = [row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (?,?)", (self.qa_issues_tblname, self.qa_rules_tblname))]
+		if len(qa_tables) == 2:
+			num_issues = con.execute("SELECT COUNT(*) FROM %s"%self.qa_issues_tblname).fetchone()[0]
+		con.close()
+		if len(qa_tables) < 2:
+			html = 'The data quality rules have not been run.'
+		else:
+			html = '\n<h3>Data Quality Rules</h3>\n'
+			sql = """SELECT rule_id AS "Rule", level AS "Level", description AS "Description", num_issues AS "Issues" FROM %s"""%self.qa_rules_tblname
+			html += common_functions.sqlite_2_html(self.db_filepath, self.qa_rules_tblname, query=sql, table_id='qa_rules')
+			html += '\n<h3>Issues</h3>\n'
+			sql = """SELECT IFNULL(proj_id, '') AS "Project ID", IFNULL(cluster_number, '') AS "Cluster", IFNULL(plot, '') AS "Plot", rule_id AS "Rule",
+				level AS "Level", IFNULL(value, '') AS "Value", survey_table AS "Table", IFNULL(unique_id, '') AS "unique_id" FROM %s
+				ORDER BY proj_id, CAST(cluster_number AS INTEGER), cluster_number, plot, rule_id"""%self.qa_issues_tblname
+			if num_issues == 0:
+				html += 'No issues found.'
+			else:
+				html += common_functions.sqlite_2_html(self.db_filepath, self.qa_issues_tblname, query=sql, table_id='qa_issues')
+
+		common_functions.replace_txt_in_file(txtfile = self.htmlfile, being_replaced='$$QA%%', replacing_with=html)
+
+
 	def create_dashboard_map(self):
 		"""Creates the map portion of the index.html's dashboard by editing lib/RAP_init.js.
 		for each project a popup pinpoint will be created on the map.
@@ -194,7 +257,7 @@ class To_browsers:
 			# Editing the map: editing proj.js file
 			js_script = "\n//markers for each cluster in %s\n"%proj
 			# grabbing cluster info from cluster summary table
-			clus_summary_list = [info for info in self.clus_summary_dict if info['proj_id'] == proj] # eg. [{"cluster_number" = '703', 'site_occ' = '0.75'}...,]
+			clus_summary_list = self.get_clus_summary(proj) # eg. [{"cluster_number" = '703', 'site_occ' = '0.75'}...,]
 			for clus_summary in clus_summary_list:
 				clus_lat = clus_summary['lat']
 				clus_lon = clus_summary['lon']
@@ -222,6 +285,7 @@ class To_browsers:
 		This method is all about replacing $$Summary%% text in each of the projectid.html files.
 		"""
 		self.logger.debug("running create_proj_pages2 method")
+		report_sync = file_sync.File_sync(None, self.logger) # for the reports rendered by to_pdf.py
 
 		# modifying html files
 		for proj in self.active_projs:
@@ -241,7 +305,15 @@ class To_browsers:
 			proj_assessors = proj_sum_dict['assessors']
 			proj_comments = proj_comments_summary(proj_sum_dict['all_comments'])
 
-			html = """\n\n<table id="noline">
+			# link to the printable report if to_pdf.py has rendered one for this project
+			html = ''
+			pdf_filename = to_pdf.create_pdf_filename(proj)
+			pdf_filepath = os.path.join(self.proj_report_folder, pdf_filename)
+			if self.proj_reports and os.path.isfile(pdf_filepath):
+				report_sync.copy(pdf_filepath, os.path.join(self.dst_path, 'proj', 'pdf', pdf_filename), link=True)
+				html += '\n<p><a href="pdf/%s" target="_blank">Printable report (PDF)</a></p>'%pdf_filename
+
+			html += """\n\n<table id="noline">
 			<tr><td><strong>Project ID:</strong></td> 					<td>{0}</td></tr>
 			<tr><td><strong>Clusters Surveyed:</strong></td> 			<td>{1}</td></tr>
 			<tr><td><strong>Project Location (lat, lon): </strong></td> <td>{2}</td></tr>
@@ -290,6 +362,11 @@ class To_browsers:
 			if enough_data:
 				spcomp_grp = eval(proj_sum_dict['spcomp_grp'])
 				html += spcomp_to_html_table(spcomp_grp, 'MNRF SPCOMP (grouped)')[1]
+				# SPCOMP grouped by the extra species group csv files (if any)
+				spcomp_by_grouping = eval(proj_sum_dict['spcomp_by_grouping']) # eg. {'SpeciesGroup': {'BF': {'mean': 7.06,...},...}, 'SpeciesGroup_short': {...}}
+				for grouping, spcomp_grp in spcomp_by_grouping.items():
+					if grouping != self.primary_grouping:
+						html += spcomp_to_html_table(spcomp_grp, 'MNRF SPCOMP (grouped - %s)'%grouping)[1]
 
 			# Site occupancy and effective density
 			so = eval(proj_sum_dict['site_occupancy']) # eg. {'mean': 0.7708, 'stdv': 0.3826, 'ci': 0.4015, 'upper_ci': 1.1723, 'lower_ci': 0.3693, 'n': 6, 'confidence': 0.95}
@@ -316,9 +393,13 @@ class To_browsers:
 			html = ''
 
 			# ### Processed Data Section ###
-			# grabbing processed data from the sqlite database (z_... tables)
-			tablename = common_functions.create_proj_tbl_name(proj)
-			html += common_functions.sqlite_2_html(self.db_filepath, tablename)
+			# grabbing processed data from the sqlite database (project_cluster_detail table)
+			# only the species found in this project are selected
+			proj_sum_dict = [record for record in self.proj_summary_dict if record['proj_id'] == proj][0]
+			spc_list = sorted(['_'+ spcname for spcname in eval(proj_sum_dict['species_found'])]) # ['_AB', '_CE', '_OR', '_PT', '_PW', '_SB', '_SW']
+			columns = ['Cluster_Num', 'Site_Occ', 'Ef_Density', 'Moisture', 'Silvsys'] + spc_list
+			sql = "SELECT %s FROM %s WHERE proj_id = ? ORDER BY rowid"%(','.join(columns), self.proj_clus_tblname)
+			html += common_functions.sqlite_2_html(self.db_filepath, self.proj_clus_tblname, query=sql, params=(proj,))
 
 			common_functions.replace_txt_in_file(txtfile = htmlfilepath, being_replaced='$$ProcessedData%%', replacing_with=html)
 
@@ -335,7 +416,7 @@ class To_browsers:
 
 			### Photos Section ###
 			html = ''
-			clus_sum_dict = [summary for summary in self.clus_summary_dict if summary['proj_id'] == proj] # records in Cluster_Summary table where the record's proj_id matches with current proj_id
+			clus_sum_dict = self.get_clus_summary(proj) # records in Cluster_Summary table where the record's proj_id matches with current proj_id
 			clus_lst = [int(clus['cluster_number']) for clus in clus_sum_dict]
 			clus_lst.sort()
 
@@ -375,8 +456,9 @@ class To_browsers:
 			except OSError:
 				self.logger.info("Creation of the directory %s failed"%pdf_path)
 
-		# copying the pdf documents over.
+		# copying the pdf documents over (hard linked where possible, and only if they're missing or different).
 		# first get the list of files in the pdf_to_post folder.
+		pdf_sync = file_sync.File_sync(None, self.logger)
 		report_files = os.listdir(self.report_doc_path)
 		ref_files = os.listdir(self.ref_doc_path)
 		report_pdfs = [file.upper() for file in report_files if file.upper().endswith('.PDF')]
@@ -390,7 +472,7 @@ class To_browsers:
 			for pdf in report_pdfs:
 				pdf_old_path = os.path.join(self.report_doc_path, pdf)
 				pdf_new_path = os.path.join(pdf_path, pdf)
-				shutil.copy(pdf_old_path, pdf_new_path)
+				pdf_sync.copy(pdf_old_path, pdf_new_path, link=True)
 				link_text = pdf[:-4]
 				html += """<br><a href="%s/%s" target="_blank">%s</a>"""%(rel_path, pdf, link_text)
 		else:
@@ -405,7 +487,7 @@ class To_browsers:
 			for pdf in ref_pdfs:
 				pdf_old_path = os.path.join(self.ref_doc_path, pdf)
 				pdf_new_path = os.path.join(pdf_path, pdf)
-				shutil.copy(pdf_old_path, pdf_new_path)
+				pdf_sync.copy(pdf_old_path, pdf_new_path, link=True)
 				link_text = pdf[:-4]
 				html += """<br><a href="%s/%s" target="_blank">%s</a>"""%(rel_path, pdf, link_text)
 		else:
@@ -414,6 +496,8 @@ class To_browsers:
 			html += """<br>No Reports to show"""
 
 
+		pdf_sync.save()
+
 		common_functions.replace_txt_in_file(txtfile = self.htmlfile, being_replaced='$$Doc%%', replacing_with=html)
 			
 
@@ -432,10 +516,28 @@ class To_browsers:
 		html_to_aspx.main(browser_folder_path, new_folder_path)
 
 
+	def publish_site(self):
+		""" copies the aspx site (browser_aspx folder) to the publish folder, which is kept between runs.
+		only new or changed files are written, so OneDrive doesn't upload the unchanged pages and pdfs again.
+		files published by the previous run that are no longer part of the site are deleted.
+		"""
+		if self.publish_folder == '':
+			return
+		self.logger.debug("running publish_site method")
+		aspx_folder_path = os.path.join(os.path.split(self.dst_path)[0],'browser_aspx')
+		site_sync = file_sync.File_sync(os.path.join(self.publish_folder, '_publish_manifest.json'), self.logger)
+		site_sync.copy_tree(aspx_folder_path, self.publish_folder, link=True)
+		num_removed = site_sync.remove_stale()
+		site_sync.save()
+		self.logger.info("Published the site to %s: %s files written, %s unchanged, %s removed"%(self.publish_folder, site_sync.num_copied, site_sync.num_unchanged, num_removed))
+
+
 	def run_all(self):
 		self.tbl_2_dict()
 		self.move_templates()
 		self.create_dashboard_table()
+		self.create_dashboard_rollup()
+		self.create_dashboard_qa()
 		self.create_dashboard_map()
 		self.create_proj_pages1()
 		self.create_proj_pages2()
@@ -443,6 +545,7 @@ class To_browsers:
 		# self.add_supp_doc()
 		self.add_log()
 		self.create_aspx_files()
+		self.publish_site()
 
 ##############    End of class "To_browsers"   ######################
 
@@ -39,7 +39,7 @@ class To_csv:
 		self.plot_summary_dict_cc = common_functions.sqlite_2_dict(self.db_filepath, self.plot_summary_tblname + '_cc') if self.cc_exists else None
 		self.plot_summary_dict_sh = common_functions.sqlite_2_dict(self.db_filepath, self.plot_summary_tblname + '_sh') if self.sh_exists else None
 
-		self.clus_summary_dict = common_functions.sqlite_2_dict(self.db_filepath, self.clus_summary_tblname)
+		# Cluster_Summary records are queried one project at a time in clus_to_csv method
 		self.proj_summary_dict = common_functions.sqlite_2_dict(self.db_filepath, self.proj_summary_tblname)
 
 		# get project ids that actually has any data collected
@@ -100,7 +100,8 @@ class To_csv:
 
 		for p in self.active_projs:
 			csvfilename = os.path.join(self.output_csv_folderpath, p + '_calc.csv')
-			data = [record for record in self.clus_summary_dict if record['proj_id']==p] # a list of dictionaries equivalent of the cluster_summary table's records of this project id
+			clus_sql = "SELECT * FROM %s WHERE proj_id = ? ORDER BY rowid"%self.clus_summary_tblname
+			data = common_functions.sqlite_2_dict(self.db_filepath, self.clus_summary_tblname, query=clus_sql, params=(p,)) # a list of dictionaries equivalent of the cluster_summary table's records of this project id
 			proj_summary_record = [record for record in self.proj_summary_dict if record['proj_id']==p]
 			proj_summary_record = proj_summary_record[0] # a dictionary equivalent of the project_summary table's one record
 			lst_of_clus = eval(proj_summary_record[lst_of_clus_attr]) # ['707','701', '701', '702', '703', '704', '705', '706'] i.e. not sorted
@@ -246,8 +247,7 @@ class To_csv:
 
 				# Site Occupancy calculated result:
 				if len(set(lst_of_clus)) > 2:
-					proj_data = [record for record in self.proj_summary_dict if record['proj_id']==p]
-					results = proj_data[0][so_attr] # eg. {'mean': 0.7708, 'stdv': 0.3826, 'ci': 0.4015, 'upper_ci': 1.1723, 'lower_ci': 0.3693, 'n': 6, 'confidence': 0.95}
+					results = proj_summary_record[so_attr] # eg. {'mean': 0.7708, 'stdv': 0.3826, 'ci': 0.4015, 'upper_ci': 1.1723, 'lower_ci': 0.3693, 'n': 6, 'confidence': 0.95}
 					with open(csvfilename,'a') as f:
 						writer = csv.writer(f, lineterminator='\n')
 						writer.writerow(eval(results).keys())
@@ -273,9 +273,8 @@ class To_csv:
 
 				# Number of trees and effective density calculated result:
 				if len(set(lst_of_clus)) > 2:
-					proj_data = [record for record in self.proj_summary_dict if record['proj_id']==p]
 					p_effect_dens_attr = self.proj_summary_attr['p_effect_dens'] # should give you 'effective_density'
-					results = proj_data[0][p_effect_dens_attr] # eg. {'mean': 1979.1667, 'stdv': 1271.9428, 'ci': 1334.8221, 'upper_ci': 3313.9888, 'lower_ci': 644.3446, 'n': 6, 'confidence': 0.95}
+					results = proj_summary_record[p_effect_dens_attr] # eg. {'mean': 1979.1667, 'stdv': 1271.9428, 'ci': 1334.8221, 'upper_ci': 3313.9888, 'lower_ci': 644.3446, 'n': 6, 'confidence': 0.95}
 					with open(csvfilename,'a') as f:
 						writer = csv.writer(f, lineterminator='\n')
 						writer.writerow(eval(results).keys())
@@ -0,0 +1,264 @@
+# this module comes after analysis.py module.
+# staff used to copy the numbers from <proj>_calc.csv into the Clearcut (or Shelterwood) Regeneration Assessment Template
+# (see the calculation folder). This module writes one workbook per project with the same sheets as the template
+# (Set-up screen, Species Comp_SO_ED, Calculations, Ecosite and Output screen) filled out from Cluster_Summary and Project_Summary.
+# the workbooks are written with openpyxl's write-only (streaming) workbook, so the rows go straight to the file and the memory use stays flat.
+# the template itself is not copied - openpyxl cannot load a workbook in write-only mode, and the template's species columns and formulas are for its sample data.
+# the projects are written in a process pool, and a project is skipped if its data (hash) hasn't changed since its workbook was written.
+# this module needs openpyxl. If openpyxl is not installed, the export is skipped (with a warning in the log).
+
+import os, json, hashlib, sqlite3, concurrent.futures
+
+# importing custom modules
+if __name__ == '__main__':
+	import common_functions
+else:
+	from modules import common_functions
+
+
+# change this when the layout of the workbook changes, so that all the workbooks are re-written
+LAYOUT_VERSION = '1'
+
+
+
+class To_excel:
+	def __init__(self, cfg_dict, db_filepath, logger):
+		self.db_filepath = db_filepath
+		self.logger = logger
+		self.clus_summary_tblname = cfg_dict['SQLITE']['clus_summary_tblname']
+		self.proj_summary_tblname = cfg_dict['SQLITE']['proj_summary_tblname']
+		self.num_of_plots = int(cfg_dict['CALC']['num_of_plots'])
+		self.workers = int(cfg_dict['EXCEL']['workers']) # 0 = number of cpus
+
+		# the workbooks go to excel_folder if it's given. otherwise to the output folder's excel folder.
+		# note that the output folder is deleted at the start of every run, so the unchanged projects are only skipped if excel_folder is given.
+		excel_folder = cfg_dict['EXCEL']['excel_folder'].strip()
+		self.excel_folder = excel_folder if excel_folder != '' else os.path.join(cfg_dict['OUTPUT']['outputfolderpath'], 'excel')
+		self.hash_file = os.path.join(self.excel_folder, '_excel_hashes.json') # eg. {'P-1': 'a94a8fe5cc...', 'P-2': ...}
+
+		self.logger.info("\n")
+		self.logger.info("--> Running to_excel module")
+
+
+	def check_openpyxl(self):
+		"""openpyxl is only needed for this module (and imported by write_proj_workbook). returns False if openpyxl is not available."""
+		try:
+			import openpyxl
+		except ImportError:
+			self.logger.info("!!!! openpyxl is not installed. Excel export will be skipped.")
+			return False
+		return True
+
+
+	def write_workbooks(self):
+		if not os.path.isdir(self.excel_folder):
+			os.makedirs(self.excel_folder)
+		try:
+			with open(self.hash_file) as f:
+				old_hashes = json.load(f)
+		except (OSError, ValueError):
+			old_hashes = {}
+
+		con = sqlite3.connect(self.db_filepath)
+		active_projs = [row[0] for row in con.execute("SELECT proj_id FROM %s WHERE CAST(num_clusters_surveyed AS INTEGER) > 0 ORDER BY rowid"%self.proj_summary_tblname)]
+		con.close()
+		self.logger.info("Writing workbooks of %s projects to %s"%(len(active_projs), self.excel_folder))
+
+		# one task per project. eg. [db_filepath, 'Cluster_Summary', 'Project_Summary', 'P-1', 'C:\\RAP\\excel\\P-1_Regeneration_Assessment.xlsx', 8, 'a94a8fe5cc...']
+		tasks = []
+		for proj in active_projs:
+			xlsx_filepath = os.path.join(self.excel_folder, common_functions.no_special_char(proj) + '_Regeneration_Assessment.xlsx')
+			tasks.append([self.db_filepath, self.clus_summary_tblname, self.proj_summary_tblname, proj, xlsx_filepath, self.num_of_plots, old_hashes.get(proj)])
+
+		workers = self.workers if self.workers > 0 else os.cpu_count()
+		if workers > 1 and len(tasks) > 1:
+			with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+				results = list(executor.map(write_proj_workbook, tasks))
+		else:
+			results = [write_proj_workbook(task) for task in tasks]
+
+		new_hashes = {}
+		num_written = 0
+		for proj, data_hash, written, error in results:
+			if error != None:
+				self.logger.info("!!!!! Error - could not write the workbook of %s: %s"%(proj, error))
+				continue
+			new_hashes[proj] = data_hash
+			num_written += written
+		with open(self.hash_file, 'w') as f:
+			json.dump(new_hashes, f, indent=1)
+		self.logger.info("%s workbooks written, %s unchanged projects skipped"%(num_written, len(new_hashes) - num_written))
+
+
+	def run_all(self):
+		if not self.check_openpyxl():
+			return
+		self.write_workbooks()
+
+##############    End of class "To_excel"   ######################
+
+
+
+def write_proj_workbook(task):
+	"""
+	writes the workbook of a project (runs in a separate process, so the data is read from the sqlite database here).
+	task = [db_filepath, clus_summary_tblname, proj_summary_tblname, proj_id, xlsx_filepath, num_of_plots, old_hash]
+	returns [proj_id, data_hash, True if written (False if skipped), None or the error message]
+	"""
+	db_filepath, clus_summary_tblname, proj_summary_tblname, proj, xlsx_filepath, num_of_plots, old_hash = task
+
+	con = sqlite3.connect(db_filepath)
+	con.row_factory = sqlite3.Row
+	proj_rec = dict(con.execute("SELECT * FROM %s WHERE proj_id = ?"%proj_summary_tblname, (proj,)).fetchone())
+	clus_recs = [dict(row) for row in con.execute("SELECT * FROM %s WHERE proj_id = ? ORDER BY rowid"%clus_summary_tblname, (proj,))]
+	con.close()
+
+	# the hash of everything that goes into the workbook
+	data_hash = hashlib.sha1(repr([LAYOUT_VERSION, num_of_plots, sorted(proj_rec.items()), [sorted(rec.items()) for rec in clus_recs]]).encode()).hexdigest()
+	if data_hash == old_hash and os.path.isfile(xlsx_filepath):
+		return [proj, data_hash, False, None]
+
+	try:
+		import openpyxl
+		from openpyxl.cell import WriteOnlyCell
+		from openpyxl.styles import Font
+
+		wb = openpyxl.Workbook(write_only = True)
+		bold = Font(bold = True)
+		def heading(ws, values):
+			cells = []
+			for value in values:
+				cell = WriteOnlyCell(ws, value = value)
+				cell.font = bold
+				cells.append(cell)
+			ws.append(cells)
+
+		silvsys = proj_rec['silvsys']
+		silvsys_name = 'Shelterwood' if silvsys == 'SH' else 'Clearcut'
+		spc_found = sorted(eval(proj_rec['species_found'])) # eg. ['BF', 'BW', 'PJ', 'SB']
+		spcomp_grp = eval(proj_rec['spcomp_grp']) # eg. {'BF': {'mean': 7.06, 'stdv': 7.6229, 'ci': 9.465, ...}, 'SX':...}
+		grps_found = sorted(spcomp_grp.keys())
+		# clusters sorted by cluster number (the duplicates stay)
+		sorted_clus_nums = common_functions.sort_integers(list(set([rec['cluster_number'] for rec in clus_recs])))
+		clus_recs.sort(key = lambda rec: sorted_clus_nums.index(rec['cluster_number']))
+
+		# Set-up screen
+		ws = wb.create_sheet('Set-up screen')
+		heading(ws, ['Initial Set-up Screen - %s Regeneration Assessment'%silvsys_name])
+		ws.append([])
+		for row in [['District:', proj_rec['spatial_MNRF_district']], ['Forest Management Unit:', proj_rec['spatial_FMU']],
+							['Date:', '%s - %s'%(proj_rec['assess_start_date'], proj_rec['assess_last_date'])],
+							['Assessors:', ', '.join(eval(proj_rec['assessors']))], ['Stand/Block ID:', proj], ['Area (ha):', to_number(proj_rec['area_ha'])],
+							['Depletion Year:', proj_rec['YRDEP']], ['Depletion FU:', proj_rec['depletion_fu']], ['Year of Origin:', proj_rec['YRORG']],
+							['Plot size (m2):', to_number(proj_rec['plot_size_m2'])], ['Plots/Cluster:', num_of_plots], ['Silvicultural System:', silvsys_name],
+							['SGR Code:', proj_rec['SGR']], ['Target Forest Unit:', proj_rec['target_fu']], ['Target Species:', proj_rec['target_spc']],
+							['Target site occupancy/stocking:', proj_rec['target_so']], [], ['SFL Survey Results'],
+							['SFL Assessment Method:', proj_rec['sfl_as_method']], ['SFL Species Composition:', proj_rec['sfl_spcomp']],
+							['SFL Stocking/site occupancy:', proj_rec['sfl_so']], ['SFL Forest Unit:', proj_rec['sfl_fu']], ['SFL Effective Density:', proj_rec['sfl_effden']]]:
+			ws.append(row)
+
+		# Species Comp_SO_ED - the tree count of each species in each plot. the cluster values are on the last plot of the cluster.
+		ws = wb.create_sheet('Species Comp_SO_ED')
+		heading(ws, ['%s Regeneration Assessment - Sample Data Calculations'%silvsys_name])
+		heading(ws, ['Cluster', 'Plot', 'Plot Size (m2)'] + spc_found + ['Void', '# trees', 'Site Occupancy (%)', 'Effective Density (stems/ha)'] + ['%s (%%)'%spc for spc in spc_found])
+		for rec in clus_recs:
+			spc_count = eval(rec['spc_count']) # eg. {'P1':[{'BW':2, 'SW':1}, {}], 'P2': None, 'P3': [{'SW': 1}, {'SW': 2}],...}
+			site_occ_data = eval(rec['site_occ_data']) # eg. {'P1': 1, 'P2': 0,...}
+			spc_comp_perc = eval(rec['spc_comp_perc']) # eg. {'BF': 10.0, 'LA': 10.0, 'SW': 80.0}
+			for plotnum in range(1, num_of_plots + 1):
+				plotname = 'P%s'%plotnum
+				counts = spc_count.get(plotname) or [{}]
+				for size_index, count in enumerate(counts):
+					if silvsys != 'SH' and size_index > 0:
+						break
+					row = [to_number(rec['cluster_number']), plotnum, 16 if size_index == 1 else 8] + [count.get(spc) for spc in spc_found]
+					row += [1 if site_occ_data.get(plotname) == 0 else None, sum(count.values())]
+					if plotnum == num_of_plots and size_index == len(counts) - 1:
+						row += [round(float(rec['site_occ'])*100, 2), float(rec['effective_density'])] + [spc_comp_perc.get(spc, 0) for spc in spc_found]
+					ws.append(row)
+
+		# Calculations - one row per cluster
+		ws = wb.create_sheet('Calculations')
+		heading(ws, ['Calculation Summary Sheet'])
+		heading(ws, ['Cluster'] + ['%s (%%)'%grp for grp in grps_found] + ['Site Occupancy (%)', '# trees', 'Effective Density (stems/ha)'])
+		for rec in clus_recs:
+			spc_comp_grp_perc = eval(rec['spc_comp_grp_perc']) # eg. {'LA': 46.7, 'SX': 53.3}
+			ws.append([to_number(rec['cluster_number'])] + [spc_comp_grp_perc.get(grp, 0) for grp in grps_found]
+				+ [round(float(rec['site_occ'])*100, 2), to_number(rec['total_num_trees']), float(rec['effective_density'])])
+
+		# Ecosite
+		ws = wb.create_sheet('Ecosite')
+		heading(ws, ['Cluster', 'Moisture', 'Nutrient', 'Comment'])
+		for rec in clus_recs:
+			ws.append([to_number(rec['cluster_number']), rec['ecosite_moisture'], rec['ecosite_nutrient'], rec['ecosite_comment']])
+		ws.append([])
+		heading(ws, ['Moisture', '%'])
+		for moisture, perc in sorted(eval(proj_rec['ecosite_moisture']).items()):
+			ws.append([moisture, perc])
+
+		# Output screen - the project results
+		so = eval(proj_rec['site_occupancy']) # eg. {'mean': 0.875, 'stdv': 0.1021, 'ci': 0.1624, 'upper_ci': 1.0374, 'lower_ci': 0.7126, 'n': 4, 'confidence': 0.95}
+		ed = eval(proj_rec['effective_density'])
+		ws = wb.create_sheet('Output screen')
+		heading(ws, ['Regeneration Assessment Results'])
+		ws.append([])
+		for label, value in [['District:', proj_rec['spatial_MNRF_district']], ['Forest Management Unit:', proj_rec['spatial_FMU']], ['Stand/Block ID:', proj],
+							['Area:', to_number(proj_rec['area_ha'])], ['Total # Clusters (n):', to_number(proj_rec['num_clusters_surveyed'])],
+							['SGR Code:', proj_rec['SGR']], ['Target FU:', proj_rec['target_fu']], ['Target Species:', proj_rec['target_spc']],
+							['Target site occupancy/stocking:', proj_rec['target_so']], ['SFL Forest Unit:', proj_rec['sfl_fu']]]:
+			ws.append([label, value])
+		ws.append([])
+		heading(ws, ['Results'])
+		heading(ws, ['Species'] + ['%s (%%)'%grp for grp in grps_found] + ['Total Site Occupancy (%)', 'Total Effective Density (stems/ha)'])
+		for label, stat in [['Mean', 'mean'], ['Upper CI', 'upper_ci'], ['Lower CI', 'lower_ci'], ['n', 'n']]:
+			row = [label] + [spcomp_grp[grp].get(stat) for grp in grps_found]
+			so_value = so.get(stat)
+			row += [so_value if stat == 'n' or so_value == None else round(so_value*100, 2), ed.get(stat)]
+			ws.append(row)
+		analysis_comments = eval(proj_rec['analysis_comments'])
+		if len(analysis_comments) > 0:
+			ws.append([])
+			heading(ws, ['Analysis Comments'])
+			for comment in analysis_comments:
+				ws.append([comment])
+
+		# save to a temporary file first, so a half written workbook never replaces the previous one
+		tmp_filepath = xlsx_filepath + '.tmp'
+		wb.save(tmp_filepath)
+		os.replace(tmp_filepath, xlsx_filepath)
+	except Exception as e:
+		return [proj, data_hash, False, repr(e)]
+	return [proj, data_hash, True, None]
+
+
+def to_number(value):
+	"""'12.5' -> 12.5, '106' -> 106, 'abc' -> 'abc'"""
+	try:
+		return int(value)
+	except (ValueError, TypeError):
+		try:
+			return float(value)
+		except (ValueError, TypeError):
+			return value
+
+
+
+
+
+# testing
+if __name__ == '__main__':
+	import argparse, log
+
+	parser = argparse.ArgumentParser(description='Write the regeneration assessment workbooks from the sqlite database of a previous RAP run.')
+	parser.add_argument('db_filepath', help='sqlite database of a previous RAP run. eg. C:\\TEMP\\RAP2021_output3\\sqlite\\RAP_211121081100.sqlite')
+	parser.add_argument('--cfg', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RAP.cfg'), help='config file')
+	args = parser.parse_args()
+
+	cfg_dict = common_functions.cfg_to_dict(args.cfg)
+	if cfg_dict['EXCEL']['excel_folder'].strip() == '':
+		# the workbooks go next to the sqlite database's folder (eg. RAP2021_output3\excel)
+		cfg_dict['OUTPUT']['outputfolderpath'] = os.path.dirname(os.path.dirname(os.path.abspath(args.db_filepath)))
+	logfile = os.path.basename(__file__) + '_deleteMeLater.txt'
+	logger = log.logger(logfile, debug = True)
+	toxl = To_excel(cfg_dict, args.db_filepath, logger)
+	toxl.run_all()
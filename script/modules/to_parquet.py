@@ -0,0 +1,289 @@
+# this module comes after analysis.py module.
+# the purpose of this module is to write the plot, cluster and project summary tables to typed, compressed columnar files (parquet).
+# the nested fields (which are stored as repr strings in the sqlite database) are parsed once here,
+# and the species tallies are flattened to long form so that several seasons can be loaded into pandas without re-parsing.
+# this module needs pyarrow. If pyarrow is not installed, the export is skipped (with a warning in the log).
+
+import os, ast
+
+# importing custom modules
+if __name__ == '__main__':
+	import common_functions
+else:
+	from modules import common_functions
+
+
+
+class To_parquet:
+	def __init__(self, cfg_dict, db_filepath, clus_summary_attr, proj_summary_attr, plotcount_cc_sh, logger):
+		self.db_filepath = db_filepath
+		self.logger = logger
+		self.cfg_dict = cfg_dict
+		self.clus_summary_attr = clus_summary_attr # dictionary of variable: attribute names. they were defined in analysis.py's define_attr_names() method.
+		self.proj_summary_attr = proj_summary_attr
+		self.cc_exists = True if plotcount_cc_sh['CC'] > 0 else False
+		self.sh_exists = True if plotcount_cc_sh['SH'] > 0 else False
+		self.clus_summary_tblname = cfg_dict['SQLITE']['clus_summary_tblname']
+		self.proj_summary_tblname = cfg_dict['SQLITE']['proj_summary_tblname']
+		self.plot_summary_tblname = cfg_dict['SQLITE']['plot_summary_tblname']
+		self.plot_tally_tblname = cfg_dict['SQLITE']['plot_tally_tblname']
+		self.compression = cfg_dict['PARQUET']['compression'] # eg. 'zstd' or 'snappy'
+		self.primary_grouping = os.path.splitext(os.path.basename(cfg_dict['SPC']['csv']))[0] # eg. 'SpeciesGroup'. this grouping is already in spc_comp_grp and spcomp_grp
+		self.output_parquet_folderpath = os.path.join(cfg_dict['OUTPUT']['outputfolderpath'], 'parquet')
+
+		# pyarrow modules. these will be assigned in import_pyarrow method.
+		self.pa = None
+		self.pq = None
+
+		self.logger.info("\n")
+		self.logger.info("--> Running To_parquet module")
+
+
+	def import_pyarrow(self):
+		"""pyarrow is only needed for this module, so it's imported here rather than at the top of the script.
+		returns False if pyarrow is not available.
+		"""
+		try:
+			import pyarrow, pyarrow.parquet
+		except ImportError:
+			self.logger.info("!!!! pyarrow is not installed. Parquet export will be skipped.")
+			return False
+		self.pa = pyarrow
+		self.pq = pyarrow.parquet
+
+		if not os.path.isdir(self.output_parquet_folderpath):
+			os.mkdir(self.output_parquet_folderpath)
+		return True
+
+
+	def tbl_2_dict(self):
+		"""Turns sqlite tables into list of dictionaries"""
+		self.plot_summary_dict_cc = common_functions.sqlite_2_dict(self.db_filepath, self.plot_summary_tblname + '_cc') if self.cc_exists else []
+		self.plot_summary_dict_sh = common_functions.sqlite_2_dict(self.db_filepath, self.plot_summary_tblname + '_sh') if self.sh_exists else []
+		self.plot_tally_dict = common_functions.sqlite_2_dict(self.db_filepath, self.plot_tally_tblname)
+		self.clus_summary_dict = common_functions.sqlite_2_dict(self.db_filepath, self.clus_summary_tblname)
+		self.proj_summary_dict = common_functions.sqlite_2_dict(self.db_filepath, self.proj_summary_tblname)
+
+
+	def write_table(self, columns, filename):
+		"""columns is a list of [column name, pyarrow type, list of values].
+		writes the columns to a parquet file in the parquet output folder.
+		"""
+		if len(columns) == 0 or len(columns[0][2]) == 0:
+			self.logger.info("!!!! Nothing to write to %s"%filename)
+			return
+		arrays = [self.pa.array(values, type=pa_type) for name, pa_type, values in columns]
+		names = [name for name, pa_type, values in columns]
+		table = self.pa.Table.from_arrays(arrays, names=names)
+
+		outputfile = os.path.join(self.output_parquet_folderpath, filename)
+		try:
+			self.pq.write_table(table, outputfile, compression=self.compression)
+			self.logger.info("%s rows have been written to %s"%(table.num_rows, filename))
+		except PermissionError:
+			self.logger.info("!!!!! Error - could not create %s. Check if the file is being used."%outputfile)
+
+
+	def plot_to_parquet(self):
+		"""Plot_Summary_cc and Plot_Summary_sh tables, typed.
+		plot_num, site_occupied and every species count column becomes an integer column.
+		"""
+		self.logger.info("Running plot_to_parquet method")
+		pa = self.pa
+		text_attr = ['proj_id', 'cluster_num', 'reason_for_unoccupancy']
+
+		for silvsys, plot_summary_dict in {'cc': self.plot_summary_dict_cc, 'sh': self.plot_summary_dict_sh}.items():
+			if len(plot_summary_dict) == 0:
+				continue
+			columns = []
+			for attr in plot_summary_dict[0].keys():
+				if attr in text_attr:
+					columns.append([attr, pa.string(), [rec[attr] for rec in plot_summary_dict]])
+				else:
+					columns.append([attr, pa.int32(), [to_int(rec[attr]) for rec in plot_summary_dict]])
+			self.write_table(columns, self.plot_summary_tblname + '_' + silvsys + '.parquet')
+
+
+	def tally_to_parquet(self):
+		"""plot_tally table (one row per cluster, plot, plot size and species. non-zero tallies only) typed."""
+		self.logger.info("Running tally_to_parquet method")
+		pa = self.pa
+		tally = self.plot_tally_dict
+
+		columns = [['proj_id', pa.string(), [rec['proj_id'] for rec in tally]],
+					['cluster_uid', pa.int64(), [to_int(rec['cluster_uid']) for rec in tally]],
+					['cluster_number', pa.string(), [rec['cluster_num'] for rec in tally]],
+					['silvsys', pa.string(), [rec['silvsys'] for rec in tally]],
+					['plot_num', pa.int8(), [to_int(rec['plot_num']) for rec in tally]],
+					['size_class_m2', pa.int8(), [to_int(rec['size_class']) for rec in tally]],
+					['spc', pa.string(), [rec['spc'] for rec in tally]],
+					['count', pa.int32(), [to_int(rec['count']) for rec in tally]]]
+		self.write_table(columns, 'Plot_Tally.parquet')
+
+
+	def clus_to_parquet(self):
+		"""Cluster_Summary table with numeric columns typed.
+		species composition (spc_comp, spc_comp_grp and their percentages) are flattened to Cluster_Spcomp.parquet.
+		the extra species groupings (if any) go to the same file with level = 'group:<grouping>'. eg. 'group:SpeciesGroup_short'
+		the rest of the nested fields (comments, photos, etc.) are kept as they are in the sqlite database.
+		"""
+		self.logger.info("Running clus_to_parquet method")
+		pa = self.pa
+		attr = self.clus_summary_attr
+		int_attr = [attr['c_clus_uid'], attr['c_num_trees']]
+		float_attr = [attr['c_eff_dens'], attr['c_site_occ'], attr['c_lat'], attr['c_lon']]
+		nested_spc_attr = [attr['c_spc_count'], attr['c_spc_comp'], attr['c_spc_comp_grp'], attr['c_spc_comp_perc'], attr['c_spc_comp_grp_perc'],
+							attr['c_spc_comp_by_grouping'], attr['c_spc_comp_perc_by_grouping']]
+
+		if len(self.clus_summary_dict) == 0:
+			self.logger.info("!!!! Cluster summary table is empty. Nothing to export.")
+			return
+
+		columns = []
+		for a in self.clus_summary_dict[0].keys():
+			if a in nested_spc_attr:
+				continue # these go to the long form tables
+			elif a in int_attr:
+				columns.append([a, pa.int64(), [to_int(rec[a]) for rec in self.clus_summary_dict]])
+			elif a in float_attr:
+				columns.append([a, pa.float64(), [to_float(rec[a]) for rec in self.clus_summary_dict]])
+			else:
+				columns.append([a, pa.string(), [str(rec[a]) for rec in self.clus_summary_dict]])
+		self.write_table(columns, self.clus_summary_tblname + '.parquet')
+
+		# species composition in long form
+		# eg. (uid, 'CC', 'P-1', '101', 'species', 'BF', 1, 12.5) and (uid, 'CC', 'P-1', '101', 'group', 'SX', 7, 87.5)
+		clus_uid_lst, silvsys_lst, proj_lst, clus_lst, level_lst, spc_lst, count_lst, perc_lst = [], [], [], [], [], [], [], []
+		for rec in self.clus_summary_dict:
+			levels = [['species', literal(rec[attr['c_spc_comp']], {}), literal(rec[attr['c_spc_comp_perc']], {})],
+						['group', literal(rec[attr['c_spc_comp_grp']], {}), literal(rec[attr['c_spc_comp_grp_perc']], {})]]
+			grouping_percs = literal(rec[attr['c_spc_comp_perc_by_grouping']], {})
+			for grouping, grouping_counts in literal(rec[attr['c_spc_comp_by_grouping']], {}).items():
+				if grouping != self.primary_grouping:
+					levels.append(['group:' + grouping, grouping_counts, grouping_percs.get(grouping, {})])
+			for level, counts, percs in levels:
+				for spc, count in counts.items():
+					clus_uid_lst.append(to_int(rec[attr['c_clus_uid']]))
+					silvsys_lst.append(rec[attr['c_silvsys']])
+					proj_lst.append(rec[attr['c_proj_id']])
+					clus_lst.append(rec[attr['c_clus_num']])
+					level_lst.append(level)
+					spc_lst.append(spc)
+					count_lst.append(count)
+					perc_lst.append(percs.get(spc))
+
+		columns = [['cluster_uid', pa.int64(), clus_uid_lst],
+					['silvsys', pa.string(), silvsys_lst],
+					['proj_id', pa.string(), proj_lst],
+					['cluster_number', pa.string(), clus_lst],
+					['level', pa.string(), level_lst],
+					['spc', pa.string(), spc_lst],
+					['count', pa.int32(), count_lst],
+					['percent', pa.float64(), perc_lst]]
+		self.write_table(columns, 'Cluster_Spcomp.parquet')
+
+
+	def proj_to_parquet(self):
+		"""Project_Summary table with numeric columns typed.
+		the site occupancy and effective density statistics are flattened to columns (eg. site_occupancy_mean, site_occupancy_ci, ...)
+		species composition statistics (spcomp, spcomp_grp and the extra species groupings) are flattened to Project_Spcomp.parquet.
+		"""
+		self.logger.info("Running proj_to_parquet method")
+		pa = self.pa
+		attr = self.proj_summary_attr
+		int_attr = [attr['p_num_clus'], attr['p_plot_size'], attr['p_num_clus_surv'], attr['p_num_cl_occupied']]
+		float_attr = [attr['p_area'], attr['p_lat'], attr['p_lon']]
+		stats_attr = [attr['p_effect_dens'], attr['p_so']]
+		nested_spc_attr = [attr['p_spc_data'], attr['p_spc_grp_data'], attr['p_spc'], attr['p_spc_grp'], attr['p_spc_grp_data_by_grouping'], attr['p_spc_grp_by_grouping']]
+		stats = ['mean', 'stdv', 'ci', 'upper_ci', 'lower_ci', 'n']
+		if self.cfg_dict['CALC']['bootstrap_ci'].upper() == 'TRUE':
+			stats += ['boot_lower_ci', 'boot_upper_ci'] # see bootstrap_projects method of analysis.py
+
+		columns = []
+		for a in self.proj_summary_dict[0].keys():
+			if a in nested_spc_attr:
+				continue # these go to the long form table
+			elif a in int_attr:
+				columns.append([a, pa.int32(), [to_int(rec[a]) for rec in self.proj_summary_dict]])
+			elif a in float_attr:
+				columns.append([a, pa.float64(), [to_float(rec[a]) for rec in self.proj_summary_dict]])
+			elif a == attr['p_is_complete']:
+				columns.append([a, pa.bool_(), [rec[a] == 'True' for rec in self.proj_summary_dict]])
+			elif a in stats_attr:
+				# eg. effective_density = "{'mean': 1979.1667, 'stdv': 1271.9428, ...}" -> effective_density_mean, effective_density_stdv, ...
+				parsed = [literal(rec[a], {}) for rec in self.proj_summary_dict]
+				for stat in stats:
+					pa_type = pa.int32() if stat == 'n' else pa.float64()
+					columns.append([a + '_' + stat, pa_type, [p.get(stat) for p in parsed]])
+			else:
+				columns.append([a, pa.string(), [str(rec[a]) for rec in self.proj_summary_dict]])
+		self.write_table(columns, self.proj_summary_tblname + '.parquet')
+
+		# species composition statistics in long form
+		# eg. ('P-1', 'species', 'BF', 7.06, 7.6229, 9.465, 16.525, -2.405, 5)
+		long_columns = {name: [] for name in ['proj_id', 'level', 'spc'] + stats}
+		for rec in self.proj_summary_dict:
+			levels = [['species', literal(rec[attr['p_spc']], {})], ['group', literal(rec[attr['p_spc_grp']], {})]]
+			for grouping, grouping_spcomp in literal(rec[attr['p_spc_grp_by_grouping']], {}).items():
+				if grouping != self.primary_grouping:
+					levels.append(['group:' + grouping, grouping_spcomp])
+			for level, spcomp in levels:
+				# spcomp eg. {'BF': {'mean': 7.06, 'stdv': 7.6229, ...}, 'CB':...}
+				for spc, spc_stats in spcomp.items():
+					long_columns['proj_id'].append(rec[attr['p_proj_id']])
+					long_columns['level'].append(level)
+					long_columns['spc'].append(spc)
+					for stat in stats:
+						long_columns[stat].append(spc_stats.get(stat))
+
+		columns = [[name, pa.string(), long_columns[name]] for name in ['proj_id', 'level', 'spc']]
+		columns += [[stat, pa.int32() if stat == 'n' else pa.float64(), long_columns[stat]] for stat in stats]
+		self.write_table(columns, 'Project_Spcomp.parquet')
+
+
+	def run_all(self):
+		if not self.import_pyarrow():
+			return
+		self.tbl_2_dict()
+		self.plot_to_parquet()
+		self.tally_to_parquet()
+		self.clus_to_parquet()
+		self.proj_to_parquet()
+
+##############    End of class "To_parquet"   ######################
+
+
+
+def literal(repr_str, default):
+	"""turns the repr string stored in the sqlite database back into a python object.
+	eg. "{'BF': 1, 'SB': 7}" -> {'BF': 1, 'SB': 7}
+	returns the default if the string is empty or cannot be parsed.
+	"""
+	try:
+		value = ast.literal_eval(repr_str)
+	except (ValueError, SyntaxError):
+		return default
+	return default if value in ['', None] else value
+
+
+def to_int(value):
+	"""'3' -> 3, '' -> None"""
+	try:
+		return int(float(value))
+	except (ValueError, TypeError):
+		return None
+
+
+def to_float(value):
+	"""'0.875' -> 0.875, '' -> None"""
+	try:
+		return float(value)
+	except (ValueError, TypeError):
+		return None
+
+
+
+
+if __name__ == '__main__':
+	print(literal("{'P1': [{'BW': 2, 'SW': 1}, {}], 'P2': None}", {}))
+	print(to_int('3'), to_int(''), to_float('0.875'), to_float(''))
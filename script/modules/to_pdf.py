@@ -0,0 +1,310 @@
+# this module comes after analysis.py module.
+# the purpose of this module is to render a printable assessment report (pdf) for each active project.
+# the report has the same content as the project's html page made by to_browsers.py -
+# project summary, SFL's assessment, SPCOMP, Site Occupancy and Effective Density, ecosite, processed data of each cluster and the photos (as thumbnails).
+# the projects are rendered in a process pool, and a project is skipped if its content (hash) hasn't changed since its report was rendered.
+# the project's html page links to its report (see to_browsers.py).
+# this module needs reportlab (and pillow for the thumbnails). If reportlab is not installed, this step is skipped (with a warning in the log).
+
+import os, json, hashlib, sqlite3, concurrent.futures
+
+# importing custom modules
+if __name__ == '__main__':
+	import common_functions
+else:
+	from modules import common_functions
+
+
+# change this when the layout of the report changes, so that all the reports are re-rendered
+LAYOUT_VERSION = '1'
+THUMBNAIL_SIZE = 240 # pixels (longest side)
+MAX_TABLE_COLUMNS = 12 # wide species tables are split into several tables of up to this many species
+
+
+
+class To_pdf:
+	def __init__(self, cfg_dict, db_filepath, logger):
+		self.db_filepath = db_filepath
+		self.logger = logger
+		self.clus_summary_tblname = cfg_dict['SQLITE']['clus_summary_tblname']
+		self.proj_summary_tblname = cfg_dict['SQLITE']['proj_summary_tblname']
+		self.proj_clus_tblname = cfg_dict['SQLITE']['proj_clus_tblname']
+		self.primary_grouping = os.path.splitext(os.path.basename(cfg_dict['SPC']['csv']))[0] # eg. 'SpeciesGroup'
+		self.workers = int(cfg_dict['PDF']['workers']) # 0 = number of cpus
+		self.proj_report_folder = proj_report_folder(cfg_dict)
+		self.hash_file = os.path.join(self.proj_report_folder, '_pdf_hashes.json') # eg. {'P-1': 'a94a8fe5cc...', 'P-2': ...}
+
+		self.logger.info("\n")
+		self.logger.info("--> Running to_pdf module")
+
+
+	def check_reportlab(self):
+		"""reportlab is only needed for this module (and imported by render_proj_report). returns False if reportlab is not available."""
+		try:
+			import reportlab
+		except ImportError:
+			self.logger.info("!!!! reportlab is not installed. PDF reports will be skipped.")
+			return False
+		return True
+
+
+	def render_reports(self):
+		if not os.path.isdir(self.proj_report_folder):
+			os.makedirs(self.proj_report_folder)
+		try:
+			with open(self.hash_file) as f:
+				old_hashes = json.load(f)
+		except (OSError, ValueError):
+			old_hashes = {}
+
+		con = sqlite3.connect(self.db_filepath)
+		active_projs = [row[0] for row in con.execute("SELECT proj_id FROM %s WHERE CAST(num_clusters_surveyed AS INTEGER) > 0 ORDER BY rowid"%self.proj_summary_tblname)]
+		con.close()
+		self.logger.info("Rendering the reports of %s projects to %s"%(len(active_projs), self.proj_report_folder))
+
+		# one task per project. eg. [db_filepath, 'Cluster_Summary', 'Project_Summary', 'project_cluster_detail', 'SpeciesGroup', 'P-1', 'C:\\RAP\\pdf\\p_P_1.pdf', 'a94a8fe5cc...']
+		tasks = []
+		for proj in active_projs:
+			pdf_filepath = os.path.join(self.proj_report_folder, create_pdf_filename(proj))
+			tasks.append([self.db_filepath, self.clus_summary_tblname, self.proj_summary_tblname, self.proj_clus_tblname, self.primary_grouping,
+						proj, pdf_filepath, old_hashes.get(proj)])
+
+		workers = self.workers if self.workers > 0 else os.cpu_count()
+		if workers > 1 and len(tasks) > 1:
+			with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+				results = list(executor.map(render_proj_report, tasks))
+		else:
+			results = [render_proj_report(task) for task in tasks]
+
+		new_hashes = {}
+		num_rendered = 0
+		for proj, content_hash, rendered, error in results:
+			if error != None:
+				self.logger.info("!!!!! Error - could not render the report of %s: %s"%(proj, error))
+				continue
+			new_hashes[proj] = content_hash
+			num_rendered += rendered
+		with open(self.hash_file, 'w') as f:
+			json.dump(new_hashes, f, indent=1)
+		self.logger.info("%s reports rendered, %s unchanged projects skipped"%(num_rendered, len(new_hashes) - num_rendered))
+
+
+	def run_all(self):
+		if not self.check_reportlab():
+			return
+		self.render_reports()
+
+##############    End of class "To_pdf"   ######################
+
+
+
+def proj_report_folder(cfg_dict):
+	"""the reports go to [PDF] proj_report_folder if it's given. otherwise to the output folder's pdf folder.
+	note that the output folder is deleted at the start of every run, so the unchanged projects are only skipped if proj_report_folder is given."""
+	folder = cfg_dict['PDF']['proj_report_folder'].strip()
+	return folder if folder != '' else os.path.join(cfg_dict['OUTPUT']['outputfolderpath'], 'pdf')
+
+
+def create_pdf_filename(projectID):
+	"""eg. 'P-1' -> 'p_P_1.pdf' (same as the project's html page, p_P_1.html)"""
+	return 'p_' + common_functions.no_special_char(projectID) + '.pdf'
+
+
+def render_proj_report(task):
+	"""
+	renders the report of a project (runs in a separate process, so the data is read from the sqlite database here).
+	task = [db_filepath, clus_summary_tblname, proj_summary_tblname, proj_clus_tblname, primary_grouping, proj_id, pdf_filepath, old_hash]
+	returns [proj_id, content_hash, True if rendered (False if skipped), None or the error message]
+	"""
+	db_filepath, clus_summary_tblname, proj_summary_tblname, proj_clus_tblname, primary_grouping, proj, pdf_filepath, old_hash = task
+
+	con = sqlite3.connect(db_filepath)
+	con.row_factory = sqlite3.Row
+	proj_rec = dict(con.execute("SELECT * FROM %s WHERE proj_id = ?"%proj_summary_tblname, (proj,)).fetchone())
+	spc_list = sorted(['_'+ spcname for spcname in eval(proj_rec['species_found'])]) # ['_AB', '_CE', '_OR', '_PT', '_PW', '_SB', '_SW']
+	columns = ['Cluster_Num', 'Site_Occ', 'Ef_Density', 'Moisture', 'Silvsys'] + spc_list
+	proj_clus_rows = [list(row) for row in con.execute("SELECT %s FROM %s WHERE proj_id = ? ORDER BY rowid"%(','.join(columns), proj_clus_tblname), (proj,))]
+	clus_recs = [dict(row) for row in con.execute("SELECT cluster_number, cluster_comments, local_sync_photopath FROM %s WHERE proj_id = ? ORDER BY rowid"%clus_summary_tblname, (proj,))]
+	con.close()
+
+	# photos of each cluster sorted by cluster number. eg. [['C101 P1 photo. some comments', 'C:\\...\\P-1_C101_P1_8e67_2021-10-28.jpg'],...]
+	photos = []
+	for clus_num in common_functions.sort_integers(list(set([rec['cluster_number'] for rec in clus_recs]))):
+		for rec in clus_recs:
+			if rec['cluster_number'] == clus_num:
+				clus_comments = eval(rec['cluster_comments']) # eg. {'cluster': '', 'ecosite': '', 'P1': '', 'P2': '', 'P3': '', ... 'P8': ''}
+				for location, path_lst in eval(rec['local_sync_photopath']).items():
+					for path in path_lst:
+						photos.append(["C%s %s photo. %s"%(clus_num, location, clus_comments.get(location, '')), path])
+	# a photo that's been replaced (same name, different file) should change the hash too
+	photo_stats = []
+	for desc, path in photos:
+		try:
+			stat = os.stat(path)
+			photo_stats.append([path, stat.st_size, stat.st_mtime])
+		except OSError:
+			photo_stats.append([path, None, None])
+
+	# the hash of everything that goes into the report. the list fields of Project_Summary are sorted by summarize_project, so the same data always gives the same text
+	content_hash = hashlib.sha1(repr([LAYOUT_VERSION, primary_grouping, sorted(proj_rec.items()), columns, proj_clus_rows, photos, photo_stats]).encode()).hexdigest()
+	if content_hash == old_hash and os.path.isfile(pdf_filepath):
+		return [proj, content_hash, False, None]
+
+	try:
+		from reportlab.lib import colors
+		from reportlab.lib.pagesizes import letter, landscape
+		from reportlab.lib.styles import getSampleStyleSheet
+		from reportlab.lib.units import inch
+		from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+		from xml.sax.saxutils import escape
+
+		styles = getSampleStyleSheet()
+		small = styles['BodyText'].clone('small', fontSize = 7, leading = 8)
+		table_style = TableStyle([('FONTSIZE', (0,0), (-1,-1), 7), ('GRID', (0,0), (-1,-1), 0.25, colors.grey),
+								('BACKGROUND', (0,0), (-1,0), colors.lightgrey), ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+								('FONTNAME', (0,0), (0,-1), 'Helvetica-Bold')])
+		story = []
+
+		def add_table(title, rows):
+			if title != None:
+				story.append(Paragraph('<b>%s</b>'%escape(title), styles['BodyText']))
+			table = Table([[str(v) if v != None else '' for v in row] for row in rows], hAlign = 'LEFT', repeatRows = 1)
+			table.setStyle(table_style)
+			story.append(table)
+			story.append(Spacer(1, 0.15*inch))
+
+		def add_stats_table(stats_dict, title):
+			# same as spcomp_to_html_table in to_browsers.py. stats_dict eg. {'BF': {'mean': 7.06, 'stdv': 7.6229, 'ci': 9.465, ...}, 'CB':...}
+			spc_lst = sorted(stats_dict.keys())
+			if len(spc_lst) == 0 or len(stats_dict[spc_lst[0]]) == 0:
+				story.append(Paragraph('Not enough data to evaluate species composition', styles['BodyText']))
+				return False
+			stat_names = list(stats_dict[spc_lst[0]].keys()) # ['mean','stdv','ci','upper_ci',...]
+			for i in range(0, len(spc_lst), MAX_TABLE_COLUMNS):
+				chunk = spc_lst[i:i + MAX_TABLE_COLUMNS]
+				rows = [[''] + chunk]
+				for stat in stat_names:
+					rows.append([stat] + [round(stats_dict[spc][stat], 1) if stat == 'mean' else stats_dict[spc][stat] for spc in chunk])
+				add_table(title if i == 0 else None, rows)
+			return True
+
+		# title and project summary
+		story.append(Paragraph('Regeneration Assessment - %s'%escape(proj), styles['Title']))
+		story.append(Paragraph('Rendered: %s'%common_functions.datetime_readable(), small))
+		story.append(Spacer(1, 0.1*inch))
+		assessors = ', '.join(eval(proj_rec['assessors']))
+		comments = ['C%s %s: %s'%(clus, location, comment) for clus, clus_comments in sorted(eval(proj_rec['all_comments']).items())
+					for location, comment in clus_comments.items() if comment != '']
+		summary_rows = [['Project ID:', proj], ['Clusters Surveyed:', '%s of %s'%(proj_rec['num_clusters_surveyed'], proj_rec['num_clusters_total'])],
+						['Project Location (lat, lon):', '%s, %s'%(proj_rec['lat'], proj_rec['lon'])], ['Project Area:', '%s ha'%proj_rec['area_ha']],
+						['District / FMU:', '%s / %s'%(proj_rec['spatial_MNRF_district'], proj_rec['spatial_FMU'])], ['Silvicultural System:', proj_rec['silvsys']],
+						['Date First Surveyed:', proj_rec['assess_start_date']], ['Date Last Surveyed:', proj_rec['assess_last_date']], ['Surveyed by:', assessors]]
+		table = Table(summary_rows, hAlign = 'LEFT')
+		table.setStyle(TableStyle([('FONTSIZE', (0,0), (-1,-1), 8), ('FONTNAME', (0,0), (0,-1), 'Helvetica-Bold')]))
+		story.append(table)
+		if len(comments) > 0:
+			story.append(Paragraph('<b>Comments:</b> ' + escape('; '.join(comments)), small))
+		story.append(Spacer(1, 0.15*inch))
+
+		# SFL's assessment
+		add_table("SFL's Assessment", [['SFL Assessment Year', 'SFL SPCOMP', 'SFL Site Occ', 'SFL Forest Unit', 'SFL Effective Density'],
+					[proj_rec['sfl_as_yr'], proj_rec['sfl_spcomp'], proj_rec['sfl_so'], proj_rec['sfl_fu'], proj_rec['sfl_effden']]])
+
+		# MNRF assessment - SPCOMP, SPCOMP (grouped) and the extra groupings
+		if add_stats_table(eval(proj_rec['spcomp']), 'MNRF SPCOMP'):
+			add_stats_table(eval(proj_rec['spcomp_grp']), 'MNRF SPCOMP (grouped)')
+			for grouping, spcomp_grp in eval(proj_rec['spcomp_by_grouping']).items():
+				if grouping != primary_grouping:
+					add_stats_table(spcomp_grp, 'MNRF SPCOMP (grouped - %s)'%grouping)
+
+		# Site occupancy and effective density
+		so = eval(proj_rec['site_occupancy']) # eg. {'mean': 0.7708, 'stdv': 0.3826, 'ci': 0.4015, 'upper_ci': 1.1723, 'lower_ci': 0.3693, 'n': 6, 'confidence': 0.95}
+		ed = eval(proj_rec['effective_density'])
+		if len(so) == 0 or len(ed) == 0:
+			story.append(Paragraph('Not enough data to evaluate Site Occupancy and Effective Density', styles['BodyText']))
+		else:
+			add_table('MNRF Site Occupancy and Effective Density', [['', 'Site Occupancy', 'Effective Density']] + [[stat, so[stat], ed.get(stat)] for stat in so.keys()])
+
+		# Ecosite moisture
+		ecosite = eval(proj_rec['ecosite_moisture']) # eg. {'fresh': 66.7, 'moist': 16.7, 'dry': 16.7}
+		if len(ecosite) == 0:
+			story.append(Paragraph('Ecosite has not been evaluated', styles['BodyText']))
+		else:
+			add_table('MNRF Ecosite Moisture', [list(ecosite.keys()), ['%s %%'%v for v in ecosite.values()]])
+
+		# Processed data (project_cluster_detail) - the species columns are split like the species tables
+		fixed_columns = columns[:5]
+		for i in range(0, max(len(spc_list), 1), MAX_TABLE_COLUMNS):
+			chunk_index = [columns.index(spc) for spc in spc_list[i:i + MAX_TABLE_COLUMNS]]
+			rows = [fixed_columns + [columns[j] for j in chunk_index]]
+			rows += [row[:5] + [row[j] for j in chunk_index] for row in proj_clus_rows]
+			add_table('Processed Data' if i == 0 else None, rows)
+
+		# Photos - thumbnails, 4 per row
+		story.append(Paragraph('<b>Pictures</b>', styles['BodyText']))
+		cells = []
+		for desc, path in photos:
+			thumbnail = make_thumbnail(path)
+			if thumbnail == None:
+				cells.append(Paragraph(escape(desc) + ' (photo not found)', small))
+			else:
+				cells.append([thumbnail, Paragraph(escape(desc), small)])
+		if len(cells) == 0:
+			story.append(Paragraph('No photos were taken.', styles['BodyText']))
+		else:
+			cells += [''] * (-len(cells) % 4)
+			photo_table = Table([cells[i:i + 4] for i in range(0, len(cells), 4)], colWidths = [2.4*inch]*4, hAlign = 'LEFT')
+			photo_table.setStyle(TableStyle([('VALIGN', (0,0), (-1,-1), 'TOP')]))
+			story.append(photo_table)
+
+		# save to a temporary file first, so a half written report never replaces the previous one
+		tmp_filepath = pdf_filepath + '.tmp'
+		doc = SimpleDocTemplate(tmp_filepath, pagesize = landscape(letter), title = 'RAP - %s'%proj,
+								leftMargin = 0.5*inch, rightMargin = 0.5*inch, topMargin = 0.5*inch, bottomMargin = 0.5*inch)
+		doc.build(story)
+		os.replace(tmp_filepath, pdf_filepath)
+	except Exception as e:
+		return [proj, content_hash, False, repr(e)]
+	return [proj, content_hash, True, None]
+
+
+def make_thumbnail(path):
+	"""returns a reportlab Image of the photo shrunk to THUMBNAIL_SIZE pixels (the full size photos would make the pdf too big).
+	returns None if the photo cannot be read."""
+	import io
+	from reportlab.lib.units import inch
+	from reportlab.platypus import Image
+	try:
+		from PIL import Image as PIL_Image
+		img = PIL_Image.open(path)
+		img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+		buffer = io.BytesIO()
+		img.convert('RGB').save(buffer, 'JPEG', quality = 80)
+		buffer.seek(0)
+		width, height = img.size
+	except (ImportError, OSError):
+		return None
+	scale = 2.2*inch / max(width, height)
+	return Image(buffer, width = width*scale, height = height*scale)
+
+
+
+
+
+# testing
+if __name__ == '__main__':
+	import argparse, log
+
+	parser = argparse.ArgumentParser(description='Render the project pdf reports from the sqlite database of a previous RAP run.')
+	parser.add_argument('db_filepath', help='sqlite database of a previous RAP run. eg. C:\\TEMP\\RAP2021_output3\\sqlite\\RAP_211121081100.sqlite')
+	parser.add_argument('--cfg', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RAP.cfg'), help='config file')
+	args = parser.parse_args()
+
+	cfg_dict = common_functions.cfg_to_dict(args.cfg)
+	if cfg_dict['PDF']['proj_report_folder'].strip() == '':
+		# the reports go next to the sqlite database's folder (eg. RAP2021_output3\pdf)
+		cfg_dict['OUTPUT']['outputfolderpath'] = os.path.dirname(os.path.dirname(os.path.abspath(args.db_filepath)))
+	logfile = os.path.basename(__file__) + '_deleteMeLater.txt'
+	logger = log.logger(logfile, debug = True)
+	topdf = To_pdf(cfg_dict, args.db_filepath, logger)
+	topdf.run_all()
@@ -0,0 +1,166 @@
+# the terraflex survey forms arrive as very wide records - one column for each plot and species entry
+# (UnoccupiedPlot1..8, Species1..6SpeciesNamePlot1..8, Species1..6NumberofTreesPlot1..8 and so on).
+# this module comes right after csv2sqlite.py and normalizes the clearcut and shelterwood survey tables into two long tables:
+#	plot_obs - one record per plot of each cluster survey
+#		(silvsys, survey_uid, plot, unoccupied, reason, comments, photos)
+#	tree_tally - one record per species entry (Species1..Species4 for clearcut, Species1..Species6 for shelterwood) of each plot
+#		(silvsys, survey_uid, plot, slot, size_class, spc_name, spc_code, is_valid, count)
+#		size_class is 8 (8m2 plot) or 16 (shelterwood species 4~6 are for the 16m2 plot). spc_code and is_valid come from species.py.
+#		entries with neither a species nor a number of trees are left out. count is as entered (a whole number if it was entered as one)
+# survey_uid is the unique_id of the survey table the plot came from (silvsys 'CC' = clearcut, 'SH' = shelterwood).
+# the survey tables are read once, in batches, and the records of both tables are written with executemany as they are read.
+
+import sqlite3
+
+# importing custom modules
+if __name__ == '__main__':
+	import common_functions
+else:
+	from modules import common_functions
+
+
+
+class Unpivot:
+	def __init__(self, cfg_dict, db_filepath, tablenames_n_rec_count, spc_registry, logger):
+		self.db_filepath = db_filepath
+		self.logger = logger
+		self.spc_registry = spc_registry # species.Species_registry instance
+		self.tablenames_n_rec_count = tablenames_n_rec_count # eg. {'Clearcut_Survey_v2021': [['ProjectID02', 'Date', ...],2], 'Shelterwood_Survey_v2021': [[...],2]}
+		self.survey_tbls = {'CC': 'Clearcut_Survey_v2021', 'SH': 'Shelterwood_Survey_v2021'} # same table names determine_project_id.py expects
+		self.num_of_spc = {'CC': 4, 'SH': 6} # number of species entries per plot in each form
+		self.num_of_plots = int(cfg_dict['CALC']['num_of_plots'])
+		self.unique_id = cfg_dict['SQLITE']['unique_id_fieldname']
+		self.plot_obs_tblname = cfg_dict['SQLITE']['plot_obs_tblname']
+		self.tree_tally_tblname = cfg_dict['SQLITE']['tree_tally_tblname']
+		self.plot_obs_indexes = [('silvsys', 'survey_uid', 'plot')]
+		self.tree_tally_indexes = [('silvsys', 'survey_uid', 'plot'), 'spc_code']
+		self.batch_size = 500 # number of survey records read (and unpivoted) at a time
+		self.spc_lookup = {} # species label to [spc_code, is_valid] eg. {'Bf (fir, balsam)': ['BF', 1], '': [None, 0]}
+
+		self.logger.info("\n")
+		self.logger.info("--> Running unpivot module")
+
+
+	def initiate_connection(self):
+		self.con = sqlite3.connect(self.db_filepath)
+		self.cur = self.con.cursor()
+
+
+	def create_tables(self):
+		self.logger.debug("running create_tables method")
+		self.cur.execute("DROP TABLE IF EXISTS %s"%self.plot_obs_tblname)
+		self.cur.execute("DROP TABLE IF EXISTS %s"%self.tree_tally_tblname)
+		self.cur.execute("""CREATE TABLE %s (silvsys TEXT, survey_uid INTEGER, plot INTEGER, unoccupied TEXT, reason TEXT,
+						comments TEXT, photos TEXT)"""%self.plot_obs_tblname)
+		self.cur.execute("""CREATE TABLE %s (silvsys TEXT, survey_uid INTEGER, plot INTEGER, slot INTEGER, size_class INTEGER,
+						spc_name TEXT, spc_code TEXT, is_valid INTEGER, count INTEGER)"""%self.tree_tally_tblname)
+
+
+	def spc_code(self, spc_name):
+		"""returns [spc_code, is_valid] of the species label. eg. 'Bf (fir, balsam)' -> ['BF', 1]. each label goes through the species registry only once"""
+		if spc_name not in self.spc_lookup:
+			spc_code = self.spc_registry.code(spc_name) # eg. 'Bf (fir, balsam)' -> 'BF', '' -> None
+			self.spc_lookup[spc_name] = [spc_code, 1 if spc_code != None and self.spc_registry.is_valid(spc_code) else 0]
+		return self.spc_lookup[spc_name]
+
+
+	def unpivot_table(self, silvsys, tbl_name):
+		"""reads the survey table in batches and writes its plot_obs and tree_tally records. returns [number of plots, number of tree_tally records]"""
+		num_of_spc = self.num_of_spc[silvsys]
+		# the columns of each plot, in this order: eg. ['UnoccupiedPlot1', 'UnoccupiedreasonPlot1', 'CommentsPlot1', 'PhotosPlot1',
+		# 'Species1SpeciesNamePlot1', 'Species1NumberofTreesPlot1', 'Species2SpeciesNamePlot1', ...]
+		plot_cols = []
+		for i in range(1, self.num_of_plots + 1):
+			plot_cols += ['UnoccupiedPlot%s'%i, 'UnoccupiedreasonPlot%s'%i, 'CommentsPlot%s'%i, 'PhotosPlot%s'%i]
+			for slot in range(1, num_of_spc + 1):
+				plot_cols += ['Species%sSpeciesNamePlot%s'%(slot, i), 'Species%sNumberofTreesPlot%s'%(slot, i)]
+		width = 4 + 2*num_of_spc # number of columns of each plot
+		size_classes = [16 if silvsys == 'SH' and slot > 3 else 8 for slot in range(1, num_of_spc + 1)] # shelterwood species 4~6 are for the 16m2 plot
+
+		plot_sql = "INSERT INTO %s VALUES (?,?,?,?,?,?,?)"%self.plot_obs_tblname
+		tally_sql = "INSERT INTO %s VALUES (?,?,?,?,?,?,?,?,?)"%self.tree_tally_tblname
+		read_cur = self.con.cursor()
+		read_cur.execute("SELECT %s, %s FROM %s ORDER BY %s"%(self.unique_id, ','.join(plot_cols), tbl_name, self.unique_id))
+		num_plots, num_trees = 0, 0
+		while True:
+			rows = read_cur.fetchmany(self.batch_size)
+			if len(rows) == 0:
+				break
+			plot_rows, tally_rows = [], []
+			for row in rows:
+				survey_uid = row[0]
+				for i in range(self.num_of_plots):
+					start = 1 + i*width # index of UnoccupiedPlotX
+					plot_rows.append([silvsys, survey_uid, i+1] + list(row[start:start+4]))
+					for slot in range(num_of_spc):
+						spc_name = row[start + 4 + 2*slot]
+						count = row[start + 5 + 2*slot]
+						spc_name = '' if spc_name == None else spc_name
+						count = '' if count == None else str(count).strip()
+						if spc_name == '' and count == '':
+							continue
+						spc_code, is_valid = self.spc_code(spc_name)
+						tally_rows.append([silvsys, survey_uid, i+1, slot+1, size_classes[slot], spc_name, spc_code, is_valid, None if count == '' else count])
+			self.cur.executemany(plot_sql, plot_rows)
+			self.cur.executemany(tally_sql, tally_rows)
+			num_plots += len(plot_rows)
+			num_trees += len(tally_rows)
+		return [num_plots, num_trees]
+
+
+	def unpivot_survey(self):
+		self.logger.debug("running unpivot_survey method")
+		for silvsys, tbl_name in self.survey_tbls.items():
+			if tbl_name not in self.tablenames_n_rec_count:
+				self.logger.info("!!!! %s is not in the sqlite database. Nothing to unpivot."%tbl_name)
+				continue
+			num_plots, num_trees = self.unpivot_table(silvsys, tbl_name)
+			self.logger.info("%s: %s plots written to %s and %s species entries written to %s"%(tbl_name, num_plots, self.plot_obs_tblname,
+							num_trees, self.tree_tally_tblname))
+		self.con.commit()
+
+
+	def close_connection(self):
+		self.con.close()
+
+
+	def create_indexes(self):
+		common_functions.create_indexes(self.db_filepath, self.plot_obs_tblname, self.plot_obs_indexes, self.logger)
+		common_functions.create_indexes(self.db_filepath, self.tree_tally_tblname, self.tree_tally_indexes, self.logger)
+
+
+	def run_all(self):
+		self.initiate_connection()
+		self.create_tables()
+		self.unpivot_survey()
+		self.close_connection()
+		self.create_indexes()
+
+##############    End of class "Unpivot"   ######################
+
+
+
+
+
+# testing
+if __name__ == '__main__':
+	import os, sys, argparse, log
+	sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+	from modules import species # species.py imports common_functions from the modules package when it's not run on its own
+
+	parser = argparse.ArgumentParser(description='Unpivot the survey tables of the sqlite database of a previous RAP run into plot_obs and tree_tally.')
+	parser.add_argument('db_filepath', help='sqlite database of a previous RAP run. eg. C:\\TEMP\\RAP2021_output3\\sqlite\\RAP_211121081100.sqlite')
+	parser.add_argument('--cfg', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RAP.cfg'), help='config file')
+	args = parser.parse_args()
+
+	cfg_dict = common_functions.cfg_to_dict(args.cfg)
+	cfg_folder = os.path.dirname(os.path.abspath(args.cfg))
+	spc_registry = species.Species_registry(os.path.join(cfg_folder, cfg_dict['SPC']['csv']),
+		[os.path.join(cfg_folder, f.strip()) for f in cfg_dict['SPC']['extra_csv'].split(',') if f.strip() != ''])
+	logfile = os.path.basename(__file__) + '_deleteMeLater.txt'
+	logger = log.logger(logfile, debug = True)
+	con = sqlite3.connect(args.db_filepath)
+	tablenames_n_rec_count = {row[0]: [[], None] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+	con.close()
+	up = Unpivot(cfg_dict, args.db_filepath, tablenames_n_rec_count, spc_registry, logger)
+	up.run_all()
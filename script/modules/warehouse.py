@@ -0,0 +1,154 @@
+# this module comes after analysis.py module.
+# every run writes a brand new RAP_<yymmddhhmmss>.sqlite file and the previous output folder gets deleted.
+# the purpose of this module is to copy (upsert) each run's plot, cluster and project summaries into a persistent warehouse database
+# that sits outside the output folder, so that the results of several seasons (and several runs within a season) can be queried together.
+# each record in the warehouse carries the season (eg. 2021) and the run_id (eg. RAP_210923141503 - the name of the run's sqlite file).
+# latest_... views show the records of the latest run of each season.
+
+import sqlite3, os
+
+# importing custom modules
+if __name__ == '__main__':
+	import common_functions
+else:
+	from modules import common_functions
+
+
+
+class Warehouse:
+	def __init__(self, cfg_dict, db_filepath, logger):
+		self.db_filepath = db_filepath
+		self.logger = logger
+		self.warehouse_db = cfg_dict['WAREHOUSE']['warehouse_db'] # eg. C:\RAP\warehouse\RAP_warehouse.sqlite
+		self.season = cfg_dict['WAREHOUSE']['season'] # eg. 2021
+		self.run_id = os.path.splitext(os.path.basename(db_filepath))[0] # eg. RAP_210923141503
+		self.runs_tblname = 'runs'
+
+		# tables to be copied over to the warehouse and their keys (within a season and run_id)
+		clus_summary_tblname = cfg_dict['SQLITE']['clus_summary_tblname']
+		proj_summary_tblname = cfg_dict['SQLITE']['proj_summary_tblname']
+		plot_summary_tblname = cfg_dict['SQLITE']['plot_summary_tblname']
+		plot_tally_tblname = cfg_dict['SQLITE']['plot_tally_tblname']
+		self.tables = {clus_summary_tblname: ['silvsys', 'cluster_uid'],
+						proj_summary_tblname: ['proj_id'],
+						plot_summary_tblname: ['silvsys', 'cluster_uid', 'plot_num'],
+						plot_tally_tblname: ['silvsys', 'cluster_uid', 'plot_num', 'size_class', 'spc']}
+
+		# indexes for cross-season queries. eg. SELECT * FROM Project_Summary WHERE proj_id = ? ORDER BY season
+		self.indexes = {clus_summary_tblname: ['run_id', 'proj_id', ('proj_id', 'cluster_number')],
+						proj_summary_tblname: ['run_id', 'proj_id'],
+						plot_summary_tblname: ['run_id', 'proj_id'],
+						plot_tally_tblname: ['run_id', 'proj_id', 'spc']}
+
+		self.con = None
+		self.cur = None
+
+		self.logger.info("\n")
+		self.logger.info("--> Running warehouse module")
+
+
+	def initiate_connection(self):
+		"""connects to the warehouse database (a new one will be created if it doesn't exist) and attaches this run's database as 'run'"""
+		self.logger.info("Warehouse database: %s"%self.warehouse_db)
+		warehouse_folder = os.path.dirname(os.path.abspath(self.warehouse_db))
+		if not os.path.isdir(warehouse_folder):
+			os.makedirs(warehouse_folder)
+		self.con = sqlite3.connect(self.warehouse_db)
+		self.cur = self.con.cursor()
+		self.cur.execute("ATTACH DATABASE ? AS run", (self.db_filepath,))
+
+
+	def close_connection(self):
+		self.con.commit()
+		self.cur.execute("DETACH DATABASE run")
+		self.con.close()
+		self.logger.debug("Closed connection with the warehouse database")
+
+
+	def record_run(self):
+		"""adds this run to the runs table. eg. ('2021', 'RAP_210923141503', <path to RAP_210923141503.sqlite>, 'Sep 23, 2021. 02:15 PM')"""
+		self.cur.execute("CREATE TABLE IF NOT EXISTS %s (season, run_id, db_filepath, run_time, PRIMARY KEY (season, run_id))"%self.runs_tblname)
+		self.cur.execute("INSERT OR REPLACE INTO %s VALUES (?,?,?,?)"%self.runs_tblname,
+			(self.season, self.run_id, self.db_filepath, common_functions.datetime_readable()))
+		self.logger.info("Season: %s, Run ID: %s"%(self.season, self.run_id))
+
+
+	def upsert_tables(self):
+		"""copies each table from this run's database to the warehouse database.
+		the warehouse table is created on the first run, and any attribute that's new in this run is added to the warehouse table.
+		records of the same season and run_id are replaced.
+		"""
+		for tablename, keys in self.tables.items():
+			run_attrs = [row[1] for row in self.cur.execute("PRAGMA run.table_info(%s)"%tablename)]
+			if len(run_attrs) == 0:
+				self.logger.info("!!!! %s not found in %s. Skipping."%(tablename, self.db_filepath))
+				continue
+
+			wh_attrs = [row[1] for row in self.cur.execute("PRAGMA main.table_info(%s)"%tablename)]
+			if len(wh_attrs) == 0:
+				# eg. CREATE TABLE main.Project_Summary (season,run_id,proj_id,..., PRIMARY KEY (season,run_id,proj_id))
+				sql = "CREATE TABLE main.%s (%s, PRIMARY KEY (%s))"%(tablename, ','.join(['season', 'run_id'] + run_attrs), ','.join(['season', 'run_id'] + keys))
+				self.logger.debug(sql)
+				self.cur.execute(sql)
+			else:
+				# the attributes may change from season to season
+				for attr in run_attrs:
+					if attr not in wh_attrs:
+						self.logger.info("Adding %s attribute to the warehouse's %s table"%(attr, tablename))
+						self.cur.execute("ALTER TABLE main.%s ADD COLUMN %s"%(tablename, attr))
+
+			self.cur.execute("DELETE FROM main.%s WHERE season = ? AND run_id = ?"%tablename, (self.season, self.run_id))
+			sql = "INSERT OR REPLACE INTO main.%s (season,run_id,%s) SELECT ?,?,%s FROM run.%s"%(tablename, ','.join(run_attrs), ','.join(run_attrs), tablename)
+			self.logger.debug(sql)
+			self.cur.execute(sql, (self.season, self.run_id))
+			self.logger.info("%s records of %s have been written to the warehouse"%(self.cur.rowcount, tablename))
+		self.con.commit()
+
+
+	def create_views(self):
+		"""create latest_... views. eg. latest_Project_Summary shows the Project_Summary records of the latest run of each season."""
+		for tablename in self.tables.keys():
+			if len(list(self.cur.execute("PRAGMA main.table_info(%s)"%tablename))) == 0:
+				continue
+			# the run_id is RAP_yymmddhhmmss, so the largest run_id of a season is the latest run of that season
+			self.cur.execute("""CREATE VIEW IF NOT EXISTS main.latest_%s AS SELECT * FROM main.%s
+				WHERE run_id IN (SELECT MAX(run_id) FROM main.%s GROUP BY season)"""%(tablename, tablename, self.runs_tblname))
+
+
+	def create_warehouse_indexes(self):
+		"""index the warehouse tables for cross-season queries (the primary keys already cover season and run_id)"""
+		for tablename, indexes in self.indexes.items():
+			common_functions.create_indexes(self.warehouse_db, tablename, indexes, self.logger)
+
+
+	def run_all(self):
+		self.initiate_connection()
+		self.record_run()
+		self.upsert_tables()
+		self.create_views()
+		self.close_connection()
+		self.create_warehouse_indexes()
+
+
+
+
+
+# testing
+if __name__ == '__main__':
+	import argparse, log
+
+	parser = argparse.ArgumentParser(description='Copy the summaries of a previous RAP run into the warehouse database.')
+	parser.add_argument('db_filepath', help='sqlite database of a previous RAP run. eg. C:\\TEMP\\RAP2021_output3\\sqlite\\RAP_211121081100.sqlite')
+	parser.add_argument('warehouse_db', help='warehouse database (a new one will be created if it does not exist). eg. C:\\RAP\\warehouse\\RAP_warehouse.sqlite')
+	parser.add_argument('--cfg', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RAP.cfg'), help='config file')
+	args = parser.parse_args()
+
+	logfile = os.path.basename(__file__) + '_deleteMeLater.txt'
+	debug = True
+	logger = log.logger(logfile, debug)
+	logger.info('Testing %s              ############################'%os.path.basename(__file__))
+
+	cfg_dict = common_functions.cfg_to_dict(args.cfg)
+	cfg_dict['WAREHOUSE']['warehouse_db'] = args.warehouse_db
+	wh = Warehouse(cfg_dict, args.db_filepath, logger)
+	wh.run_all()